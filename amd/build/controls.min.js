@@ -1 +1 @@
-define(["core/ajax","jquery","core/notification"],function(i,a,l){return{init:function(){var t=document.getElementById("local_ollamachat_messages"),l=document.getElementById("local_ollamachat_form"),e=document.getElementById("local_ollamachat_prompt"),o=document.getElementById("local_ollamachat_submit");function c(a,l,e){e=['<div class="local_ollamachat_message '+("user"===a?"local_ollamachat_user_message":"local_ollamachat_assistant_message")+'"'+(e?' id="'+e+'"':"")+">",'<div class="local_ollamachat_avatar">'+("user"===a?"👤":"✨")+"</div>",'<div class="local_ollamachat_message_content">'+l+"</div>","</div>"].join("");t.insertAdjacentHTML("beforeend",e),s()}function n(a,l){var a=document.getElementById(a);a&&(a=a.querySelector(".local_ollamachat_message_content"))&&(a.innerHTML=l)}function s(){t.scrollTop=t.scrollHeight}e.addEventListener("input",function(){this.style.height="auto",this.style.height=this.scrollHeight+"px"}),e.addEventListener("keydown",function(a){"Enter"!==a.key||a.shiftKey||(a.preventDefault(),l.dispatchEvent(new Event("submit")))}),l.addEventListener("submit",function(a){a.preventDefault();var l,a=e.value.trim();a&&(e.disabled=!0,o.disabled=!0,c("user",a),e.value="",e.style.height="auto",c("assistant",'<div class="local_ollamachat_loader"><div></div><div></div><div></div></div>',l="local_ollamachat_msg_"+Date.now()),i.call([{methodname:"local_ollamachat_ask_with_knowledge",args:{prompt:a,moodlewsrestformat:"json"}}])[0].done(function(a){n(l,(a=>{if(!a)return'<div class="local_ollamachat_alert local_ollamachat_alert-info">No answer received</div>';let l=a;return l=(l=(l=(l=(l=l.replace(/(https?:\/\/[^\s]+)/g,function(a){a.replace(/^https?:\/\/(www\.)?/,"");return'<div class="local_ollamachat_link_item"><i class="local_ollamachat_link_icon fa fa-link"></i><a href="'+a+'" target="_blank" rel="noopener noreferrer">'+a+"</a></div>"})).replace(/`([^`]+)`/g,'<code class="local_ollamachat_inline_code">$1</code>')).replace(/```(\w*)\n([^`]+)```/gs,'<div class="local_ollamachat_code_container"><pre class="local_ollamachat_code_block"><code class="local_ollamachat_code $1">$2</code></pre></div>')).replace(/\n\n+/g,'</p><p class="local_ollamachat_paragraph">').replace(/\n/g,"<br>")).startsWith("<p>")||l.startsWith("<div")||l.startsWith("<pre")?l:'<p class="local_ollamachat_paragraph">'+l+"</p>"})(a.response))}).fail(function(a){n(l,'<div class="alert alert-danger">Error connecting to the server</div>')}).always(function(){e.disabled=!1,o.disabled=!1,e.focus(),s()}))})}}});
\ No newline at end of file
+define(["core/ajax","jquery","core/notification"],function(a){return{init:function(){function e(a,e){function t(a){var t="message",i="";if(a.split("\n").forEach(function(a){a.indexOf("event:")===0?t=a.slice(6).trim():a.indexOf("data:")===0&&(i+=a.slice(5).trim())}),i){l=!0;var s=JSON.parse(i);t==="token"?(c+=s.text,o(e,n(c)),r()):t==="done"&&o(e,n(s.response))}}if(!window.fetch||!window.TextDecoder)return Promise.reject(Error("Streaming not supported"));var l=!1,c="",i=new URLSearchParams;return i.append("sesskey",M.cfg.sesskey),i.append("prompt",a),fetch(M.cfg.wwwroot+"/local/ollamachat/stream.php",{method:"POST",body:i,credentials:"same-origin"}).then(function(a){function e(){return o.read().then(function(a){if(!a.done){r+=n.decode(a.value,{stream:!0});var o=r.split("\n\n");return r=o.pop(),o.forEach(t),e()}if(r.trim()&&t(r),!l)throw Error("Empty stream")})}if(!a.ok||!a.body)throw Error("Streaming not available");var o=a.body.getReader(),n=new TextDecoder,r="";return e()}).catch(function(a){if(!l)throw a;o(e,n(c)+'<div class="alert alert-danger">The answer was interrupted</div>')})}function t(e,t){var l=a.call([{methodname:"local_ollamachat_ask_with_knowledge",args:{prompt:e,moodlewsrestformat:"json"}}])[0];return l.then(function(a){o(t,n(a.response))}).catch(function(){o(t,'<div class="alert alert-danger">Error connecting to the server</div>')})}function l(a,e,t){var l=a==="user"?"local_ollamachat_user_message":"local_ollamachat_assistant_message",o=['<div class="local_ollamachat_message '+l+'"'+(t?' id="'+t+'"':"")+">",'<div class="local_ollamachat_avatar">'+(a==="user"?"👤":"✨")+"</div>",'<div class="local_ollamachat_message_content">'+e+"</div>","</div>"].join("");c.insertAdjacentHTML("beforeend",o),r()}function o(a,e){var t=document.getElementById(a);if(t){var l=t.querySelector(".local_ollamachat_message_content");l&&(l.innerHTML=e)}}function n(a){if(!a)return'<div class="local_ollamachat_alert local_ollamachat_alert-info">No answer received</div>';var e=a;return e=e.replace(/(https?:\/\/[^\s]+)/g,function(a){return a.replace(/^https?:\/\/(www\.)?/,""),'<div class="local_ollamachat_link_item"><i class="local_ollamachat_link_icon fa fa-link"></i><a href="'+a+'" target="_blank" rel="noopener noreferrer">'+a+"</a></div>"}),e=e.replace(/`([^`]+)`/g,'<code class="local_ollamachat_inline_code">$1</code>'),e=e.replace(/```(\w*)\n([^`]+)```/gs,'<div class="local_ollamachat_code_container"><pre class="local_ollamachat_code_block"><code class="local_ollamachat_code $1">$2</code></pre></div>'),e=e.replace(/\n\n+/g,'</p><p class="local_ollamachat_paragraph">').replace(/\n/g,"<br>"),e.startsWith("<p>")||e.startsWith("<div")||e.startsWith("<pre")||(e='<p class="local_ollamachat_paragraph">'+e+"</p>"),e}function r(){c.scrollTop=c.scrollHeight}var c=document.getElementById("local_ollamachat_messages"),i=document.getElementById("local_ollamachat_form"),s=document.getElementById("local_ollamachat_prompt"),d=document.getElementById("local_ollamachat_submit");s.addEventListener("input",function(){this.style.height="auto",this.style.height=this.scrollHeight+"px"}),s.addEventListener("keydown",function(a){a.key!=="Enter"||a.shiftKey||(a.preventDefault(),i.dispatchEvent(new Event("submit")))}),i.addEventListener("submit",function(a){a.preventDefault();var o=s.value.trim();if(o){s.disabled=!0,d.disabled=!0,l("user",o),s.value="",s.style.height="auto";var n="local_ollamachat_msg_"+Date.now();l("assistant",'<div class="local_ollamachat_loader"><div></div><div></div><div></div></div>',n),e(o,n).catch(function(){return t(o,n)}).then(function(){s.disabled=!1,d.disabled=!1,s.focus(),r()})}})}}});
\ No newline at end of file
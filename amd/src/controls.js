@@ -39,6 +39,90 @@ define(['core/ajax', 'jquery',  'core/notification'], function(Ajax, $, Notifica
                 var messageId = 'local_ollamachat_msg_' + Date.now();
                 addMessage('assistant', '<div class="local_ollamachat_loader"><div></div><div></div><div></div></div>', messageId);
 
+                streamAnswer(prompt, messageId).catch(function() {
+                    // No streaming support in the browser, or the endpoint failed before the first event
+                    return askOnce(prompt, messageId);
+                }).then(function() {
+                    textarea.disabled = false;
+                    submitButton.disabled = false;
+                    textarea.focus();
+                    scrollToBottom();
+                });
+            });
+
+            // Shows the answer token by token from stream.php (server-sent events).
+            // Rejects only when nothing was received, so the caller can fall back to the web service.
+            function streamAnswer(prompt, messageId) {
+                if (!window.fetch || !window.TextDecoder) {
+                    return Promise.reject(new Error('Streaming not supported'));
+                }
+                var received = false;
+                var text = '';
+
+                function handleEvent(block) {
+                    var event = 'message';
+                    var data = '';
+                    block.split('\n').forEach(function(line) {
+                        if (line.indexOf('event:') === 0) {
+                            event = line.slice(6).trim();
+                        } else if (line.indexOf('data:') === 0) {
+                            data += line.slice(5).trim();
+                        }
+                    });
+                    if (!data) return;
+                    received = true;
+                    var payload = JSON.parse(data);
+                    if (event === 'token') {
+                        text += payload.text;
+                        updateMessageContent(messageId, formatResponse(text));
+                        scrollToBottom();
+                    } else if (event === 'done') {
+                        // Final answer, with the sources appended
+                        updateMessageContent(messageId, formatResponse(payload.response));
+                    }
+                }
+
+                var body = new URLSearchParams();
+                body.append('sesskey', M.cfg.sesskey);
+                body.append('prompt', prompt);
+
+                return fetch(M.cfg.wwwroot + '/local/ollamachat/stream.php', {
+                    method: 'POST',
+                    body: body,
+                    credentials: 'same-origin'
+                }).then(function(response) {
+                    if (!response.ok || !response.body) {
+                        throw new Error('Streaming not available');
+                    }
+                    var reader = response.body.getReader();
+                    var decoder = new TextDecoder();
+                    var buffer = '';
+
+                    function read() {
+                        return reader.read().then(function(result) {
+                            if (result.done) {
+                                if (buffer.trim()) handleEvent(buffer);
+                                if (!received) throw new Error('Empty stream');
+                                return;
+                            }
+                            buffer += decoder.decode(result.value, {stream: true});
+                            var blocks = buffer.split('\n\n');
+                            buffer = blocks.pop();
+                            blocks.forEach(handleEvent);
+                            return read();
+                        });
+                    }
+                    return read();
+                }).catch(function(error) {
+                    if (!received) throw error;
+                    // The connection dropped mid-answer: keep what arrived
+                    updateMessageContent(messageId, formatResponse(text) +
+                        '<div class="alert alert-danger">The answer was interrupted</div>');
+                });
+            }
+
+            // Asks through the ask_with_knowledge web service and shows the answer once complete
+            function askOnce(prompt, messageId) {
                 var promise = Ajax.call([{
                     methodname: 'local_ollamachat_ask_with_knowledge',
                     args: {
@@ -47,21 +131,14 @@ define(['core/ajax', 'jquery',  'core/notification'], function(Ajax, $, Notifica
                     }
                 }])[0];
 
-                promise.done(function(response) {
+                return promise.then(function(response) {
                     updateMessageContent(messageId, formatResponse(response.response));
-                }).fail(function(error) {
+                }).catch(function(error) {
                     updateMessageContent(messageId,
                         '<div class="alert alert-danger">Error connecting to the server</div>'
                     );
-                }).always(function() {
-                    textarea.disabled = false;
-                    submitButton.disabled = false;
-                    textarea.focus();
-                    scrollToBottom();
                 });
-
-
-            });
+            }
 
             function addMessage(role, content, id) {
                 var messageClass = role === 'user' ? 'local_ollamachat_user_message' : 'local_ollamachat_assistant_message';
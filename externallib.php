@@ -1,9 +1,14 @@
 <?php
 defined('MOODLE_INTERNAL') || die();
 require_once($CFG->libdir . '/externallib.php');
+require_once($CFG->libdir . '/filelib.php');
 
 class local_ollamachat_external extends external_api {
 
+    // Seconds to wait for the helper service: its default --queue-timeout (60) plus the Ollama
+    // request timeout (160), with room for retrieval. Raise it when the service's queue timeout is raised.
+    const HELPER_SERVICE_TIMEOUT = 240;
+
     // Asks the original model.
     public static function ask_ollama($prompt, $moodlewsrestformat) {
         global $USER, $DB;
@@ -53,6 +58,7 @@ class local_ollamachat_external extends external_api {
         ]);
 
         $knowledge_url = get_config('local_ollamachat', 'knowledge_api_url');
+        $min_score = get_config('local_ollamachat', 'min_score');
         // $python_script = __DIR__ . '/scripts/ollama_helper.py';
         // $python_script = __DIR__ . '/scripts/ollama_helper3.py';
         $python_script = __DIR__ . '/scripts/ollama_helper_with_embeddings.py';
@@ -60,22 +66,28 @@ class local_ollamachat_external extends external_api {
         $embedding_path = $CFG->dataroot . '/local_ollamachat/embeddings';
         // error_log( print_r($embedding_path, true)); exit;
 
-        // 1. Execute Python with robust character handling
-        $command = sprintf(
-            'python3 %s %s %s %s',
-            escapeshellarg($python_script),
-            escapeshellarg($params['prompt']),
-            escapeshellarg($knowledge_url ?? ''),
-            escapeshellarg($embedding_path)
-        );
-        // Without embedding
-        // $command = sprintf(
-        //     'python3 %s %s %s',
-        //     escapeshellarg($python_script),
-        //     escapeshellarg($params['prompt']),
-        //     escapeshellarg($knowledge_url ?? ''),
-        // );
-        $output = shell_exec($command);
+        // 1. Ask the long-lived helper service, it keeps the model and embeddings loaded
+        $output = self::call_helper_service($params['prompt'], $knowledge_url ?? '', $embedding_path, $min_score);
+
+        // Fallback: execute Python with robust character handling
+        if ($output === null) {
+            $command = sprintf(
+                'python3 %s %s %s %s %s',
+                escapeshellarg($python_script),
+                escapeshellarg($params['prompt']),
+                escapeshellarg($knowledge_url ?? ''),
+                escapeshellarg($embedding_path),
+                escapeshellarg((string) $min_score)
+            );
+            // Without embedding
+            // $command = sprintf(
+            //     'python3 %s %s %s',
+            //     escapeshellarg($python_script),
+            //     escapeshellarg($params['prompt']),
+            //     escapeshellarg($knowledge_url ?? ''),
+            // );
+            $output = shell_exec($command);
+        }
         // 2. Improved JSON decoding
         $response = json_decode($output, true);
 
@@ -101,6 +113,99 @@ class local_ollamachat_external extends external_api {
 
 
 
+    // Posts the question to scripts/ollama_service.py. Returns the raw JSON body or null when the service is not available.
+    protected static function call_helper_service($prompt, $knowledge_url, $embedding_path, $min_score) {
+        $service_url = get_config('local_ollamachat', 'service_url');
+        if (empty($service_url)) {
+            return null;
+        }
+
+        $curl = new curl(['ignoresecurity' => true]); // The service runs on localhost
+        $curl->setHeader(['Content-Type: application/json']);
+        $output = $curl->post(rtrim($service_url, '/') . '/generate', json_encode(
+            self::helper_payload($prompt, $knowledge_url, $embedding_path, $min_score)
+        ), [
+            'CURLOPT_CONNECTTIMEOUT' => 2,
+            'CURLOPT_TIMEOUT' => self::HELPER_SERVICE_TIMEOUT
+        ]);
+
+        $info = $curl->get_info();
+        // Errno 28 is also a connect timeout, when the service cannot be reached: that one falls back to the CLI
+        if ($curl->get_errno() == CURLE_OPERATION_TIMEDOUT && !empty($info['connect_time'])) {
+            // The service was reached but the question was queued or generating too long:
+            // running it again through the CLI would only add load to Ollama
+            return json_encode([
+                'success' => false,
+                'response' => get_string('servicetimeout', 'local_ollamachat'),
+                'sources' => []
+            ]);
+        }
+        if ($curl->get_errno() || empty($info['http_code']) || $info['http_code'] != 200) {
+            error_log("Helper service unavailable, falling back to the CLI: " . $curl->error);
+            return null;
+        }
+
+        return $output;
+    }
+
+    // Request body shared by the /generate and /generate/stream endpoints of the helper service.
+    // The user id lets the service queue questions fairly between users.
+    protected static function helper_payload($prompt, $knowledge_url, $embedding_path, $min_score) {
+        global $USER;
+
+        return [
+            'prompt' => $prompt,
+            'knowledge_url' => $knowledge_url,
+            'embeddings_dir' => $embedding_path,
+            'min_score' => $min_score === false || $min_score === '' ? null : (float) $min_score,
+            'user' => (int) $USER->id
+        ];
+    }
+
+    // Relays the server-sent events of the helper service's /generate/stream endpoint to the browser
+    // as they arrive. Returns false when the service could not be reached and nothing was sent.
+    public static function stream_with_knowledge($prompt) {
+        global $CFG;
+
+        $service_url = get_config('local_ollamachat', 'service_url');
+        if (empty($service_url)) {
+            return false;
+        }
+        $payload = self::helper_payload(
+            $prompt,
+            get_config('local_ollamachat', 'knowledge_api_url') ?: '',
+            $CFG->dataroot . '/local_ollamachat/embeddings',
+            get_config('local_ollamachat', 'min_score')
+        );
+
+        // Moodle's curl class returns the body once complete, a raw handle lets each event through on arrival
+        $sent = false;
+        $ch = curl_init(rtrim($service_url, '/') . '/generate/stream');
+        curl_setopt_array($ch, [
+            CURLOPT_POST => true,
+            CURLOPT_POSTFIELDS => json_encode($payload),
+            CURLOPT_HTTPHEADER => ['Content-Type: application/json', 'Accept: text/event-stream'],
+            CURLOPT_CONNECTTIMEOUT => 2,
+            CURLOPT_TIMEOUT => self::HELPER_SERVICE_TIMEOUT,
+            CURLOPT_WRITEFUNCTION => function($ch, $data) use (&$sent) {
+                if (curl_getinfo($ch, CURLINFO_HTTP_CODE) != 200) {
+                    return 0; // Abort, e.g. a service started before streaming existed
+                }
+                $sent = true;
+                echo $data;
+                flush();
+                return strlen($data);
+            }
+        ]);
+        curl_exec($ch);
+        if (curl_errno($ch) && !$sent) {
+            error_log("Helper service streaming unavailable: " . curl_error($ch));
+        }
+        curl_close($ch);
+
+        return $sent;
+    }
+
     public static function ask_with_knowledge_returns() {
         return new external_single_structure([
             'success' => new external_value(PARAM_BOOL, 'Operation status'),
@@ -29,3 +29,9 @@ $string['knowledgeurl_desc'] = 'JSON endpoint returning structured website conte
 $string['assistantname'] = 'The name that will appear on the header of your assistant';
 $string['generate_embeddings_task'] = 'Generate embeddings from KB';
 
+
+$string['serviceurl'] = 'Helper service URL';
+$string['serviceurl_desc'] = 'Address of the long-lived helper service (scripts/ollama_service.py). It keeps the embedding model and knowledge base loaded between questions. Leave empty to always run the Python helper per question.';
+$string['minscore'] = 'Minimum similarity';
+$string['minscore_desc'] = 'Cosine similarity (between -1 and 1) a knowledge base article needs to be used as context. Higher values give fewer but more relevant articles.';
+$string['servicetimeout'] = 'The assistant is taking too long to answer, many questions may be waiting. Please try again in a moment.';
@@ -0,0 +1,108 @@
+"""
+    Answer cache for repeated and near-duplicate questions.
+    Answers are found by the normalized prompt text first, then by the cosine similarity
+    of the prompt embedding to the cached prompts. Entries expire after a TTL, the least
+    recently used one is evicted when the cache is full, and all entries of a scope are
+    dropped as soon as its knowledge base version changes (a reindex).
+
+    A scope groups the questions that may share answers: same embeddings directory and
+    same retrieval options.
+"""
+import re
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL = 3600  # Seconds
+DEFAULT_SIMILARITY = 0.95
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt):
+    """Case, surrounding punctuation and spacing do not change the question"""
+    return _SPACES.sub(" ", prompt.lower()).strip(" ?!.¿¡")
+
+
+class AnswerCache:
+    """Thread-safe; results are stored as given and returned as copies"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, similarity=DEFAULT_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()  # (scope, normalized prompt) -> entry, least recently used first
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "similar_hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def _check_version(self, scope, version):
+        """Drops the entries of scope when its knowledge base changed"""
+        if self._versions.get(scope, version) != version:
+            stale = [key for key in self._entries if key[0] == scope]
+            for key in stale:
+                del self._entries[key]
+            self._stats["invalidations"] += len(stale)
+        self._versions[scope] = version
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and now - entry["created"] > self.ttl:
+            del self._entries[key]
+            self._stats["expired"] += 1
+            return None
+        return entry
+
+    def get(self, scope, version, prompt, embed):
+        """
+        Returns (result, embedding). result is None on a miss. embed() returns the unit
+        prompt embedding; it is only called when there is no exact match, and the embedding
+        is returned so the caller can pass it on to put().
+        """
+        key = (scope, normalize_prompt(prompt))
+        now = time.time()
+        with self._lock:
+            self._check_version(scope, version)
+            entry = self._live(key, now)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return dict(entry["result"]), entry["embedding"]
+
+        embedding = embed()
+        with self._lock:
+            keys = [other for other in list(self._entries) if other[0] == scope and self._live(other, now)]
+            if keys and self.similarity < 1:
+                vectors = np.vstack([self._entries[other]["embedding"] for other in keys])
+                scores = vectors @ np.asarray(embedding, dtype="float32").ravel()
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    self._entries.move_to_end(keys[best])
+                    self._stats["similar_hits"] += 1
+                    return dict(self._entries[keys[best]]["result"]), embedding
+            self._stats["misses"] += 1
+        return None, embedding
+
+    def put(self, scope, version, prompt, embedding, result):
+        key = (scope, normalize_prompt(prompt))
+        with self._lock:
+            self._check_version(scope, version)
+            self._entries[key] = {
+                "result": dict(result),
+                "embedding": np.asarray(embedding, dtype="float32").ravel(),
+                "created": time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["similar_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["similar_hits"]) / lookups if lookups else 0.0
+        return stats
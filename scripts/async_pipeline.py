@@ -0,0 +1,234 @@
+"""
+    asyncio version of the generate_response pipeline, used by ollama_async_service.py.
+    Many questions are in flight in one process:
+        - the Ollama calls are awaited on one aiohttp session instead of blocking a thread each
+        - prompt encoding and the FAISS search run on a small thread pool (ONNX Runtime
+          and FAISS release the GIL while they work)
+        - the optional knowledge API fallback is fetched at the same time as the search,
+          not after the search came back empty
+    Results and errors have the same shape as generate_response / stream_response.
+"""
+import asyncio
+import functools
+import logging
+import contextvars
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+import http_client
+import ollama_stream
+import ollama_backends
+import scheduler
+import stage_timer
+import ollama_helper_with_embeddings as helper
+
+OLLAMA_TIMEOUT = 160
+
+
+def timed(stage, func, *args, **kwargs):
+    """func(*args, **kwargs) timed as a stage of the current request"""
+    with stage_timer.stage(stage):
+        return func(*args, **kwargs)
+
+
+class Pipeline:
+    """Owns the aiohttp session and the search threads; create it inside the running event loop"""
+
+    def __init__(self, pool_size=http_client.DEFAULT_POOL_SIZE, search_threads=None,
+                 retries=http_client.DEFAULT_RETRIES, backoff=http_client.DEFAULT_BACKOFF):
+        # Up to pool_size concurrent connections to Ollama, further requests wait for a free one
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, limit_per_host=pool_size, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=OLLAMA_TIMEOUT)
+        )
+        self.executor = ThreadPoolExecutor(max_workers=search_threads, thread_name_prefix="search")
+        self.retries = retries
+        self.backoff = backoff
+
+    async def close(self):
+        await self.session.close()
+        self.executor.shutdown(wait=False)
+
+    def run_blocking(self, func, *args, **kwargs):
+        """Runs a CPU-bound or blocking step on the search threads, in a copy of the caller's context (its request span)"""
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(context.run, func, *args, **kwargs)
+        )
+
+    async def build_prompt(self, prompt, knowledge_url=None, embeddings_dir=None, nprobe=None, ef_search=None,
+                           min_score=helper.DEFAULT_MIN_SCORE):
+        """Same result as helper.build_prompt, with the knowledge API fetch overlapping the search"""
+        search = self.run_blocking(
+            helper.get_semantic_context, prompt, embeddings_dir,
+            top_n=helper.CONTEXT_CANDIDATES, min_score=min_score, nprobe=nprobe, ef_search=ef_search
+        )
+        # Read from the disk cache (fetch_knowledge_indexed), a download only when the cached copy expired
+        fallback = self.run_blocking(
+            timed, "fallback_fetch", helper.fetch_knowledge_indexed, knowledge_url, embeddings_dir
+        ) if knowledge_url else None
+
+        knowledge, sources = await search
+        if not knowledge and fallback is not None:
+            data, lexical = await fallback
+            if data:
+                knowledge, sources = await self.run_blocking(
+                    timed, "fallback_search", helper.process_knowledge, data, prompt, lexical
+                )
+        elif fallback is not None:
+            # Not needed this time; a running download still completes and fills the cache
+            fallback.cancel()
+
+        return helper.compose_prompt(prompt, knowledge), knowledge, sources
+
+    @asynccontextmanager
+    async def post_ollama(self, payload):
+        """
+        Posts to the best Ollama backend for the model and yields the response (see ollama_backends.py).
+        A refused connection fails over to the next backend; when all refused, they are tried
+        again after an exponential backoff. The whole exchange is the "ollama" stage of the request.
+        """
+        backends = helper.ollama_backends_pool()
+        model = payload["model"]
+        error = None
+        with stage_timer.stage("ollama"):
+            for attempt in range(self.retries + 1):
+                for backend in backends.candidates(model):
+                    with backends.track(backend):
+                        try:
+                            response = await self.session.post(backend.url + ollama_backends.GENERATE_PATH, json=payload)
+                        except aiohttp.ClientConnectorError as e:
+                            backends.mark_down(backend, e)
+                            error = e
+                            continue
+                        async with response:
+                            if response.ok:
+                                backends.mark_up(backend, model)
+                            yield response
+                        return
+                if attempt < self.retries:
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+        raise ollama_backends.NoBackendAvailable(f"No Ollama backend available for {model}: {str(error)}")
+
+    async def generate_response(self, prompt, **options):
+        """Async generate_response, takes the same keyword arguments"""
+        user = options.pop("user", None)
+        with helper.track_request("generate"):
+            cached, remember = await self.run_blocking(timed, "answer_cache", helper.lookup_answer, prompt, **options)
+            if cached is not None:
+                return cached
+            result = await self._generate_response(prompt, user=user, **options)
+            remember(result)
+            return result
+
+    async def _generate_response(self, prompt, user=None, **options):
+        try:
+            full_prompt, knowledge, sources = await self.build_prompt(prompt, **options)
+
+            async with helper.async_generation_slot(user) as queue_wait:
+                stage_timer.record("queue", queue_wait)
+                async with self.post_ollama(helper.ollama_payload(full_prompt)) as ollama_response:
+                    try:
+                        response_data = await ollama_response.json(content_type=None)
+                        response_text = response_data.get("response", "")
+                        helper.record_timings(helper.OLLAMA_MODEL, response_data)
+                    except ValueError as e:
+                        logging.error(f"JSONDecodeError: {str(e)} - Raw: {await ollama_response.text()}")
+                        return {
+                            "success": False,
+                            "response": "Error parsing the response from the model. Please try again later.",
+                            "sources": []
+                        }
+
+            return {
+                "success": True,
+                "response": helper.format_response_with_sources(response_text, knowledge, sources),
+                "sources": sources,
+                "context_used": bool(knowledge.strip())
+            }
+
+        except scheduler.Busy as e:
+            return helper.busy_result(e)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ollama_backends.NoBackendAvailable) as e:
+            logging.error(f"RequestException: {str(e)}")
+            return {
+                "success": False,
+                "response": f"RequestException: {str(e)}",
+                "sources": []
+            }
+        except Exception as e:
+            logging.error(f"RequestException: {str(e)}")
+            return {
+                "success": False,
+                "response": "An unexpected error occurred. Please try again or contact support.",
+                "sources": []
+            }
+
+    async def stream_response(self, prompt, **options):
+        """Async stream_response: yields ("token", text) pairs, then ("done", result)"""
+        user = options.pop("user", None)
+        with helper.track_request("stream"):
+            cached, remember = await self.run_blocking(timed, "answer_cache", helper.lookup_answer, prompt, **options)
+            if cached is not None:
+                yield "done", cached
+                return
+            events = self._stream_response(prompt, user=user, **options)
+            try:
+                async for event, data in events:
+                    if event == "done":
+                        remember(data)
+                    yield event, data
+            finally:
+                await events.aclose()
+
+    async def _stream_response(self, prompt, user=None, **options):
+        try:
+            full_prompt, knowledge, sources = await self.build_prompt(prompt, **options)
+
+            tokens = []
+            # Leaving the block (also when the consumer stops early) closes the connection and stops Ollama
+            async with helper.async_generation_slot(user) as queue_wait:
+                stage_timer.record("queue", queue_wait)
+                async with self.post_ollama(helper.ollama_payload(full_prompt, stream=True)) as ollama_response:
+                    ollama_response.raise_for_status()
+                    async for line in ollama_response.content:
+                        chunk = ollama_stream.parse_line(line)
+                        if chunk is None:
+                            continue
+                        if chunk.get("response"):
+                            tokens.append(chunk["response"])
+                            yield "token", chunk["response"]
+                        if chunk.get("done"):
+                            helper.record_timings(helper.OLLAMA_MODEL, chunk)
+                            break
+
+            yield "done", {
+                "success": True,
+                "response": helper.format_response_with_sources("".join(tokens), knowledge, sources),
+                "sources": sources,
+                "context_used": bool(knowledge.strip())
+            }
+
+        except scheduler.Busy as e:
+            yield "done", helper.busy_result(e)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ollama_backends.NoBackendAvailable) as e:
+            logging.error(f"RequestException: {str(e)}")
+            yield "done", {
+                "success": False,
+                "response": f"RequestException: {str(e)}",
+                "sources": []
+            }
+        except (ValueError, ollama_stream.OllamaStreamError) as e:
+            logging.error(f"Streaming error: {str(e)}")
+            yield "done", {
+                "success": False,
+                "response": "Error parsing the response from the model. Please try again later.",
+                "sources": []
+            }
+        except Exception as e:
+            logging.error(f"Streaming error: {str(e)}")
+            yield "done", {
+                "success": False,
+                "response": "An unexpected error occurred. Please try again or contact support.",
+                "sources": []
+            }
@@ -0,0 +1,338 @@
+"""
+    End-to-end latency benchmark on synthetic knowledge bases, against ollama_stub.py.
+    For each size (articles) it:
+        - serves a generated knowledge API export on localhost
+        - builds the embeddings with generate_embeddings.py (index_build)
+        - starts fresh helper processes, as each CLI question does: process_start, imports,
+          model_load, kb_load and first_search are timed inside them. imports is the
+          whole import cost, deferred modules included, comparable with results from
+          before the lazy imports; helper_import is the part a CLI question pays up front
+        - runs distinct questions through get_semantic_context (search), then generate_response
+          from --clients concurrent clients against the stub Ollama (generation, throughput)
+
+    p50/p95/p99 per stage are printed and written to --json. With --baseline the run is
+    compared with an earlier result file and exits 1 when the p95 of a stage grew by
+    more than --tolerance, so regressions can be caught in CI or before a release.
+
+    Usage: python3 benchmark.py [--sizes 1000,10000,100000] [--clients 8] [--questions 200]
+                                [--cold-runs 5] [--tokens-per-second 50] [--json benchmark.json]
+                                [--baseline old.json] [--tolerance 0.2] [--work-dir <dir>]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import ollama_stub
+import stage_timer
+
+# The helper and its dependencies are imported inside the functions that use them,
+# so the --probe processes time their import from a clean interpreter.
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [1000, 10000, 100000]
+STAGES = ("process_start", "helper_import", "imports", "model_load", "kb_load", "first_search", "index_build", "search", "generation")
+
+
+# --- Synthetic knowledge base ---
+
+def vocabulary(size=2000, seed=0):
+    """Pronounceable made-up words, so the embeddings and BM25 see realistic token lengths"""
+    rng = random.Random(seed)
+    syllables = [c + v for c in "bcdfglmnprstv" for v in "aeiou"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def synthetic_articles(count, seed=0, words_per_article=150):
+    """Knowledge API items; a few topic words are shared by related articles"""
+    rng = random.Random(seed)
+    words = vocabulary(seed=seed)
+    topics = [rng.sample(words, 5) for _ in range(max(1, count // 20))]
+    for extid in range(count):
+        topic = topics[extid % len(topics)]
+        title = " ".join(rng.sample(topic, 3) + [rng.choice(words)])
+        sentences, length = [], 0
+        while length < words_per_article:
+            sentence = [rng.choice(topic if rng.random() < 0.3 else words) for _ in range(rng.randint(8, 15))]
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            length += len(sentence)
+        yield {
+            "extid": extid,
+            "title": title.capitalize(),
+            "url": f"https://moodle.example/kb/{extid}",
+            "keywords": ", ".join(rng.sample(topic, 3)),
+            "content": " ".join(sentences)
+        }
+
+def synthetic_questions(articles_file, count, seed=1):
+    """Questions worded from random article titles, all distinct so no prompt cache hides the search"""
+    rng = random.Random(seed)
+    with open(articles_file, encoding="utf-8") as f:
+        titles = [item["title"] for item in json.load(f)]
+    templates = ["How do I {}?", "Where can I find {}?", "What is {}?", "Help with {} please", "{} not working"]
+    questions = set()
+    while len(questions) < min(count, len(titles) * len(templates)):
+        questions.add(rng.choice(templates).format(rng.choice(titles).lower()))
+    return sorted(questions)
+
+def write_articles(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i, item in enumerate(synthetic_articles(count)):
+            f.write(("," if i else "") + json.dumps(item, ensure_ascii=False))
+        f.write("]")
+
+
+class ExportHandler(BaseHTTPRequestHandler):
+    """Serves the export file like the knowledge API does"""
+
+    def do_GET(self):
+        size = os.path.getsize(self.server.export_path)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        with open(self.server.export_path, "rb") as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_export(path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ExportHandler)
+    server.daemon_threads = True
+    server.export_path = path
+    threading.Thread(target=server.serve_forever, name="kb-export", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/export"
+
+
+# --- Statistics ---
+
+def summarize(seconds):
+    values = sorted(value * 1000 for value in seconds)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50_ms": stage_timer.percentile(values, 50),
+        "p95_ms": stage_timer.percentile(values, 95),
+        "p99_ms": stage_timer.percentile(values, 99),
+        "mean_ms": sum(values) / len(values)
+    }
+
+
+# --- Stages ---
+
+def probe(embeddings_dir, question, started_at):
+    """Runs in a fresh interpreter (--probe): the cold path of one CLI question, without the generation"""
+    timings = {"process_start": time.time() - started_at}
+    start = time.perf_counter()
+    import ollama_helper_with_embeddings as helper
+    timings["helper_import"] = time.perf_counter() - start
+
+    # The helper defers numpy, faiss, requests... and embedder light_embed / onnxruntime until
+    # first use; they are loaded here so "imports" stays the whole import cost, as before
+    # the lazy imports, and model_load / kb_load do not absorb it
+    import lazy_imports
+    lazy_imports.load_all()
+    import light_embed
+    import onnxruntime
+    timings["imports"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    helper.load_model()
+    timings["model_load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    helper.load_knowledge_base(embeddings_dir)
+    timings["kb_load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    helper.get_semantic_context(question, embeddings_dir, top_n=helper.CONTEXT_CANDIDATES)
+    timings["first_search"] = time.perf_counter() - start
+    print(json.dumps(timings))
+
+def run_cold(embeddings_dir, questions, runs, work_dir):
+    samples = {}
+    for i in range(runs):
+        # Passed as wall-clock time: perf_counter is not comparable across processes
+        command = [sys.executable, os.path.join(SCRIPTS_DIR, "benchmark.py"), "--probe",
+                   embeddings_dir, questions[i % len(questions)], repr(time.time())]
+        result = subprocess.run(command, cwd=work_dir, capture_output=True, text=True, check=True)
+        for stage, seconds in json.loads(result.stdout.strip().splitlines()[-1]).items():
+            samples.setdefault(stage, []).append(seconds)
+    return samples
+
+def run_build(export_url, embeddings_dir, work_dir, build_args):
+    command = [sys.executable, os.path.join(SCRIPTS_DIR, "generate_embeddings.py"), export_url,
+               os.path.join(embeddings_dir, "embeddings.json"), "--full", *build_args]
+    start = time.perf_counter()
+    subprocess.run(command, cwd=work_dir, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def run_search(helper, embeddings_dir, questions):
+    seconds = []
+    for question in questions:
+        start = time.perf_counter()
+        helper.get_semantic_context(question, embeddings_dir, top_n=helper.CONTEXT_CANDIDATES)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+def run_generation(helper, embeddings_dir, questions, clients):
+    """generate_response from clients threads, each its own user; returns (latencies, failed, wall seconds)"""
+    def ask(i):
+        start = time.perf_counter()
+        result = helper.generate_response(questions[i], embeddings_dir=embeddings_dir, user=i % clients)
+        return time.perf_counter() - start, result.get("success", False)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(ask, range(len(questions))))
+    wall = time.perf_counter() - start
+    return [seconds for seconds, _ in results], sum(1 for _, success in results if not success), wall
+
+def benchmark_size(size, args, ollama_url):
+    size_dir = os.path.join(args.work_dir, str(size))
+    embeddings_dir = os.path.join(size_dir, "embeddings")
+    os.makedirs(embeddings_dir, exist_ok=True)
+    export_path = os.path.join(size_dir, "export.json")
+    if not os.path.exists(export_path):
+        write_articles(export_path, size)
+    questions = synthetic_questions(export_path, args.questions)
+
+    print(f"[{size} articles] building the index...", file=sys.stderr)
+    server, export_url = serve_export(export_path)
+    try:
+        samples = {"index_build": [run_build(export_url, embeddings_dir, size_dir, args.build_args)
+                                   for _ in range(args.build_runs)]}
+    finally:
+        server.shutdown()
+
+    print(f"[{size} articles] {args.cold_runs} cold processes...", file=sys.stderr)
+    samples.update(run_cold(embeddings_dir, questions, args.cold_runs, size_dir))
+
+    import ollama_helper_with_embeddings as helper
+    import lazy_imports
+    lazy_imports.load_all()  # Before the client threads: LazyLoader is not thread-safe on every Python version
+    helper.configure_backends([ollama_url], health_interval=0)
+    helper.configure_scheduler(args.max_generations, max_queue=max(len(questions), 1), max_per_user=len(questions))
+    helper.load_knowledge_base(embeddings_dir)
+    helper.get_semantic_context(questions[0], embeddings_dir)  # Loads the tokenizer, like the first question of a service
+
+    print(f"[{size} articles] {len(questions)} searches, then {args.clients} clients...", file=sys.stderr)
+    samples["search"] = run_search(helper, embeddings_dir, questions)
+    retrieval = helper.stage_stats()
+    samples["generation"], failed, wall = run_generation(helper, embeddings_dir, questions, args.clients)
+
+    return {
+        "articles": size,
+        "stages": {stage: summarize(samples[stage]) for stage in STAGES if stage in samples},
+        "retrieval_stages": retrieval,
+        "throughput": {
+            "clients": args.clients,
+            "requests": len(questions),
+            "failed": failed,
+            "seconds": wall,
+            "requests_per_second": len(questions) / wall if wall else 0.0
+        }
+    }
+
+
+# --- Report ---
+
+def print_report(results):
+    print(f"{'articles':>9} {'stage':<14} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for result in results["sizes"].values():
+        for stage, stats in result["stages"].items():
+            if stats["count"]:
+                print(f"{result['articles']:>9} {stage:<14} {stats['count']:>5} "
+                      f"{stats['p50_ms']:>10.1f} {stats['p95_ms']:>10.1f} {stats['p99_ms']:>10.1f}")
+        throughput = result["throughput"]
+        print(f"{result['articles']:>9} {'throughput':<14} {throughput['requests_per_second']:.2f} req/s "
+              f"at {throughput['clients']} clients, {throughput['failed']} failed")
+
+def regressions(results, baseline, tolerance):
+    """(articles, stage, old p95, new p95) for each stage whose p95 grew by more than tolerance"""
+    found = []
+    for size, result in results["sizes"].items():
+        old = baseline.get("sizes", {}).get(size)
+        if old is None:
+            continue
+        for stage, stats in result["stages"].items():
+            before = old["stages"].get(stage, {}).get("p95_ms")
+            if before and stats.get("p95_ms", 0) > before * (1 + tolerance):
+                found.append((size, stage, before, stats["p95_ms"]))
+    return found
+
+def parse_sizes(value):
+    return [int(v) for v in value.split(",") if v]
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark against a stub Ollama")
+    parser.add_argument("--sizes", type=parse_sizes, default=DEFAULT_SIZES, help="Knowledge base sizes in articles")
+    parser.add_argument("--questions", type=int, default=200, help="Distinct questions per size")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients for the generation stage")
+    parser.add_argument("--cold-runs", type=int, default=5, help="Fresh helper processes per size")
+    parser.add_argument("--build-runs", type=int, default=1, help="Index builds per size")
+    parser.add_argument("--build-args", nargs=argparse.REMAINDER, default=[],
+                        help="Remaining arguments are passed to generate_embeddings.py")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Generation speed of the stub Ollama")
+    parser.add_argument("--max-generations", type=int, default=None,
+                        help="Generation slots of the helper's scheduler (default: --clients)")
+    parser.add_argument("--work-dir", default=None, help="Keeps the exports and indexes here (default: a temporary directory)")
+    parser.add_argument("--json", default=None, help="Write the results to this file")
+    parser.add_argument("--baseline", default=None, help="Results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth against the baseline")
+    args = parser.parse_args()
+
+    temporary = args.work_dir is None
+    args.work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix="ollamachat_benchmark_"))
+    args.max_generations = args.max_generations or args.clients
+    stub, ollama_url = ollama_stub.start(tokens_per_second=args.tokens_per_second)
+
+    results = {
+        "settings": {
+            "sizes": args.sizes, "questions": args.questions, "clients": args.clients,
+            "cold_runs": args.cold_runs, "tokens_per_second": args.tokens_per_second,
+            "max_generations": args.max_generations, "build_args": args.build_args,
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()
+        },
+        "sizes": {}
+    }
+    try:
+        for size in args.sizes:
+            results["sizes"][str(size)] = benchmark_size(size, args, ollama_url)
+    finally:
+        stub.shutdown()
+        if temporary:
+            shutil.rmtree(args.work_dir, ignore_errors=True)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for size, stage, before, after in found:
+            print(f"REGRESSION {size} articles, {stage}: p95 {before:.1f} ms -> {after:.1f} ms", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--probe":
+        probe(sys.argv[2], sys.argv[3], float(sys.argv[4]))
+    else:
+        main()
@@ -0,0 +1,188 @@
+"""
+    BM25 inverted index for lexical retrieval, fused with the FAISS results.
+    Built by generate_embeddings.py over the chunk rows (title + chunk text), so row ids
+    are the metadata rows / FAISS ids. Files in the embeddings directory:
+
+        bm25_terms.json     vocabulary, term id -> term
+        bm25_offsets.npy    int64, postings of term t are offsets[t]:offsets[t + 1]
+        bm25_rows.npy       int32 row per posting, ascending within a term
+        bm25_tf.npy         float32 term frequency per posting
+        bm25_lengths.npy    int32 tokens per row, 0 for an empty row
+        bm25_info.json      k1, b and counts, written last
+
+    Postings are memory-mapped; a query only reads the lists of its own terms, so its cost
+    follows the number of matching rows, not the size of the knowledge base. Terms found
+    in more than max_df of the rows are treated as stop words and skipped.
+"""
+import os
+import re
+import json
+import math
+import time
+import unicodedata
+from array import array
+from collections import Counter
+import numpy as np
+
+INFO_FILE = "bm25_info.json"
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+DEFAULT_MAX_DF = 0.5
+DEFAULT_CANDIDATES = 50
+DEFAULT_MIN_COVERAGE = 0.5
+RRF_K = 60
+
+_TOKEN = re.compile(r"\w+")
+_MARKS = re.compile(r"[\u0300-\u036f]")  # Combining accents left by NFKD
+
+
+def tokenize(text):
+    """Lowercase words without accents ("Inscripción" -> "inscripcion"); single letters are dropped"""
+    text = _MARKS.sub("", unicodedata.normalize("NFKD", text.lower()))
+    return [token for token in _TOKEN.findall(text) if len(token) > 1 or token.isdigit()]
+
+
+def fuse(rankings, k=RRF_K):
+    """Reciprocal rank fusion: rows ordered by the sum of 1 / (k + rank) over the rankings they appear in"""
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank)
+    # Stable: on a tie the row of the first ranking comes first
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class BM25Index:
+    def __init__(self, terms, offsets, rows, tf, lengths, k1=DEFAULT_K1, b=DEFAULT_B, max_df=DEFAULT_MAX_DF):
+        self.terms = terms
+        self.term_ids = {term: term_id for term_id, term in enumerate(terms)}
+        self.offsets = offsets
+        self.rows = rows
+        self.tf = tf
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        self.max_df = max_df
+        self.documents = int(np.count_nonzero(lengths))
+        self.average_length = float(lengths.sum()) / self.documents if self.documents else 1.0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def idf(self, df):
+        return math.log(1 + (self.documents - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k=DEFAULT_CANDIDATES, min_coverage=DEFAULT_MIN_COVERAGE):
+        """
+        Returns (rows, scores) of the k best rows, best first. A row must match query terms
+        carrying at least min_coverage of the query's total IDF weight, so a question is not
+        answered from rows that only share one of its words.
+        """
+        postings_rows, postings_scores, postings_weights = [], [], []
+        total_weight = 0.0
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            df = 0 if term_id is None else int(self.offsets[term_id + 1] - self.offsets[term_id])
+            if df > self.max_df * self.documents:
+                continue
+            idf = self.idf(df)
+            total_weight += idf
+            if not df:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            rows = self.rows[start:end]
+            tf = self.tf[start:end]
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[rows] / self.average_length)
+            postings_rows.append(rows)
+            postings_scores.append(idf * tf * (self.k1 + 1) / (tf + norm))
+            postings_weights.append(np.full(len(rows), idf))
+
+        if not postings_rows:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+        rows, inverse = np.unique(np.concatenate(postings_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(postings_scores))
+        coverage = np.bincount(inverse, weights=np.concatenate(postings_weights)) / total_weight
+        keep = coverage >= min_coverage
+        rows, scores = rows[keep], scores[keep]
+
+        if scores.size > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order].astype("int64"), scores[order].astype("float32")
+
+
+def build(texts, k1=DEFAULT_K1, b=DEFAULT_B, max_df=DEFAULT_MAX_DF):
+    """Index over texts (one per row, "" for an empty row); postings are collected in flat arrays, not per-term lists"""
+    vocabulary = {}
+    rows, term_ids, counts, lengths = array("i"), array("i"), array("i"), array("i")
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        lengths.append(len(tokens))
+        for term, count in Counter(tokens).items():
+            rows.append(row)
+            term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+            counts.append(count)
+
+    term_ids = np.frombuffer(term_ids, dtype=np.intc)
+    # Stable, so rows stay ascending within each term
+    order = np.argsort(term_ids, kind="stable")
+    offsets = np.zeros(len(vocabulary) + 1, dtype="int64")
+    np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=offsets[1:])
+    return BM25Index(
+        list(vocabulary),
+        offsets,
+        np.frombuffer(rows, dtype=np.intc)[order].astype("int32"),
+        np.frombuffer(counts, dtype=np.intc)[order].astype("float32"),
+        np.frombuffer(lengths, dtype=np.intc).astype("int32"),
+        k1, b, max_df
+    )
+
+
+def _path(output_dir, name):
+    return os.path.join(output_dir, "bm25_" + name)
+
+def _save_npy(path, array):
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(path + ".tmp", path)
+
+def write(index, output_dir):
+    with open(_path(output_dir, "terms.json") + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index.terms, f, ensure_ascii=False)
+    os.replace(_path(output_dir, "terms.json") + ".tmp", _path(output_dir, "terms.json"))
+    _save_npy(_path(output_dir, "offsets.npy"), index.offsets)
+    _save_npy(_path(output_dir, "rows.npy"), index.rows)
+    _save_npy(_path(output_dir, "tf.npy"), index.tf)
+    _save_npy(_path(output_dir, "lengths.npy"), index.lengths)
+
+    # Written last: readers use it to detect a complete, new version
+    info = {"k1": index.k1, "b": index.b, "max_df": index.max_df, "rows": len(index),
+            "terms": len(index.terms), "postings": len(index.rows), "written": int(time.time())}
+    with open(os.path.join(output_dir, INFO_FILE) + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    os.replace(os.path.join(output_dir, INFO_FILE) + ".tmp", os.path.join(output_dir, INFO_FILE))
+    return os.path.join(output_dir, INFO_FILE)
+
+def exists(output_dir):
+    return os.path.exists(os.path.join(output_dir, INFO_FILE))
+
+def version(output_dir):
+    """Changes whenever a new index is written, None when there is none"""
+    path = os.path.join(output_dir, INFO_FILE)
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+def load(output_dir):
+    with open(os.path.join(output_dir, INFO_FILE), encoding="utf-8") as f:
+        info = json.load(f)
+    with open(_path(output_dir, "terms.json"), encoding="utf-8") as f:
+        terms = json.load(f)
+    return BM25Index(
+        terms,
+        np.load(_path(output_dir, "offsets.npy"), mmap_mode="r"),
+        np.load(_path(output_dir, "rows.npy"), mmap_mode="r"),
+        np.load(_path(output_dir, "tf.npy"), mmap_mode="r"),
+        np.load(_path(output_dir, "lengths.npy"), mmap_mode="r"),
+        info["k1"], info["b"], info["max_df"]
+    )
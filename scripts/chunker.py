@@ -0,0 +1,46 @@
+"""
+    Splits knowledge base documents into overlapping token windows before embedding.
+    Windows are counted with the embedding model's own tokenizer (tokenizer.json),
+    so every chunk fits the model's 128 token input instead of being silently
+    truncated, and the chunk text is what the helper hands to the LLM as context.
+"""
+import os
+from tokenizers import Tokenizer
+import embedder
+
+DEFAULT_CHUNK_TOKENS = 96
+DEFAULT_CHUNK_OVERLAP = 16
+
+
+def load_tokenizer():
+    """Loads tokenizer.json without the truncation/padding configured for the model input"""
+    tokenizer = Tokenizer.from_file(os.path.join(embedder.MODEL_DIR, "tokenizer.json"))
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return tokenizer
+
+
+class Chunker:
+    """Token window splitter: chunk_tokens per window, consecutive windows share overlap tokens"""
+
+    def __init__(self, chunk_tokens=DEFAULT_CHUNK_TOKENS, overlap=DEFAULT_CHUNK_OVERLAP, tokenizer=None):
+        if overlap >= chunk_tokens:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        self.chunk_tokens = chunk_tokens
+        self.overlap = overlap
+        self.tokenizer = tokenizer or load_tokenizer()
+
+    def split(self, text):
+        """Returns the chunks of text, cut at token boundaries using the tokenizer's character offsets"""
+        offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+        if len(offsets) <= self.chunk_tokens:
+            return [text.strip()] if text.strip() else []
+
+        chunks = []
+        step = self.chunk_tokens - self.overlap
+        for start in range(0, len(offsets), step):
+            window = offsets[start:start + self.chunk_tokens]
+            chunks.append(text[window[0][0]:window[-1][1]].strip())
+            if start + self.chunk_tokens >= len(offsets):
+                break
+        return chunks
@@ -0,0 +1,99 @@
+"""
+    Fits the retrieved context into the model's small context window.
+    Ollama keeps only the last num_ctx tokens of a prompt, so context that does not fit
+    is dropped silently, after its prompt evaluation was paid for. The packer counts
+    tokens and keeps entries best first while they fit the budget (num_ctx minus the
+    prompt template and the num_predict tokens reserved for the answer):
+        - an entry whose text is already in a kept one is skipped
+        - consecutive chunks of one article are merged, their shared overlap sent once
+        - the best entry always survives, cut at a token boundary when it alone is too long
+
+    Tokens are counted with the bundled tokenizer.json of the embedding model. The
+    generation model tokenizes differently, so counts are scaled by a safety margin.
+"""
+import re
+import math
+import chunker
+
+DEFAULT_TOKEN_MARGIN = 1.25
+
+_SPACES = re.compile(r"\s+")
+
+
+def _normalized(text):
+    return _SPACES.sub(" ", text).strip().lower()
+
+def join_overlapping(first, second):
+    """first + second without the text they share (the end of first repeated at the start of second)"""
+    for size in range(min(len(first), len(second)), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + " " + second
+
+
+class ContextPacker:
+    def __init__(self, tokenizer=None, margin=DEFAULT_TOKEN_MARGIN):
+        self.tokenizer = tokenizer or chunker.load_tokenizer()
+        self.margin = margin
+
+    def count(self, text):
+        return math.ceil(len(self.tokenizer.encode(text, add_special_tokens=False).ids) * self.margin)
+
+    def truncate(self, text, tokens):
+        """Longest prefix of text that counts at most tokens, cut at a token boundary"""
+        offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+        keep = int(tokens / self.margin)
+        if keep >= len(offsets):
+            return text
+        return text[:offsets[keep - 1][1]] if keep > 0 else ""
+
+    def _merge(self, kept, entry):
+        """entry merged into the kept entry of the neighbouring chunk of the same article, or None"""
+        if entry.get("chunk") is None:
+            return None
+        for i, other in enumerate(kept):
+            if other.get("url") != entry.get("url"):
+                continue
+            first, last = other["chunks"]
+            if entry["chunk"] == last + 1:
+                return i, dict(other, text=join_overlapping(other["text"], entry["text"]), chunks=(first, entry["chunk"]))
+            if entry["chunk"] == first - 1:
+                return i, dict(other, text=join_overlapping(entry["text"], other["text"]), chunks=(entry["chunk"], last))
+        return None
+
+    def pack(self, entries, budget, render):
+        """
+        Entries are dicts with "text" (and "url" / "chunk" for merging), best first; render(entry)
+        is the entry as it appears in the prompt. Returns the kept entries, best first, each
+        with its cost in "tokens".
+        """
+        kept = []
+        used = 0
+        for entry in entries:
+            text = _normalized(entry["text"])
+            if not text or any(text in _normalized(other["text"]) for other in kept):
+                continue
+
+            merged = self._merge(kept, entry)
+            if merged is not None:
+                i, candidate = merged
+                cost = self.count(render(candidate))
+                if used - kept[i]["tokens"] + cost <= budget:
+                    used += cost - kept[i]["tokens"]
+                    kept[i] = dict(candidate, tokens=cost)
+                continue
+
+            chunk = entry.get("chunk")
+            candidate = dict(entry, chunks=(chunk, chunk))
+            cost = self.count(render(candidate))
+            if used + cost > budget and not kept:
+                # The best entry always survives, cut to what is left after its heading
+                room = budget - self.count(render(dict(candidate, text="")))
+                candidate["text"] = self.truncate(entry["text"], room)
+                if not candidate["text"]:
+                    continue
+                cost = self.count(render(candidate))
+            if used + cost <= budget or not kept:
+                kept.append(dict(candidate, tokens=cost))
+                used += cost
+        return kept
@@ -0,0 +1,117 @@
+"""
+    Embedding model loading and batched encoding.
+    Shared by generate_embeddings.py (bulk encoding of the knowledge base) and the
+    helper (query encoding). Bulk encoding streams fixed-size batches into a
+    preallocated .npy memmap, optionally sharded across a process pool, so memory
+    stays bounded by the batch size instead of growing with the knowledge base.
+"""
+import os
+import json
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import kb_index
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models', 'all-MiniLM-L6-v2-onnx')
+
+DEFAULT_BATCH_SIZE = 64
+
+
+def load_model(threads=None):
+    """
+    Loads the ONNX embedding model. threads sets ONNX Runtime's intra-op thread pool
+    (None keeps its default of one thread per physical core).
+    """
+    # Imported here: light_embed pulls in huggingface_hub, and chunker / context_packer
+    # import this module for MODEL_DIR only
+    from light_embed import TextEmbedding
+
+    config_path = os.path.join(MODEL_DIR, 'config.json')
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config_dict = json.load(f)
+    config_dict["onnx_file"] = "model.onnx"  # Add it explicitly to avoid error onnx_file must be present in model_config
+
+    model = TextEmbedding(model_name_or_path=MODEL_DIR, model_config=config_dict)
+    if threads:
+        set_intra_op_threads(model, threads)
+    return model
+
+def set_intra_op_threads(model, threads):
+    """light_embed does not expose SessionOptions, so the ONNX session is recreated with the thread count"""
+    import onnxruntime
+    ort_model = model.modules[0]
+    session = ort_model._session
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = threads
+    ort_model._session = onnxruntime.InferenceSession(
+        session._model_path, options, providers=session.get_providers()
+    )
+
+def batched(texts, batch_size):
+    """Groups any iterable of texts into lists of at most batch_size"""
+    batch = []
+    for text in texts:
+        batch.append(text)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def encode(model, texts, batch_size=DEFAULT_BATCH_SIZE):
+    """Encodes a small list of texts into unit vectors"""
+    return kb_index.normalize(model.encode(texts, batch_size=batch_size))
+
+# --- Process pool workers: each process loads its own model once ---
+
+_worker_model = None
+
+def _init_worker(threads):
+    global _worker_model
+    _worker_model = load_model(threads)
+
+def _encode_shard(start, texts):
+    return start, encode(_worker_model, texts, batch_size=len(texts))
+
+def encode_to_memmap(texts, count, path, model=None, batch_size=DEFAULT_BATCH_SIZE, workers=1, threads=None):
+    """
+    Encodes count texts (any iterable, consumed lazily) into a preallocated float32
+    .npy file at path and returns it as a read-only memmap.
+    With workers > 1 batches are sharded across processes; each worker uses
+    threads intra-op threads, so workers * threads should not exceed the cores.
+    """
+    out = None
+    rows = 0
+
+    def write(start, vectors):
+        nonlocal out
+        if out is None:
+            out = np.lib.format.open_memmap(path, mode='w+', dtype='float32', shape=(count, vectors.shape[1]))
+        out[start:start + len(vectors)] = vectors
+
+    if workers <= 1:
+        model = model or load_model(threads)
+        for batch in batched(texts, batch_size):
+            write(rows, encode(model, batch, batch_size))
+            rows += len(batch)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,)) as pool:
+            pending = set()
+            for batch in batched(texts, batch_size):
+                pending.add(pool.submit(_encode_shard, rows, batch))
+                rows += len(batch)
+                # Bound the batches in flight so memory does not grow with the knowledge base
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        write(*future.result())
+            for future in pending:
+                write(*future.result())
+
+    if rows != count:
+        raise ValueError(f"Expected {count} texts, got {rows}")
+    if out is None:
+        raise ValueError("Nothing to encode")
+    out.flush()
+    del out
+    return np.load(path, mmap_mode='r')
@@ -1,63 +1,337 @@
 import sys
 import os
-import json
-import requests
+import hashlib
+import argparse
+from itertools import groupby
 import numpy as np
-from light_embed import TextEmbedding
+import kb_index
+import embedder
+import kb_ingest
+import kb_generation
+import text_store
+import metadata_store
+import bm25_index
+import http_client
+from chunker import Chunker, DEFAULT_CHUNK_TOKENS, DEFAULT_CHUNK_OVERLAP
 # print("Python executable being used:", sys.executable)
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python generate_embeddings.py <knowledge_base_url>")
-        sys.exit(1)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate embeddings and the search index from the KB")
+    parser.add_argument("kb_url", help="Knowledge base API URL")
+    parser.add_argument("output_file", help="File inside the output directory (its directory is used)")
+    parser.add_argument("--index-type", default="auto", choices=("auto",) + kb_index.INDEX_TYPES,
+                        help="auto picks flat/hnsw/ivf/ivfpq from the number of documents")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF cells (default ~4*sqrt(N))")
+    parser.add_argument("--nprobe", type=int, default=None, help="Default IVF cells visited per query")
+    parser.add_argument("--hnsw-m", type=int, default=kb_index.DEFAULT_HNSW_M, help="HNSW neighbours per node")
+    parser.add_argument("--ef-search", type=int, default=kb_index.DEFAULT_EF_SEARCH, help="Default HNSW search depth")
+    parser.add_argument("--pq-m", type=int, default=kb_index.DEFAULT_PQ_M, help="PQ sub-quantizers (must divide the dimension)")
+    parser.add_argument("--full", action="store_true", help="Re-embed every document instead of only the changed ones")
+    parser.add_argument("--batch-size", type=int, default=embedder.DEFAULT_BATCH_SIZE, help="Documents per encode call")
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads per process")
+    parser.add_argument("--workers", type=int, default=1, help="Encoding processes (each loads its own model)")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS, help="Tokens per chunk")
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_CHUNK_OVERLAP, help="Tokens shared by consecutive chunks")
+    parser.add_argument("--retries", type=int, default=http_client.DEFAULT_RETRIES,
+                        help="Retries (with backoff) of failed requests to the KB API")
+    return parser.parse_args()
 
-    kb_url = sys.argv[1]
-    output_file = sys.argv[2]
-    output_dir = os.path.dirname(output_file)
 
-    try:
-        response = requests.get(kb_url)
-        response.raise_for_status()
-        kb_data = response.json()
-    except Exception as e:
-        print(f"Error fetching KB from {kb_url}: {e}")
-        sys.exit(1)
+CHUNK_STORE = "chunks"  # chunks.bin, one chunk text per metadata row
+
+
+def document_text(item):
+    return f"{item['title']}\n{item['keywords']}\n{item['content']}"
+
+
+def content_hash(text):
+    """Fingerprint of the document text, used to detect changed articles"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def iter_chunk_records(items, chunker):
+    """
+    One record per chunk of each document. The document hash is repeated on every
+    chunk, so changes are still detected per document.
+    """
+    for item in items:
+        text = document_text(item)
+        doc_hash = content_hash(text)
+        for number, chunk in enumerate(chunker.split(text)):
+            yield {
+                "extid": item["extid"],
+                "title": item["title"],
+                "url": item["url"],
+                "hash": doc_hash,
+                "chunk": number,
+                "text": chunk
+            }
+
 
-    model_dir = r"C:\xampp\htdocs\moodle\local\ollamachat\models\all-MiniLM-L6-v2-onnx"
-    config_path = os.path.join(model_dir, "config.json")
+def metadata_entry(record):
+    return {
+        "extid": record["extid"],
+        "title": record["title"],
+        "url": record["url"],
+        "hash": record["hash"],
+        "chunk": record["chunk"]
+    }
 
-    # turn the json into a dictionary to be able to load the  configuration
-    with open(config_path, 'r', encoding='utf-8') as f:
-        config_dict = json.load(f)
 
-    config_dict["onnx_file"] = "model.onnx" # Add it explicity to avoid error onnx_file must be present in model_config
+def chunking_info(args):
+    return {"chunk_tokens": args.chunk_tokens, "chunk_overlap": args.chunk_overlap}
 
-    model = TextEmbedding(model_name_or_path=model_dir, model_config=config_dict)
 
-    documents = []
+def load_previous(output_dir, args):
+    """
+    Returns (embeddings, metadata, index, info) from the last run in output_dir, or None
+    when there is nothing reusable (first run, files written before incremental updates
+    or chunking existed, or different chunking options).
+    """
+    embeddings_path = os.path.join(output_dir, "embeddings.npy")
+    if not os.path.exists(os.path.join(output_dir, kb_index.INDEX_FILE)):
+        return None
+    if not text_store.exists(os.path.join(output_dir, CHUNK_STORE)):
+        return None
+
+    index, info = kb_index.read_index(output_dir, mmap=False)
+    if info.get("metric") != "ip" or info.get("ids") != "row":
+        return None
+    if any(info.get(key) != value for key, value in chunking_info(args).items()):
+        return None
+
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    # Rows as dicts: the update edits them in place and writes the store back
+    metadata = metadata_store.load(output_dir).entries()
+
+    return embeddings, metadata, index, info
+
+
+def save_metadata(output_dir, metadata):
+    metadata_store.write_metadata(output_dir, metadata)
+    print("Metadata saved to:", os.path.join(output_dir, metadata_store.INFO_FILE))
+
+
+def save_lexical_index(output_dir, metadata):
+    """BM25 index over the title and chunk text of each row, rebuilt from the chunk store (nothing is re-embedded)"""
+    store = text_store.TextStore(os.path.join(output_dir, CHUNK_STORE))
+    texts = (f"{entry['title']}\n{store[row]}" if entry else "" for row, entry in enumerate(metadata))
+    print("BM25 index saved to:", bm25_index.write(bm25_index.build(texts), output_dir))
+
+
+def index_options(args):
+    return {
+        "nlist": args.nlist,
+        "hnsw_m": args.hnsw_m,
+        "pq_m": args.pq_m,
+        "nprobe": args.nprobe,
+        "ef_search": args.ef_search
+    }
+
+
+def full_build(spool_path, count, output_dir, args):
+    """Embeds every chunk and builds a fresh index in output_dir, a new generation; returns True"""
     metadata = []
+    store = text_store.TextStoreWriter(os.path.join(output_dir, CHUNK_STORE))
 
-    for item in kb_data:
-        text = f"{item['title']}\n{item['keywords']}\n{item['content']}"
-        documents.append(text)
-        metadata.append({
-            "extid": item["extid"],
-            "title": item["title"],
-            "url": item["url"]
-        })
+    def chunks():
+        # Read lazily from the spool, only the current batch of texts is in memory
+        for record in kb_ingest.read_spool(spool_path):
+            metadata.append(metadata_entry(record))
+            store.append(record["text"])
+            yield record["text"]
 
-    embeddings = model.encode(documents)
+    # Unit vectors (inner product search then scores true cosine similarity), streamed
+    # batch by batch into a preallocated memmap and swapped in once complete
     embeddings_path = os.path.join(output_dir, "embeddings.npy")
-    metadata_path = os.path.join(output_dir, "metadata.json")
+    embeddings = embedder.encode_to_memmap(
+        chunks(), count, embeddings_path + ".tmp",
+        batch_size=args.batch_size, workers=args.workers, threads=args.threads
+    )
+    os.replace(embeddings_path + ".tmp", embeddings_path)
+    print("Embeddings saved to:", embeddings_path)
+    store.close()
+    save_metadata(output_dir, metadata)
+    save_lexical_index(output_dir, metadata)
 
-    np.save(embeddings_path, embeddings)
+    # Build (and train) the search index once here, the helper memory-maps it at query time
+    index, info = kb_index.build_index(embeddings, index_type=args.index_type, **index_options(args))
+    info.update(chunking_info(args))
+    index_path = kb_index.write_index(index, info, output_dir)
 
-    with open(metadata_path, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, indent=2)
+    print(f"Full build: {len(metadata)} chunks embedded")
+    print(f"Index ({info['factory']}) saved to:", index_path)
+    return True
 
+
+def incremental_update(spool_path, count, previous_dir, output_dir, args, embeddings, metadata, index, info,
+                       rewrite=False):
+    """
+    Embeds only the chunks of new and changed documents, matched by extid and content hash,
+    reusing the rest of the build in previous_dir. Metadata rows are index ids. Rows of
+    changed and removed documents are emptied (None) and reused by the chunks of the next
+    new or changed documents.
+
+    The result is written to output_dir, a new generation. Returns False when nothing
+    changed and nothing was written, unless rewrite is set (moving a build from before
+    generations).
+
+    Only the embedding and, except for HNSW, the FAISS update follow the size of the diff.
+    embeddings.npy, the chunk store, the metadata store and the BM25 index are still
+    written out whole (copied, not recomputed, for unchanged rows; BM25 re-tokenizes
+    every row), so that part of a reindex grows with the knowledge base. They are
+    written into a new generation because the services memory-map the current one
+    while a reindex runs.
+    """
+    target_type = args.index_type
+    if target_type == "auto":
+        target_type = kb_index.choose_index_type(count)
+    if target_type != info["index_type"]:
+        # The knowledge base crossed an index type boundary, start over
+        print(f"Index type changes from {info['index_type']} to {target_type}, running a full build")
+        return full_build(spool_path, count, output_dir, args)
+
+    rows_by_extid = {}
+    for row, entry in enumerate(metadata):
+        if entry:
+            rows_by_extid.setdefault(entry["extid"], []).append(row)
+
+    stale_rows = []
+    fresh = []  # Chunk records of new and changed documents
+    added = changed = 0
+    # Chunks of one document are consecutive in the spool
+    for extid, records in groupby(kb_ingest.read_spool(spool_path), key=lambda record: record["extid"]):
+        records = list(records)
+        rows = rows_by_extid.pop(extid, None)
+        if rows is None:
+            added += 1
+            fresh.extend(records)
+        elif metadata[rows[0]]["hash"] != records[0]["hash"]:
+            changed += 1
+            stale_rows.extend(rows)
+            fresh.extend(records)
+
+    # Whatever was not seen in the export has been deleted from the KB
+    removed = len(rows_by_extid)
+    for rows in rows_by_extid.values():
+        stale_rows.extend(rows)
+    stale_rows.sort()
+    for row in stale_rows:
+        metadata[row] = None
+
+    print(f"Incremental update: {added} new, {changed} changed, {removed} removed documents")
+    if not (fresh or stale_rows or rewrite):
+        return False
+
+    # New chunks reuse empty rows before growing the table
+    new_rows = [row for row, entry in enumerate(metadata) if entry is None][:len(fresh)]
+    while len(new_rows) < len(fresh):
+        new_rows.append(len(metadata))
+        metadata.append(None)
+    for row, record in zip(new_rows, fresh):
+        metadata[row] = metadata_entry(record)
+    update_texts = [record["text"] for record in fresh]
+
+    # Stored vectors are aligned with metadata rows, emptied rows are zeroed.
+    # The new file is a memmap filled in chunks, the old one is never fully loaded.
+    embeddings_path = os.path.join(output_dir, "embeddings.npy")
+    grown = np.lib.format.open_memmap(
+        embeddings_path + ".tmp", mode="w+", dtype="float32", shape=(len(metadata), embeddings.shape[1])
+    )
+    for start in range(0, embeddings.shape[0], kb_index.ADD_CHUNK):
+        end = min(start + kb_index.ADD_CHUNK, embeddings.shape[0])
+        grown[start:end] = embeddings[start:end]
+    grown[stale_rows] = 0
+    update_ids = np.array(new_rows, dtype='int64')
+    if update_texts:
+        model = embedder.load_model(args.threads)
+        for start, batch in zip(range(0, len(update_texts), args.batch_size),
+                                embedder.batched(update_texts, args.batch_size)):
+            grown[update_ids[start:start + len(batch)]] = embedder.encode(model, batch, args.batch_size)
+    grown.flush()
+    del grown
+    os.replace(embeddings_path + ".tmp", embeddings_path)
+    embeddings = np.load(embeddings_path, mmap_mode="r")
     print("Embeddings saved to:", embeddings_path)
-    print("Metadata saved to:", metadata_path)
+
+    # The chunk store is rewritten sequentially: copied text for kept rows, new text for updated ones
+    old_store = text_store.TextStore(os.path.join(previous_dir, CHUNK_STORE))
+    new_texts = dict(zip(new_rows, update_texts))
+    writer = text_store.TextStoreWriter(os.path.join(output_dir, CHUNK_STORE))
+    for row, entry in enumerate(metadata):
+        if row in new_texts:
+            writer.append(new_texts[row])
+        elif entry is not None and row < len(old_store):
+            writer.append(old_store[row])
+        else:
+            writer.append("")
+    writer.close()
+    save_metadata(output_dir, metadata)
+    save_lexical_index(output_dir, metadata)
+
+    if kb_index.supports_remove(info):
+        # Patch the saved index in place, cost follows the size of the diff
+        if stale_rows:
+            index.remove_ids(np.array(stale_rows, dtype='int64'))
+        if update_ids.size:
+            index.add_with_ids(embeddings[update_ids], update_ids)
+        info["ntotal"] = int(index.ntotal)
+    else:
+        # HNSW cannot drop vectors: rebuild the graph from the stored vectors, nothing is re-embedded
+        live_ids = np.array([row for row, entry in enumerate(metadata) if entry is not None], dtype='int64')
+        index, info = kb_index.build_index(
+            embeddings[live_ids], ids=live_ids, index_type=info["index_type"], **index_options(args)
+        )
+        info.update(chunking_info(args))
+
+    index_path = kb_index.write_index(index, info, output_dir)
+    print(f"Index ({info['factory']}) saved to:", index_path)
+    return True
+
+
+def main():
+    args = parse_args()
+
+    kb_url = args.kb_url
+    output_file = args.output_file
+    output_dir = os.path.dirname(output_file)
+
+    # Stream the export to a spool file of chunks: items are parsed and split as they
+    # arrive, and the spool can be re-read by the builds below without holding the KB in memory
+    spool_path = os.path.join(output_dir, "kb_export.jsonl.tmp")
+    try:
+        chunker = Chunker(args.chunk_tokens, args.chunk_overlap)
+        http_client.configure(kb_url, retries=args.retries)
+        items = kb_ingest.iter_kb_items(kb_url, session=http_client.get_session(kb_url))
+        count = kb_ingest.spool_items(iter_chunk_records(items, chunker), spool_path)
+    except Exception as e:
+        kb_ingest.remove_spool(spool_path)
+        print(f"Error fetching KB from {kb_url}: {e}")
+        sys.exit(1)
+
+    # Everything is written into a new generation, switched to only once complete: the
+    # services keep reading the current one meanwhile and never see a half-written set
+    current_generation, previous_dir = kb_generation.current(output_dir)
+    generation, generation_dir = kb_generation.create(output_dir)
+    try:
+        previous = None if args.full else load_previous(previous_dir, args)
+        if previous is None:
+            written = full_build(spool_path, count, generation_dir, args)
+        else:
+            written = incremental_update(spool_path, count, previous_dir, generation_dir, args, *previous,
+                                         rewrite=current_generation is None)
+        if written:
+            kb_generation.publish(output_dir, generation)
+            print("Generation published:", generation_dir)
+        else:
+            kb_generation.discard(generation_dir)
+    except BaseException:
+        kb_generation.discard(generation_dir)
+        raise
+    finally:
+        kb_ingest.remove_spool(spool_path)
+
 
 if __name__ == "__main__":
     main()
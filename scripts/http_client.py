@@ -0,0 +1,82 @@
+"""
+    Shared HTTP session for Ollama and the knowledge base API.
+    One requests.Session per process, with a pooled adapter mounted per host, so
+    connections are kept alive and reused across questions instead of opening a
+    new TCP connection for every call.
+
+    Connection errors are retried with exponential backoff for every method.
+    Read errors and 502/503/504 answers are retried only for GET: a POST to
+    /api/generate may already have started generating.
+"""
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5  # Seconds, doubled on each retry
+
+RETRY_STATUSES = (502, 503, 504)
+
+# Per-host overrides of pool_size / retries / backoff, keyed by "scheme://host:port"
+_host_settings = {}
+
+_session = None
+_mounted = set()
+_lock = threading.Lock()
+
+
+def origin(url):
+    parts = urlparse(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+def make_adapter(pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False
+    )
+    # pool_maxsize is the number of connections kept alive to the host; more concurrent
+    # requests still work but their extra connections are closed after use
+    return HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+def configure(url, **settings):
+    """
+    Sets pool_size, retries and/or backoff for the host of url (before or after first use).
+    Returns the host's previous settings, for restore().
+    """
+    key = origin(url)
+    with _lock:
+        previous = dict(_host_settings.get(key, {}))
+        _host_settings.setdefault(key, {}).update(settings)
+        _mounted.discard(key)  # Mounted again with the new settings on the next get_session
+    return previous
+
+def restore(url, settings):
+    """Puts back the settings configure() returned for the host of url"""
+    key = origin(url)
+    with _lock:
+        if settings:
+            _host_settings[key] = dict(settings)
+        else:
+            _host_settings.pop(key, None)
+        _mounted.discard(key)
+
+def get_session(url):
+    """The process-wide session, with a pooled adapter for the host of url"""
+    global _session
+    key = origin(url)
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+        if key not in _mounted:
+            _session.mount(key + "/", make_adapter(**_host_settings.get(key, {})))
+            _mounted.add(key)
+        return _session
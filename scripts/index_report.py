@@ -0,0 +1,105 @@
+"""
+    Recall vs latency report for the FAISS index types on our own embeddings.
+    Builds each index type over embeddings.npy, sweeps the query knob (nprobe / ef_search)
+    and compares the results against exact search, so the tradeoff can be chosen
+    before passing --index-type / --nprobe / --ef-search to generate_embeddings.py.
+
+    Usage: python3 index_report.py <embeddings_dir> [--queries 200] [--k 5] [--json report.json]
+"""
+import sys
+import json
+import time
+import os
+import argparse
+import numpy as np
+import faiss
+import kb_index
+import kb_generation
+
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+def sample_queries(embeddings, n_queries, noise=0.05):
+    """Perturbed copies of random knowledge base vectors stand in for user questions"""
+    rng = np.random.default_rng(0)
+    rows = rng.choice(embeddings.shape[0], min(n_queries, embeddings.shape[0]), replace=False)
+    queries = embeddings[rows] + rng.normal(0, noise, (len(rows), embeddings.shape[1])).astype('float32')
+    return np.ascontiguousarray(queries, dtype='float32')
+
+def measure(index, queries, k, truth, params=None):
+    """Searches one query at a time (like the helper does) and returns recall@k and latency stats in ms"""
+    latencies = []
+    hits = 0
+    for i in range(queries.shape[0]):
+        start = time.perf_counter()
+        _, found = index.search(queries[i:i + 1], k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(np.intersect1d(found[0], truth[i]))
+
+    latencies = np.array(latencies)
+    return {
+        "recall": hits / float(truth.size),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "mean_ms": float(latencies.mean())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency report for the FAISS index types")
+    parser.add_argument("embeddings_dir")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--types", default=",".join(kb_index.INDEX_TYPES))
+    parser.add_argument("--nprobe", type=parse_int_list, default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=parse_int_list, default=[16, 32, 64, 128])
+    parser.add_argument("--json", default=None, help="Also write the rows to this file")
+    args = parser.parse_args()
+
+    embeddings = kb_index.normalize(np.load(os.path.join(kb_generation.current_dir(args.embeddings_dir), "embeddings.npy")))
+    queries = kb_index.normalize(sample_queries(embeddings, args.queries))
+
+    # Exact results are the reference for recall
+    exact = faiss.IndexFlatIP(embeddings.shape[1])
+    exact.add(embeddings)
+    _, truth = exact.search(queries, args.k)
+
+    rows = []
+    for index_type in args.types.split(","):
+        start = time.perf_counter()
+        try:
+            index, info = kb_index.build_index(embeddings, index_type=index_type)
+        except RuntimeError as e:
+            # e.g. not enough vectors to train IVF-PQ
+            print(f"Skipping {index_type}: {str(e).splitlines()[0]}", file=sys.stderr)
+            continue
+        build_s = time.perf_counter() - start
+
+        if index_type in ("ivf", "ivfpq"):
+            sweep = [("nprobe", n, kb_index.search_parameters(index, nprobe=n))
+                     for n in args.nprobe if n <= info["nlist"]]
+        elif index_type == "hnsw":
+            sweep = [("ef_search", ef, kb_index.search_parameters(index, ef_search=ef)) for ef in args.ef_search]
+        else:
+            sweep = [("", "", None)]
+
+        for knob, value, params in sweep:
+            row = {"index_type": index_type, "factory": info["factory"], "knob": knob, "value": value,
+                   "build_s": round(build_s, 3)}
+            row.update(measure(index, queries, args.k, truth, params))
+            rows.append(row)
+
+    print(f"{embeddings.shape[0]} vectors, {queries.shape[0]} queries, recall@{args.k}")
+    print(f"{'factory':<18}{'knob':<16}{'recall':>8}{'p50 ms':>10}{'p95 ms':>10}{'build s':>10}")
+    for row in rows:
+        knob = f"{row['knob']}={row['value']}" if row['knob'] else "-"
+        print(f"{row['factory']:<18}{knob:<16}{row['recall']:>8.3f}{row['p50_ms']:>10.3f}"
+              f"{row['p95_ms']:>10.3f}{row['build_s']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+    Disk cache of knowledge API exports, for the fallback retrieval when the embeddings
+    found nothing. Every CLI question is a new process, so an in-process cache never hit
+    and each fallback downloaded and parsed the whole export again.
+
+    Per URL the cache keeps the items (JSON per row in a text store) and a BM25 index over
+    them, so a fallback is a local memory-mapped read: search the index, decode the few
+    selected items. Layout in the cache directory:
+
+        <sha1 of the URL>/meta.json        URL, ETag, Last-Modified, fetch time, current generation
+        <sha1 of the URL>/<generation>/    items.bin and bm25_* files
+
+    A copy younger than ttl is used as is. An older one is revalidated with
+    If-None-Match / If-Modified-Since: a 304 only renews it, a 200 writes a new generation.
+    When the API cannot be reached the old copy keeps being used.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import requests
+import kb_ingest
+import text_store
+import bm25_index
+
+DEFAULT_TTL = 3600  # Seconds
+STALE_GENERATION_SECONDS = 300  # Old generations are kept this long for processes still reading them
+
+META_FILE = "meta.json"
+
+
+def default_cache_dir(embeddings_dir=None):
+    """$OLLAMACHAT_KB_CACHE, else next to the embeddings, else the temporary directory"""
+    if os.environ.get("OLLAMACHAT_KB_CACHE"):
+        return os.environ["OLLAMACHAT_KB_CACHE"]
+    if embeddings_dir:
+        return os.path.join(embeddings_dir, "kb_cache")
+    return os.path.join(tempfile.gettempdir(), "local_ollamachat_kb")
+
+def knowledge_text(item):
+    """Indexed text of an item; the title counts double, as in the old SequenceMatcher scoring"""
+    title = item.get("title", "")
+    return f"{title}\n{title}\n{item.get('keywords', '')}\n{item.get('content', '')}"
+
+
+class CachedKnowledge:
+    """Items and BM25 index of one cached export, memory-mapped; items are decoded on access"""
+
+    def __init__(self, path):
+        self.items = text_store.TextStore(os.path.join(path, "items"))
+        self.index = bm25_index.load(path)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, row):
+        return json.loads(self.items[row])
+
+    def search(self, prompt, k=3):
+        """Best k items for prompt"""
+        rows, _ = self.index.search(prompt, k)
+        return [self[row] for row in rows]
+
+
+class KnowledgeCache:
+    """Thread-safe; one refresh per URL at a time within a process"""
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self._opened = {}  # url -> (generation, CachedKnowledge)
+        self._stats = {"fresh": 0, "revalidated": 0, "downloaded": 0, "stale": 0}
+
+    def _entry_dir(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+    def _read_meta(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, META_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, entry_dir, meta):
+        path = os.path.join(entry_dir, META_FILE)
+        with open(f"{path}.{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+    def get(self, url, session=requests, timeout=kb_ingest.REQUEST_TIMEOUT):
+        """The cached export of url, refreshed first when older than ttl; raises when there is no usable copy"""
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url, threading.Lock())
+        with url_lock:
+            entry_dir = self._entry_dir(url)
+            meta = self._read_meta(entry_dir)
+            if meta is not None and time.time() - meta["fetched_at"] < self.ttl:
+                self._count("fresh")
+            else:
+                try:
+                    meta = self._refresh(url, entry_dir, meta, session, timeout)
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    if meta is None:
+                        raise
+                    logging.warning(f"Knowledge API not reachable, using the cached copy: {str(e)}")
+                    self._count("stale")
+            return self._open(url, entry_dir, meta["generation"])
+
+    def _refresh(self, url, entry_dir, meta, session, timeout):
+        headers = {'Accept': 'application/json; charset=utf-8', 'User-Agent': 'Mozilla/5.0'}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        generation = f"{int(time.time() * 1000)}-{os.getpid()}"
+        path = os.path.join(entry_dir, generation)
+        os.makedirs(path, exist_ok=True)
+        validators = {}
+        try:
+            # Streamed into the text store, the export is never held in memory
+            writer = text_store.TextStoreWriter(os.path.join(path, "items"))
+            for item in kb_ingest.iter_kb_items(url, session=session, headers=headers, timeout=timeout,
+                                                validators=validators):
+                writer.append(json.dumps(item, ensure_ascii=False))
+            writer.close()
+            if validators.get("status") == 304:
+                shutil.rmtree(path, ignore_errors=True)
+                meta["fetched_at"] = time.time()
+                self._write_meta(entry_dir, meta)
+                self._count("revalidated")
+                return meta
+            items = text_store.TextStore(os.path.join(path, "items"))
+            count = len(items)
+            bm25_index.write(bm25_index.build(knowledge_text(json.loads(items[row])) for row in range(count)), path)
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+        meta = {
+            "url": url,
+            "etag": validators.get("etag"),
+            "last_modified": validators.get("last_modified"),
+            "fetched_at": time.time(),
+            "generation": generation,
+            "items": count
+        }
+        self._write_meta(entry_dir, meta)
+        self._count("downloaded")
+        self._remove_old_generations(entry_dir, generation)
+        return meta
+
+    def _remove_old_generations(self, entry_dir, current):
+        for name in os.listdir(entry_dir):
+            path = os.path.join(entry_dir, name)
+            if name == current or not os.path.isdir(path):
+                continue
+            if time.time() - os.path.getmtime(path) > STALE_GENERATION_SECONDS:
+                # May still be mapped by another process (Windows refuses), retried on the next refresh
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _open(self, url, entry_dir, generation):
+        with self._lock:
+            opened = self._opened.get(url)
+            if opened is None or opened[0] != generation:
+                opened = self._opened[url] = (generation, CachedKnowledge(os.path.join(entry_dir, generation)))
+            return opened[1]
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, urls=len(self._opened))
@@ -0,0 +1,78 @@
+"""
+    Generations of the embeddings directory. generate_embeddings.py writes each build
+    (embeddings, chunk store, metadata, BM25 and FAISS index) into a new generation
+    directory and points current.json at it last, so a reader never pairs files of two
+    builds, e.g. new embeddings with the old metadata:
+
+        <embeddings_dir>/current.json           {"generation": ..., "published_at": ...}
+        <embeddings_dir>/generations/<id>/      embeddings.npy, chunks.*, metadata_*, bm25_*, index.*
+
+    Readers resolve the directory once through current.json and open every file there;
+    the generation id is their reload key. Directories built before generations existed
+    have the files at the top level and are read there, until the next build moves them.
+"""
+import os
+import json
+import time
+import shutil
+
+CURRENT_FILE = "current.json"
+GENERATIONS_DIR = "generations"
+
+# Files of a build written directly in the embeddings directory, before generations
+FLAT_FILE_PREFIXES = ("embeddings.npy", "chunks.", "metadata", "bm25_", "index.faiss", "index_info.json")
+
+
+def current(embeddings_dir):
+    """(generation id, directory holding its files); the id is None for a directory without generations"""
+    try:
+        with open(os.path.join(embeddings_dir, CURRENT_FILE), encoding="utf-8") as f:
+            generation = json.load(f)["generation"]
+    except FileNotFoundError:
+        return None, embeddings_dir
+    return generation, os.path.join(embeddings_dir, GENERATIONS_DIR, generation)
+
+def current_dir(embeddings_dir):
+    return current(embeddings_dir)[1]
+
+def create(embeddings_dir):
+    """(generation id, directory) of a new, empty generation; readers ignore it until publish()"""
+    milliseconds = int(time.time() * 1000)
+    while True:
+        generation = f"{milliseconds}-{os.getpid()}"
+        path = os.path.join(embeddings_dir, GENERATIONS_DIR, generation)
+        try:
+            os.makedirs(path)
+            return generation, path
+        except FileExistsError:
+            milliseconds += 1  # Two builds within the same millisecond
+
+def publish(embeddings_dir, generation):
+    """Makes generation the current one, then removes the builds before the previous one"""
+    previous, _ = current(embeddings_dir)
+    path = os.path.join(embeddings_dir, CURRENT_FILE)
+    with open(f"{path}.{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"generation": generation, "published_at": time.time()}, f)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+    if previous is None:
+        _remove_flat_files(embeddings_dir)
+    # The previous generation is kept for processes that resolved it just before the switch
+    generations_dir = os.path.join(embeddings_dir, GENERATIONS_DIR)
+    for name in os.listdir(generations_dir):
+        if name not in (generation, previous):
+            # May still be mapped by another process (Windows refuses), retried on the next build
+            shutil.rmtree(os.path.join(generations_dir, name), ignore_errors=True)
+
+def discard(path):
+    """Removes a generation that failed or was not needed"""
+    shutil.rmtree(path, ignore_errors=True)
+
+def _remove_flat_files(embeddings_dir):
+    for name in os.listdir(embeddings_dir):
+        path = os.path.join(embeddings_dir, name)
+        if name.startswith(FLAT_FILE_PREFIXES) and os.path.isfile(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
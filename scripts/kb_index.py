@@ -0,0 +1,189 @@
+"""
+    FAISS index helpers shared by generate_embeddings.py (build) and the helper (query).
+    https://github.com/facebookresearch/faiss/wiki/Guidelines-to-choose-an-index
+
+    Index types:
+        flat  - exact brute force, best for small knowledge bases
+        hnsw  - graph based, no training, very fast queries (query knob: ef_search)
+        ivf   - inverted lists over k-means cells (query knob: nprobe)
+        ivfpq - ivf with product-quantized vectors, smallest memory footprint (query knob: nprobe)
+
+    Embeddings are L2-normalized and searched by inner product, so every index
+    returns true cosine similarities in [-1, 1] (higher is better).
+
+    Index ids are metadata row numbers. Flat and HNSW are wrapped in an IDMap2 so
+    generate_embeddings.py can patch them with add_with_ids/remove_ids (IVF supports
+    ids natively). HNSW cannot remove vectors, so it is rebuilt from the stored embeddings.
+"""
+import os
+import json
+import math
+import time
+import numpy as np
+import faiss
+
+INDEX_FILE = "index.faiss"
+INDEX_INFO_FILE = "index_info.json"
+
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivfpq")
+
+# "auto" picks the index type from the number of vectors
+AUTO_FLAT_MAX = 20000
+AUTO_HNSW_MAX = 200000
+AUTO_IVF_MAX = 1000000
+
+DEFAULT_HNSW_M = 32
+DEFAULT_EF_SEARCH = 64
+DEFAULT_PQ_M = 48  # Must divide the embedding dimension (384 for all-MiniLM-L6-v2)
+
+# Vectors are added in chunks so memory-mapped embeddings are never copied whole
+ADD_CHUNK = 16384
+
+
+def choose_index_type(n_vectors):
+    """Picks an index type for the knowledge base size"""
+    if n_vectors <= AUTO_FLAT_MAX:
+        return "flat"
+    if n_vectors <= AUTO_HNSW_MAX:
+        return "hnsw"
+    if n_vectors <= AUTO_IVF_MAX:
+        return "ivf"
+    return "ivfpq"
+
+def default_nlist(n_vectors):
+    """Number of IVF cells: ~4*sqrt(N), keeping at least 39 training points per cell"""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+def default_nprobe(nlist):
+    """Cells visited per query, a reasonable starting point for the recall/latency tradeoff"""
+    return max(1, nlist // 16)
+
+def factory_string(index_type, n_vectors, nlist=None, hnsw_m=DEFAULT_HNSW_M, pq_m=DEFAULT_PQ_M):
+    """Returns the faiss.index_factory description for the index type"""
+    if index_type == "flat":
+        return "IDMap2,Flat"
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{hnsw_m}"
+    nlist = nlist or default_nlist(n_vectors)
+    if index_type == "ivf":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivfpq":
+        return f"IVF{nlist},PQ{pq_m}"
+    raise ValueError(f"Unknown index type: {index_type}")
+
+def normalize(embeddings):
+    """Returns a float32 copy of embeddings with unit L2 norm rows"""
+    embeddings = np.array(embeddings, dtype='float32', order='C', copy=True)
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+def build_index(embeddings, ids=None, index_type="auto", nlist=None, hnsw_m=DEFAULT_HNSW_M, pq_m=DEFAULT_PQ_M,
+                nprobe=None, ef_search=DEFAULT_EF_SEARCH, train_size=100000):
+    """
+    Builds (and trains when needed) an inner product index over embeddings,
+    which must already be normalized. ids defaults to the row numbers.
+    Returns the index and the info dict persisted next to it.
+    """
+    n_vectors, dim = embeddings.shape
+    ids = np.arange(n_vectors, dtype='int64') if ids is None else np.asarray(ids, dtype='int64')
+
+    if index_type == "auto":
+        index_type = choose_index_type(n_vectors)
+    if index_type in ("ivf", "ivfpq"):
+        nlist = nlist or default_nlist(n_vectors)
+
+    factory = factory_string(index_type, n_vectors, nlist, hnsw_m, pq_m)
+    index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+
+    if not index.is_trained:
+        # Train on a sample, k-means does not need the whole corpus
+        if n_vectors > train_size:
+            sample = np.sort(np.random.default_rng(0).choice(n_vectors, train_size, replace=False))
+        else:
+            sample = slice(None)
+        index.train(np.ascontiguousarray(embeddings[sample], dtype='float32'))
+
+    for start in range(0, n_vectors, ADD_CHUNK):
+        chunk = np.ascontiguousarray(embeddings[start:start + ADD_CHUNK], dtype='float32')
+        index.add_with_ids(chunk, ids[start:start + ADD_CHUNK])
+
+    info = {
+        "index_type": index_type,
+        "factory": factory,
+        "metric": "ip",
+        "ids": "row",
+        "dim": dim,
+        "ntotal": int(index.ntotal),
+        "built": int(time.time())
+    }
+    if index_type in ("ivf", "ivfpq"):
+        info["nlist"] = nlist
+        info["nprobe"] = nprobe or default_nprobe(nlist)
+    if index_type == "hnsw":
+        info["ef_search"] = ef_search
+
+    return index, info
+
+def write_index(index, info, output_dir):
+    """Writes the index and its info next to each other, so readers never map a half-written file"""
+    index_path = os.path.join(output_dir, INDEX_FILE)
+    info_path = os.path.join(output_dir, INDEX_INFO_FILE)
+
+    faiss.write_index(index, index_path + ".tmp")
+    with open(info_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(info_path + ".tmp", info_path)
+    return index_path
+
+def read_index(output_dir, mmap=True):
+    """
+    Reads the saved index and its info (empty dict for older builds).
+    The helper memory-maps it, generate_embeddings.py reads it into memory to patch it.
+    """
+    index_path = os.path.join(output_dir, INDEX_FILE)
+    index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP) if mmap else faiss.read_index(index_path)
+
+    info_path = os.path.join(output_dir, INDEX_INFO_FILE)
+    info = {}
+    if os.path.exists(info_path):
+        with open(info_path, "r", encoding="utf-8") as f:
+            info = json.load(f)
+    return index, info
+
+def search_parameters(index, nprobe=None, ef_search=None):
+    """
+    Per-query search parameters. They are passed to index.search instead of being
+    set on the shared index, so concurrent requests can use different values.
+    """
+    if isinstance(index, faiss.IndexIDMap):
+        # IDMap2 forwards the parameters to the wrapped index
+        index = faiss.downcast_index(index.index)
+    if faiss.try_extract_index_ivf(index) is not None and nprobe:
+        return faiss.SearchParametersIVF(nprobe=int(nprobe))
+    if isinstance(index, faiss.IndexHNSW) and ef_search:
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search))
+    return None
+
+def supports_remove(info):
+    """HNSW graphs cannot drop vectors, every other index type can be patched in place"""
+    return info.get("index_type") != "hnsw"
+
+def select_top(scores, ids, min_score, top_n):
+    """
+    Keeps the top_n results scoring at least min_score, best first.
+    Pure NumPy: a threshold mask, argpartition and a sort of the survivors only,
+    so the cost after the search is O(k) rather than a Python sort with list lookups.
+    """
+    keep = (ids >= 0) & (scores >= min_score)
+    scores = scores[keep]
+    ids = ids[keep]
+
+    if scores.size > top_n:
+        best = np.argpartition(-scores, top_n - 1)[:top_n]
+        scores = scores[best]
+        ids = ids[best]
+
+    order = np.argsort(-scores, kind='stable')
+    return ids[order], scores[order]
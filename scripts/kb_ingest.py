@@ -0,0 +1,151 @@
+"""
+    Streaming ingestion of the knowledge base export.
+    The KB API is read incrementally instead of through response.json(), so the
+    whole export is never held in memory as one string plus its parsed dicts.
+
+    Supported payloads:
+        - a JSON array of items, parsed item by item as the bytes arrive
+        - JSON Lines (one item per line)
+        - a paginated object {"results": [...], "next": "<url of the next page>"}
+"""
+import os
+import json
+import codecs
+import requests
+
+CHUNK_SIZE = 64 * 1024
+REQUEST_TIMEOUT = 60
+
+# Only these fields are used downstream, everything else in the export is dropped on read
+ITEM_FIELDS = ("extid", "title", "url", "keywords", "content")
+
+
+def slim(item):
+    return {field: item.get(field, "") for field in ITEM_FIELDS}
+
+def iter_json_array(chunks):
+    """
+    Yields the elements of a top-level JSON array from an iterable of text chunks.
+    Elements are decoded as soon as they are complete; only the unparsed tail is buffered.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+
+    for chunk in chunks:
+        buffer += chunk
+        pos = 0
+        while True:
+            # Skip whitespace and separators between elements
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                element, pos_end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Incomplete element, wait for more data
+            yield element
+            pos = pos_end
+        buffer = buffer[pos:]
+
+    if buffer.strip():
+        raise ValueError("Truncated JSON array")
+
+def iter_text(response):
+    """Decodes the response body incrementally (multi-byte characters may span chunks)"""
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+def iter_kb_items(url, session=requests, headers=None, timeout=REQUEST_TIMEOUT, validators=None):
+    """
+    Streams the knowledge base items from url, following "next" links of paginated responses.
+    validators (a dict) receives the status, ETag and Last-Modified of the first response;
+    a 304 answer to conditional headers yields no items.
+    """
+    headers = headers or {'Accept': 'application/json; charset=utf-8', 'User-Agent': 'Mozilla/5.0'}
+
+    while url:
+        with session.get(url, stream=True, timeout=timeout, headers=headers) as response:
+            response.raise_for_status()
+            if validators is not None and "status" not in validators:
+                validators.update(
+                    status=response.status_code,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified")
+                )
+                # Conditional headers only apply to the first page
+                headers = {name: value for name, value in headers.items() if not name.startswith("If-")}
+            if response.status_code == 304:
+                return
+            content_type = response.headers.get("Content-Type", "")
+            text = iter_text(response)
+
+            if "ndjson" in content_type or "jsonl" in content_type:
+                for line in _iter_lines(text):
+                    if line.strip():
+                        yield slim(json.loads(line))
+                return
+
+            # Peek at the first character to tell an array from a paginated object
+            first = ""
+            for chunk in text:
+                first += chunk
+                if first.strip():
+                    break
+            rest = _prepend(first, text)
+
+            if first.lstrip().startswith("["):
+                for item in iter_json_array(rest):
+                    yield slim(item)
+                return
+
+            # One page of a paginated response, bounded by the page size
+            page = json.loads("".join(rest))
+            for item in page.get("results", []):
+                yield slim(item)
+            url = page.get("next")
+
+def _prepend(first, chunks):
+    yield first
+    yield from chunks
+
+def _iter_lines(chunks):
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split("\n")
+        yield from lines
+    if buffer:
+        yield buffer
+
+# --- On-disk spool, so the export can be read more than once without keeping it in memory ---
+
+def spool_items(items, path):
+    """Writes items to a JSON Lines file and returns how many were written"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+def read_spool(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+def remove_spool(path):
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,35 @@
+"""
+    Deferred imports for the CLI helper. Every question is a new process, and importing
+    light_embed, faiss, numpy and requests up front costs more than a search. A lazy
+    module is created at once but only executed on its first attribute access, so a
+    question pays for the libraries of the code path it takes: a failed argument check
+    imports none of them, the knowledge API fallback no embedding model.
+
+    importlib's LazyLoader is not thread-safe before Python 3.12; the multi-threaded
+    services call load_all() at startup, before serving.
+"""
+import sys
+import importlib.util
+
+_deferred = []
+
+
+def lazy_import(name):
+    """The module name, executed on first use; an already imported module is returned as is"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    _deferred.append(module)
+    return module
+
+def load_all():
+    """Executes every deferred module now"""
+    for module in _deferred:
+        getattr(module, "__name__")
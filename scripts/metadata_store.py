@@ -0,0 +1,161 @@
+"""
+    Compact columnar metadata store, replacing metadata.json.
+    One row per index id (chunk). Files in the embeddings directory:
+
+        metadata_extid.bin                  JSON-encoded extid per row (keeps ints as ints)
+        metadata_title.bin                  table of unique titles
+        metadata_title.npy                  int32 row -> title id
+        metadata_url.bin                    table of unique URLs
+        metadata_url.npy                    int32 row -> URL id
+        metadata_hash.npy                   S40 document hash per row
+        metadata_chunk.npy                  int32 chunk number per row, -1 for an empty row
+        metadata_info.json                  row count, written last
+
+    Everything is memory-mapped, so opening the store does not parse anything and
+    title/url/extid lookups by row id are O(1).
+"""
+import os
+import json
+import time
+import numpy as np
+import text_store
+
+INFO_FILE = "metadata_info.json"
+LEGACY_FILE = "metadata.json"
+
+STRING_TABLES = ("title", "url")
+
+
+def _path(output_dir, name):
+    return os.path.join(output_dir, "metadata_" + name)
+
+def _save_npy(path, array):
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(path + ".tmp", path)
+
+def exists(output_dir):
+    return os.path.exists(os.path.join(output_dir, INFO_FILE))
+
+def write_metadata(output_dir, entries, remove_legacy=True):
+    """
+    Writes the store from a list of metadata entries (dicts, or None for empty rows).
+    A legacy metadata.json is removed afterwards unless remove_legacy is False.
+    """
+    extids = text_store.TextStoreWriter(_path(output_dir, "extid"))
+    tables = {name: text_store.TextStoreWriter(_path(output_dir, name)) for name in STRING_TABLES}
+    table_ids = {name: {} for name in STRING_TABLES}
+    row_ids = {name: np.zeros(len(entries), dtype="int32") for name in STRING_TABLES}
+    hashes = np.zeros(len(entries), dtype="S40")
+    chunks = np.full(len(entries), -1, dtype="int32")
+
+    for row, entry in enumerate(entries):
+        if entry is None:
+            extids.append("")
+            continue
+        extids.append(json.dumps(entry["extid"]))
+        for name in STRING_TABLES:
+            value = entry[name] or ""
+            value_id = table_ids[name].get(value)
+            if value_id is None:
+                value_id = table_ids[name][value] = len(table_ids[name])
+                tables[name].append(value)
+            row_ids[name][row] = value_id
+        hashes[row] = entry["hash"].encode("ascii")
+        chunks[row] = entry.get("chunk", 0)
+
+    extids.close()
+    for name in STRING_TABLES:
+        tables[name].close()
+        _save_npy(_path(output_dir, name) + ".npy", row_ids[name])
+    _save_npy(_path(output_dir, "hash") + ".npy", hashes)
+    _save_npy(_path(output_dir, "chunk") + ".npy", chunks)
+
+    # Written last: readers use it to detect a complete, new version
+    with open(os.path.join(output_dir, INFO_FILE) + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"rows": len(entries), "written": int(time.time())}, f)
+    os.replace(os.path.join(output_dir, INFO_FILE) + ".tmp", os.path.join(output_dir, INFO_FILE))
+
+    # The binary store is now the only source of truth
+    legacy_path = os.path.join(output_dir, LEGACY_FILE)
+    if remove_legacy and os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+
+class MetadataStore:
+    """Row lookups over the columns; backed by memory-mapped files or, for legacy JSON, by memory"""
+
+    def __init__(self, extids, tables, row_ids, hashes, chunks):
+        self.extids = extids
+        self.tables = tables
+        self.row_ids = row_ids
+        self.hashes = hashes
+        self.chunks = chunks
+
+    @classmethod
+    def open(cls, output_dir):
+        return cls(
+            text_store.TextStore(_path(output_dir, "extid")),
+            {name: text_store.TextStore(_path(output_dir, name)) for name in STRING_TABLES},
+            {name: np.load(_path(output_dir, name) + ".npy", mmap_mode="r") for name in STRING_TABLES},
+            np.load(_path(output_dir, "hash") + ".npy", mmap_mode="r"),
+            np.load(_path(output_dir, "chunk") + ".npy", mmap_mode="r")
+        )
+
+    @classmethod
+    def from_entries(cls, entries):
+        """In-memory store over metadata.json entries written before the binary format"""
+        tables = {name: [] for name in STRING_TABLES}
+        row_ids = {name: np.zeros(len(entries), dtype="int32") for name in STRING_TABLES}
+        for name in STRING_TABLES:
+            value_ids = {}
+            for row, entry in enumerate(entries):
+                value = entry[name] if entry else ""
+                if value not in value_ids:
+                    value_ids[value] = len(tables[name])
+                    tables[name].append(value)
+                row_ids[name][row] = value_ids[value]
+        return cls(
+            [json.dumps(entry["extid"]) if entry else "" for entry in entries],
+            tables,
+            row_ids,
+            np.array([entry.get("hash", "").encode("ascii") if entry else b"" for entry in entries], dtype="S40"),
+            np.array([entry.get("chunk", 0) if entry else -1 for entry in entries], dtype="int32")
+        )
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def column(self, name, rows):
+        """Values of a string column for rows, as an object array"""
+        table = self.tables[name]
+        return np.array([table[value_id] for value_id in self.row_ids[name][rows]], dtype=object)
+
+    def entry(self, row):
+        """Row as a metadata dict, or None for an empty row"""
+        if self.chunks[row] < 0:
+            return None
+        return {
+            "extid": json.loads(self.extids[row]),
+            "title": self.tables["title"][self.row_ids["title"][row]],
+            "url": self.tables["url"][self.row_ids["url"][row]],
+            "hash": self.hashes[row].decode("ascii"),
+            "chunk": int(self.chunks[row])
+        }
+
+    def entries(self):
+        return [self.entry(row) for row in range(len(self))]
+
+
+def load(output_dir):
+    """Opens the binary store, falling back to a legacy metadata.json"""
+    if exists(output_dir):
+        return MetadataStore.open(output_dir)
+    with open(os.path.join(output_dir, LEGACY_FILE), "r", encoding="utf-8") as f:
+        return MetadataStore.from_entries(json.load(f))
+
+def version(output_dir):
+    """Modification time of whichever metadata file is current, used to detect a reindex"""
+    if exists(output_dir):
+        return os.path.getmtime(os.path.join(output_dir, INFO_FILE))
+    return os.path.getmtime(os.path.join(output_dir, LEGACY_FILE))
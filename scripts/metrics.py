@@ -0,0 +1,87 @@
+"""
+    Metrics export of the request spans (stage_timer.py):
+        - StageHistograms: cumulative histograms per stage and per request kind, rendered in
+          the Prometheus text format for the services' GET /metrics
+        - JsonlSink: one JSON line per request appended to a file, for the CLI helper whose
+          process ends after each question (one line is one write, so concurrent CLI
+          processes can share the file)
+"""
+import json
+import time
+import bisect
+import threading
+
+# Seconds; from the prompt encode (~ms) to a long generation
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class StageHistograms:
+    """Thread-safe; stage durations and request totals of finished requests"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix="ollamachat"):
+        self.buckets = buckets
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._requests = {}
+
+    def observe(self, timer):
+        with self._lock:
+            for name, seconds in timer.stages.items():
+                self._stages.setdefault(name, Histogram(self.buckets)).observe(seconds)
+            if timer.total is not None:
+                self._requests.setdefault(timer.kind, Histogram(self.buckets)).observe(timer.total)
+
+    def prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        stage_metric = f"{self.prefix}_stage_seconds"
+        request_metric = f"{self.prefix}_request_seconds"
+        lines = [f"# HELP {stage_metric} Time spent in each stage of a request",
+                 f"# TYPE {stage_metric} histogram"]
+        with self._lock:
+            for name, histogram in sorted(self._stages.items()):
+                lines.extend(histogram.lines(stage_metric, f'stage="{name}"'))
+            lines += [f"# HELP {request_metric} Total time of a request",
+                      f"# TYPE {request_metric} histogram"]
+            for kind, histogram in sorted(self._requests.items()):
+                lines.extend(histogram.lines(request_metric, f'kind="{kind}"'))
+        return "\n".join(lines) + "\n"
+
+
+class JsonlSink:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, timer):
+        record = {
+            "time": round(time.time(), 3),
+            "kind": timer.kind,
+            "total_ms": round(timer.total * 1000, 3) if timer.total is not None else None,
+            "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in timer.stages.items()}
+        }
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
@@ -0,0 +1,61 @@
+"""
+    Converts the metadata.json of an embeddings directory to the binary metadata store.
+    The JSON file is kept as metadata.json.bak unless --delete is given.
+    Only needed once per directory: generate_embeddings.py writes the binary store itself.
+
+    Usage: python3 migrate_metadata.py <embeddings_dir> [--delete]
+"""
+import os
+import sys
+import json
+import argparse
+import metadata_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert metadata.json to the binary metadata store")
+    parser.add_argument("embeddings_dir")
+    parser.add_argument("--delete", action="store_true", help="Remove metadata.json instead of keeping a .bak copy")
+    args = parser.parse_args()
+
+    json_path = os.path.join(args.embeddings_dir, metadata_store.LEGACY_FILE)
+    if not os.path.exists(json_path):
+        print(f"Nothing to migrate: {json_path} not found")
+        sys.exit(1)
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    # Entries written before chunking have no chunk number, each document was one row
+    for entry in entries:
+        if entry is not None:
+            entry.setdefault("chunk", 0)
+            entry.setdefault("hash", "")
+
+    # metadata.json stays the source of truth until the store is written and checked
+    metadata_store.write_metadata(args.embeddings_dir, entries, remove_legacy=False)
+
+    # Read back a few rows to check the conversion
+    store = metadata_store.MetadataStore.open(args.embeddings_dir)
+    mismatch = None
+    if len(store) != len(entries):
+        mismatch = f"The store has {len(store)} rows, metadata.json {len(entries)}"
+    for row in range(min(len(entries), 10)):
+        if mismatch is None and store.entry(row) != entries[row]:
+            mismatch = f"Row {row} differs after conversion: {store.entry(row)} != {entries[row]}"
+    if mismatch:
+        # Without its info file the store is ignored and the helper keeps reading metadata.json
+        os.remove(os.path.join(args.embeddings_dir, metadata_store.INFO_FILE))
+        print(mismatch)
+        sys.exit(1)
+    print(f"Converted {len(entries)} rows to:", os.path.join(args.embeddings_dir, metadata_store.INFO_FILE))
+
+    if args.delete:
+        os.remove(json_path)
+    else:
+        backup_path = json_path + ".bak"
+        os.replace(json_path, backup_path)
+        print("JSON metadata kept as:", backup_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+    Keeps the generation models loaded in Ollama.
+    Ollama unloads a model keep_alive after its last request (5 minutes by default) and
+    the next question then waits for the whole model load before the first token. The
+    helpers send keep_alive with every generation, and the services warm the models up:
+        - on start and after a knowledge base reindex
+        - on the other backends as soon as a question hit a cold model (its load_duration
+          was above cold_load seconds), they were most likely evicted too
+
+    A warm-up is Ollama's preload request: /api/generate with the model and an empty prompt.
+    The timing fields of the answers (load_duration, prompt_eval_duration, eval_duration, in
+    nanoseconds) are kept per model for the stats.
+"""
+import logging
+import threading
+from collections import deque
+import numpy as np
+import requests
+import http_client
+import ollama_backends
+
+DEFAULT_KEEP_ALIVE = "30m"
+COLD_LOAD_SECONDS = 1.0
+WARMUP_TIMEOUT = 300  # Seconds, a large model on a slow disk
+
+TIMING_FIELDS = ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration")
+
+
+def parse_keep_alive(values):
+    """
+    {model: keep_alive} from "30m" (all models) or "phi3:mini=1h" options; keep_alive is an
+    Ollama duration ("10m", "24h") or seconds, -1 keeps the model loaded.
+    The "*" entry applies to the models not listed.
+    """
+    keep_alive = {"*": DEFAULT_KEEP_ALIVE}
+    for value in values or []:
+        model, _, duration = value.rpartition("=")
+        duration = int(duration) if duration.lstrip("-").isdigit() else duration
+        keep_alive[ollama_backends.model_name(model) if model else "*"] = duration
+    return keep_alive
+
+def timings(chunk):
+    """Seconds spent per phase, from the final chunk (or non-streamed answer) of a generation"""
+    found = {field[:-len("_duration")]: chunk[field] / 1e9 for field in TIMING_FIELDS if chunk.get(field)}
+    if chunk.get("eval_count") and chunk.get("eval_duration"):
+        found["tokens_per_second"] = chunk["eval_count"] / (chunk["eval_duration"] / 1e9)
+    return found
+
+
+class ModelWarmer:
+    """Thread-safe; warm-ups run on daemon threads unless wait=True"""
+
+    def __init__(self, backends, models, keep_alive=None, cold_load=COLD_LOAD_SECONDS):
+        self.backends = backends
+        self.models = [ollama_backends.model_name(model) for model in models]
+        self.keep_alive = keep_alive or parse_keep_alive(None)
+        self.cold_load = cold_load
+        self._lock = threading.Lock()
+        self._warming = set()  # (backend url, model) being warmed up
+        self._timings = {}  # model -> recent timings
+        self._stats = {}  # model -> counters
+
+    def keep_alive_for(self, model):
+        return self.keep_alive.get(ollama_backends.model_name(model), self.keep_alive["*"])
+
+    def _counters(self, model):
+        return self._stats.setdefault(model, {"warmups": 0, "warmup_failures": 0, "cold_starts": 0})
+
+    def warm(self, backend, model):
+        """Loads model on backend; returns the load seconds, None when it failed"""
+        key = (backend.url, model)
+        with self._lock:
+            if key in self._warming:
+                return None
+            self._warming.add(key)
+        try:
+            response = http_client.get_session(backend.url).post(
+                backend.url + ollama_backends.GENERATE_PATH,
+                json={"model": model, "prompt": "", "stream": False, "keep_alive": self.keep_alive_for(model)},
+                timeout=WARMUP_TIMEOUT
+            )
+            response.raise_for_status()
+            load = response.json().get("load_duration", 0) / 1e9
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.warning(f"Warm-up of {model} on {backend.url} failed: {str(e)}")
+            with self._lock:
+                self._counters(model)["warmup_failures"] += 1
+            return None
+        finally:
+            with self._lock:
+                self._warming.discard(key)
+
+        self.backends.mark_up(backend, model)
+        with self._lock:
+            self._counters(model)["warmups"] += 1
+        logging.info(f"Warmed up {model} on {backend.url} in {load:.2f} s")
+        return load
+
+    def warm_all(self, models=None, wait=False, skip_loaded=False):
+        """Warms models (default: all configured) on every backend that has them"""
+        jobs = []
+        for model in models or self.models:
+            for backend in self.backends.candidates(model):
+                if backend.healthy is False or (skip_loaded and model in backend.loaded):
+                    continue
+                jobs.append((backend, model))
+        threads = [threading.Thread(target=self.warm, args=job, name="ollama-warmup", daemon=True) for job in jobs]
+        for thread in threads:
+            thread.start()
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def record(self, model, chunk):
+        """Keeps the timings of a finished generation; a cold load triggers a warm-up of the other backends"""
+        model = ollama_backends.model_name(model)
+        found = timings(chunk)
+        with self._lock:
+            self._timings.setdefault(model, deque(maxlen=1000)).append(found)
+            cold = found.get("load", 0) > self.cold_load
+            if cold:
+                self._counters(model)["cold_starts"] += 1
+        if cold:
+            logging.warning(f"Cold start of {model}: loading took {found['load']:.2f} s, warming up the other backends")
+            self.warm_all([model], skip_loaded=True)
+
+    def stats(self):
+        stats = {}
+        with self._lock:
+            for model in set(self._stats) | set(self._timings):
+                stats[model] = dict(self._counters(model))
+                recent = self._timings.get(model, ())
+                stats[model]["generations"] = len(recent)
+                for phase in ("load", "prompt_eval", "eval", "total"):
+                    values = np.array([found[phase] for found in recent if phase in found]) * 1000
+                    if values.size:
+                        stats[model][phase + "_ms"] = {"mean": float(values.mean()),
+                                                       "p95": float(np.percentile(values, 95))}
+                speeds = [found["tokens_per_second"] for found in recent if "tokens_per_second" in found]
+                if speeds:
+                    stats[model]["tokens_per_second"] = float(np.mean(speeds))
+        return stats
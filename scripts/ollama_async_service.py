@@ -0,0 +1,141 @@
+"""
+    asyncio variant of the helper service (ollama_service.py), same endpoints and payloads:
+
+    POST /generate, POST /generate/stream, GET /health, GET /stats, GET /metrics
+
+    Requests are multiplexed on one event loop (async_pipeline.py) instead of taking a
+    thread each for the whole generation, so the number of questions in flight is
+    bounded by Ollama rather than by blocked Python workers.
+
+    Usage: python3 ollama_async_service.py [--host 127.0.0.1] [--port 8765] [--embeddings-dir <dir>]
+                                           [--ollama-pool-size 32] [--search-threads 4]
+                                           [--ollama-url http://gpu1:11434 --ollama-url http://gpu2:11434]
+"""
+import sys
+import json
+import logging
+import argparse
+
+logging.basicConfig(
+    stream=sys.stderr,
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s'
+)
+
+from aiohttp import web
+import http_client
+import async_pipeline
+import ollama_service
+from ollama_service import helper
+
+DEFAULTS = web.AppKey("defaults", argparse.Namespace)
+PIPELINE = web.AppKey("pipeline", async_pipeline.Pipeline)
+
+
+async def read_request(request):
+    """Returns (prompt, options), or raises HTTPBadRequest with the usual error body"""
+    try:
+        payload = await request.json()
+        prompt = payload["prompt"]
+        options = ollama_service.request_options(payload, request.app[DEFAULTS])
+    except (ValueError, KeyError, TypeError) as e:
+        raise web.HTTPBadRequest(
+            text=json.dumps({"success": False, "response": f"Invalid request: {str(e)}", "sources": []}),
+            content_type="application/json"
+        )
+    return prompt, options
+
+async def health(request):
+    return web.json_response({"success": True, "response": "ok"})
+
+async def stats(request):
+    return web.json_response(ollama_service.service_stats())
+
+async def metrics(request):
+    return web.Response(body=helper.metrics_text().encode("utf-8"),
+                        headers={"Content-Type": ollama_service.METRICS_CONTENT_TYPE})
+
+async def generate(request):
+    prompt, options = await read_request(request)
+    result = await request.app[PIPELINE].generate_response(prompt, **options)
+    return web.json_response(result, dumps=lambda data: json.dumps(data, ensure_ascii=False))
+
+async def generate_stream(request):
+    """Server-sent events, see ollama_service.py"""
+    prompt, options = await read_request(request)
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream; charset=utf-8",
+        "Cache-Control": "no-cache"
+    })
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+
+    events = request.app[PIPELINE].stream_response(prompt, **options)
+    try:
+        async for event, data in events:
+            await response.write(ollama_service.sse_message(event, data))
+        await response.write_eof()
+    except ConnectionResetError:
+        logging.info("Client went away, generation stopped")
+    finally:
+        # Stops the Ollama request when the client disconnected early
+        await events.aclose()
+    return response
+
+async def start_pipeline(app):
+    args = app[DEFAULTS]
+    app[PIPELINE] = async_pipeline.Pipeline(
+        pool_size=args.ollama_pool_size, search_threads=args.search_threads, retries=args.http_retries
+    )
+    # Pay the model and index load once, before the first question arrives
+    ollama_service.start_warmup(args)
+    await app[PIPELINE].run_blocking(helper.load_model)
+    if args.embeddings_dir:
+        try:
+            await app[PIPELINE].run_blocking(helper.load_knowledge_base, args.embeddings_dir)
+        except OSError as e:
+            logging.warning(f"Embeddings not preloaded: {str(e)}")
+
+async def stop_pipeline(app):
+    await app[PIPELINE].close()
+
+def make_app(args):
+    app = web.Application()
+    app[DEFAULTS] = args
+    app.router.add_get("/health", health)
+    app.router.add_get("/stats", stats)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_post("/generate", generate)
+    app.router.add_post("/generate/stream", generate_stream)
+    app.on_startup.append(start_pipeline)
+    app.on_cleanup.append(stop_pipeline)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ollama chat helper service (asyncio)")
+    parser.add_argument("--host", default=ollama_service.DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=ollama_service.DEFAULT_PORT)
+    parser.add_argument("--embeddings-dir", default=None,
+                        help="Default embeddings directory, preloaded on start")
+    parser.add_argument("--nprobe", type=int, default=None,
+                        help="IVF cells visited per query (default: value saved with the index)")
+    parser.add_argument("--ef-search", type=int, default=None,
+                        help="HNSW search depth (default: value saved with the index)")
+    parser.add_argument("--ollama-pool-size", type=int, default=32,
+                        help="Concurrent connections to Ollama, further questions wait for a free one")
+    parser.add_argument("--search-threads", type=int, default=None,
+                        help="Threads for prompt encoding, search and the KB fallback (default: Python's choice)")
+    parser.add_argument("--http-retries", type=int, default=http_client.DEFAULT_RETRIES,
+                        help="Retries (with backoff) of failed connections to Ollama")
+    ollama_service.add_tuning_arguments(parser)
+    args = parser.parse_args()
+
+    ollama_service.apply_tuning(args)
+
+    logging.info(f"Helper service listening on http://{args.host}:{args.port}")
+    web.run_app(make_app(args), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
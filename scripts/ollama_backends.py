@@ -0,0 +1,219 @@
+"""
+    Pool of Ollama servers the helpers send generations to.
+    Backends come from the services' --ollama-url options or the OLLAMA_BACKENDS
+    environment variable (comma separated base URLs), http://localhost:11434 by default.
+
+    Each request goes to the backend with the fewest requests in progress, among:
+        1. healthy backends that have the model loaded (GET /api/ps)
+        2. healthy backends that have the model installed (GET /api/tags), it gets loaded there
+        3. healthy backends not checked yet
+        4. backends that failed, as a last resort
+    Backends known not to have the model are skipped. When a backend refuses the
+    connection the request fails over to the next one; once Ollama accepted it, it is
+    not sent again (it may already be generating).
+
+    Health checks run on a background thread when a check interval is set (the services).
+    The CLI helpers only learn about a backend from their own requests.
+"""
+import os
+import time
+import logging
+import threading
+import itertools
+from contextlib import contextmanager
+import requests
+import http_client
+
+DEFAULT_URL = "http://localhost:11434"
+DEFAULT_HEALTH_INTERVAL = 10  # Seconds
+HEALTH_TIMEOUT = 2  # Seconds
+
+GENERATE_PATH = "/api/generate"
+
+
+class NoBackendAvailable(requests.exceptions.ConnectionError):
+    """No backend accepted the connection"""
+
+
+def default_urls():
+    urls = os.environ.get("OLLAMA_BACKENDS", "")
+    return [url.strip() for url in urls.split(",") if url.strip()] or [DEFAULT_URL]
+
+def model_name(name):
+    """Ollama reads "phi3" as "phi3:latest" """
+    return name if ":" in name else name + ":latest"
+
+
+class Backend:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.healthy = None  # None until checked or used
+        self.installed = None  # Model names from /api/tags, None while unknown
+        self.loaded = set()  # Model names from /api/ps
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+        self.checked_at = None
+
+    def tier(self, model):
+        """Placement preference for model, lower is better; None when the backend does not have it"""
+        if self.installed is not None and model not in self.installed:
+            return None
+        if self.healthy is False:
+            return 3
+        if model in self.loaded:
+            return 0
+        return 1 if self.installed is not None else 2
+
+    def stats(self):
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "loaded": sorted(self.loaded),
+            "installed": sorted(self.installed) if self.installed is not None else None,
+            "last_error": self.last_error,
+            "checked_at": self.checked_at
+        }
+
+
+class BackendPool:
+    """Thread-safe; start() runs the periodic health checks"""
+
+    def __init__(self, urls=None, health_interval=DEFAULT_HEALTH_INTERVAL):
+        self.backends = [Backend(url) for url in (urls or default_urls())]
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._turns = itertools.count()  # Rotates between backends with equal load
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def urls(self):
+        return [backend.url for backend in self.backends]
+
+    # --- Routing ---
+
+    def candidates(self, model):
+        """Backends to try for model, best first"""
+        model = model_name(model)
+        turn = next(self._turns)
+        with self._lock:
+            ranked = []
+            for i, backend in enumerate(self.backends):
+                tier = backend.tier(model)
+                if tier is not None:
+                    ranked.append((tier, backend.outstanding, (i - turn) % len(self.backends), backend))
+        if not ranked:
+            # Nobody reported the model; let Ollama answer with its own "model not found" error
+            return list(self.backends)
+        return [backend for *_, backend in sorted(ranked, key=lambda item: item[:3])]
+
+    @contextmanager
+    def track(self, backend):
+        """Counts a request in progress on backend"""
+        with self._lock:
+            backend.outstanding += 1
+            backend.requests += 1
+        try:
+            yield backend
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+
+    def mark_down(self, backend, error):
+        logging.warning(f"Ollama backend {backend.url} failed: {str(error)}")
+        with self._lock:
+            backend.healthy = False
+            backend.failures += 1
+            backend.last_error = str(error)
+
+    def mark_up(self, backend, model):
+        """The backend answered a request for model, which is now loaded there"""
+        with self._lock:
+            backend.healthy = True
+            backend.loaded.add(model_name(model))
+
+    @contextmanager
+    def post(self, model, path=GENERATE_PATH, **kwargs):
+        """
+        POSTs to the best backend for model and yields the response, failing over when a
+        backend refuses the connection. The request counts as in progress until the block exits.
+        """
+        error = None
+        for backend in self.candidates(model):
+            with self.track(backend):
+                try:
+                    response = http_client.get_session(backend.url).post(backend.url + path, **kwargs)
+                except requests.exceptions.ConnectionError as e:
+                    self.mark_down(backend, e)
+                    error = e
+                    continue
+                with response:
+                    if response.ok:
+                        self.mark_up(backend, model)
+                    yield response
+                return
+        raise NoBackendAvailable(f"No Ollama backend available for {model}: {str(error)}")
+
+    # --- Health checks ---
+
+    def check(self, backend):
+        session = http_client.get_session(backend.url)
+        try:
+            tags = session.get(backend.url + "/api/tags", timeout=HEALTH_TIMEOUT)
+            tags.raise_for_status()
+            ps = session.get(backend.url + "/api/ps", timeout=HEALTH_TIMEOUT)
+            ps.raise_for_status()
+            installed = {model_name(model["name"]) for model in tags.json().get("models", [])}
+            loaded = {model_name(model["name"]) for model in ps.json().get("models", [])}
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            if backend.healthy is not False:
+                self.mark_down(backend, e)
+            backend.checked_at = time.time()
+            return False
+
+        with self._lock:
+            if backend.healthy is False:
+                logging.info(f"Ollama backend {backend.url} is back")
+            backend.healthy = True
+            backend.installed = installed
+            backend.loaded = loaded
+            backend.checked_at = time.time()
+        return True
+
+    def check_all(self):
+        for backend in self.backends:
+            self.check(backend)
+
+    def start(self):
+        """Checks all backends now, then every health_interval seconds on a daemon thread"""
+        self.check_all()
+        if self._thread is None and self.health_interval:
+            self._thread = threading.Thread(target=self._run, name="ollama-health", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.health_interval):
+            self.check_all()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {backend.url: backend.stats() for backend in self.backends}
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+def default_pool():
+    """Pool of default_urls() without health checks, for the CLI helpers"""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = BackendPool(health_interval=None)
+        return _default_pool
@@ -6,6 +6,7 @@ import json
 from urllib.parse import urlparse
 from difflib import SequenceMatcher
 from functools import lru_cache
+import ollama_backends
 
 # Encoding configuration for output
 sys.stdout.reconfigure(encoding='utf-8')
@@ -138,8 +139,8 @@ def generate_response(prompt, knowledge_url=None):
         )
 
         # 3. Query Ollama with optimized parameters
-        ollama_response = requests.post(
-            "http://localhost:11434/api/generate",
+        with ollama_backends.default_pool().post(
+            "phi3:3.8b-instruct",
             json={
                 "model": "phi3:3.8b-instruct",  # Faster model
                 "prompt": full_prompt,
@@ -154,9 +155,8 @@ def generate_response(prompt, knowledge_url=None):
                 }
             },
             timeout=30  # Reduced from 150
-        )
-
-        response_data = ollama_response.json()
+        ) as ollama_response:
+            response_data = ollama_response.json()
         response_text = response_data.get("response", "")
 
         # 4. Enhance response with sources if needed
@@ -7,6 +7,7 @@ import json
 from urllib.parse import urlparse
 from difflib import SequenceMatcher
 from functools import lru_cache
+import ollama_backends
 
 sys.stdout.reconfigure(encoding='utf-8')
 
@@ -108,8 +109,8 @@ def generate_response(prompt, knowledge_url=None):
             "Please provide a clear, step-by-step explanation that helps the user accomplish their task:"
         )
 
-        ollama_response = requests.post(
-            "http://localhost:11434/api/generate",
+        with ollama_backends.default_pool().post(
+            "mistral:7b-instruct",
             json={
                 "model": "mistral:7b-instruct",
                 "prompt": full_prompt,
@@ -124,9 +125,8 @@ def generate_response(prompt, knowledge_url=None):
                 }
             },
             timeout=3060  # Timeout increased to avoid timeouts
-        )
-
-        response_data = ollama_response.json()
+        ) as ollama_response:
+            response_data = ollama_response.json()
         response_text = response_data.get("response", "")
         response_text = format_response_with_sources(response_text, knowledge, sources)
 
@@ -2,8 +2,10 @@ import requests
 import sys
 import json
 from urllib.parse import urlparse
-from difflib import SequenceMatcher
-from functools import lru_cache
+import ollama_stream
+import ollama_backends
+import bm25_index
+import kb_cache
 
 """
 This script is more robust than the original, as it filters the words first to only include elements items
@@ -12,10 +14,6 @@ that are relevant.
 # Encoding configuration for output
 sys.stdout.reconfigure(encoding='utf-8')
 
-def calculate_relevance(text, prompt):
-    """Calculate relevance score between text and prompt"""
-    return SequenceMatcher(None, text.lower(), prompt.lower()).ratio()
-
 def clean_text(text):
     """Cleans text by removing problematic characters"""
     return (text.replace('\r', ' ')
@@ -24,92 +22,38 @@ def clean_text(text):
             .strip())
 
 
-def filter_items_by_keywords(items, keywords):
-    """
-    Filters articles by matching keywords in the title, content, and keywords fields.
-    Only articles containing at least one keyword from the query in any of these three fields are retained.
-    """
-    filtered_items = []
-    for item in items:
-        title = item.get('title', '').lower()
-        content = item.get('content', '').lower()
-        item_keywords = item.get('keywords', '').lower()
-
-        # Check if any keyword appears in the title, content, or keywords
-        if any(keyword.lower() in title or keyword.lower() in content or keyword.lower() in item_keywords for keyword in keywords):
-            filtered_items.append(item)
-
-    return filtered_items
-
 def process_knowledge(items, prompt):
-    """Processes articles with relevance scores after filtering by relevant keywords in title, content, and keywords"""
-    scored_items = []
-
-    keywords = prompt.split()
-
-    # Filtrar artículos por palabras clave en título, contenido y keywords antes de calcular la relevancia
-    filtered_items = filter_items_by_keywords(items, keywords)
-
-    for item in filtered_items:
-        title = clean_text(item.get('title', ''))
-        url = item.get('url', '')
-        content = clean_text(item.get('content', ''))
-        keywords = clean_text(item.get('keywords', ''))
-
-        # Calcular puntuaciones de relevancia para los diferentes componentes
-        title_score = calculate_relevance(title, prompt) * 1.5
-        content_score = calculate_relevance(content, prompt) * 1.2
-        keyword_score = calculate_relevance(keywords, prompt) * 1.3
-        url_score = calculate_relevance(url, prompt)
-
-        # Puntuación total combinada
-        total_score = (title_score + content_score + keyword_score + url_score) / 5
-
-        if total_score > 0.2:
-            scored_items.append({
-                'title': title,
-                'url': url,
-                'content': content[:2000],
-                'keywords': keywords,
-                'score': total_score
-            })
-
-    # Ordenar por la puntuación de relevancia
-    scored_items.sort(key=lambda x: x['score'], reverse=True)
+    """Best 3 articles for prompt by BM25 over title, keywords and content"""
+    # Índice invertido: solo se puntúan los artículos que contienen los términos de la pregunta.
+    # La caché en disco ya lo trae calculado; solo se construye para una lista de artículos
+    if isinstance(items, kb_cache.CachedKnowledge):
+        index = items.index
+    else:
+        index = bm25_index.build(kb_cache.knowledge_text(item) for item in items)
+    rows, _ = index.search(prompt, k=3)
 
     # Preparar el contexto y recolectar fuentes
     context = []
     sources = []
-    for item in scored_items[:3]:  # Limitar a los 3 más relevantes
+    for row in rows:
+        item = items[row]
         entry = (
-            f"### {item['title']}\n"
-            f"Content: {item['content'][:800]}...\n"
+            f"### {clean_text(item.get('title', ''))}\n"
+            f"Content: {clean_text(item.get('content', ''))[:800]}...\n"
         )
         context.append(entry)
-        sources.append(item['url'])
+        sources.append(item.get('url', ''))
 
     return "\n".join(context), sources
 
 
-@lru_cache(maxsize=500)
 def fetch_knowledge_cached(url):
-    """Cached version of knowledge fetching"""
+    """Knowledge API export from the disk cache (kb_cache.py), downloaded again only once it expired"""
     try:
         if not urlparse(url).scheme:
             return []
 
-        response = requests.get(
-            url,
-            timeout=10,  # Reduced from 15 to 10 seconds
-            headers={
-                'Accept': 'application/json; charset=utf-8',
-                'User-Agent': 'Mozilla/5.0'
-            }
-        )
-        response.raise_for_status()
-
-        data = response.json()
-        return data.get('results', []) if isinstance(data, dict) else data if isinstance(data, list) else []
+        return kb_cache.KnowledgeCache().get(url, timeout=10)  # Reduced from 15 to 10 seconds
 
     except Exception as e:
         print(f"Knowledge API Error: {str(e)}", file=sys.stderr)
@@ -182,8 +126,8 @@ def generate_response(prompt, knowledge_url=None):
 
 
         # 3. Query Ollama with optimized parameters (unchanged)
-        ollama_response = requests.post(
-            "http://localhost:11434/api/generate",
+        with ollama_backends.default_pool().post(
+            "phi3:3.8b-instruct",
             json={
                 "model": "phi3:3.8b-instruct",  # Faster model
                 "prompt": full_prompt,
@@ -197,11 +141,13 @@ def generate_response(prompt, knowledge_url=None):
                     "stop": ["\n", "###"] # Sets the stop sequences to use. When this pattern is encountered the LLM will stop generating text and return. Multiple stop patterns may be set by specifying multiple separate stop parameters in a modelfile.
                 }
             },
+            stream=True,
             timeout=300
-        )
+        ) as ollama_response:
+            ollama_response.raise_for_status()
 
-        response_data = ollama_response.json()
-        response_text = response_data.get("response", "")
+            # The streamed body is NDJSON, one object per generated piece, not a single JSON document
+            response_text = ollama_stream.collect(ollama_response)
 
         # 4. Enhance response with synthesized content and sources
         response_text = format_response_with_sources(response_text, knowledge, sources)
@@ -2,13 +2,15 @@
     This script is more advanced, uses embedding and Faiss to make the search faster
     https://github.com/facebookresearch/faiss
 """
-import requests
 import sys
 import json
 import os
 import logging
-import numpy as np
 import datetime
+import random
+import time
+import threading
+import contextlib
 
 # log_file_path = r"C:\xampp\moodledata\local_ollamachat\semantic_context.log"
 
@@ -17,13 +19,31 @@ import datetime
 #     log_file.write(f"[{datetime.datetime.now()}] Python version: {sys.version}\n")
 #     log_file.write(f"[{datetime.datetime.now()}] Python executable: {sys.executable}\n")
 
-import faiss
 from urllib.parse import urlparse
-from difflib import SequenceMatcher
-from functools import lru_cache
-from sklearn.metrics.pairwise import cosine_similarity
-from light_embed import TextEmbedding
-
+import stage_timer
+import metrics
+import ollama_stream
+from lazy_imports import lazy_import
+
+# Loaded on first use (see lazy_imports.py): a CLI question only imports what its path needs
+np = lazy_import("numpy")
+requests = lazy_import("requests")
+faiss = lazy_import("faiss")
+kb_index = lazy_import("kb_index")
+kb_generation = lazy_import("kb_generation")
+embedder = lazy_import("embedder")
+text_store = lazy_import("text_store")
+metadata_store = lazy_import("metadata_store")
+bm25_index = lazy_import("bm25_index")
+kb_cache = lazy_import("kb_cache")
+context_packer = lazy_import("context_packer")
+reranker = lazy_import("reranker")
+http_client = lazy_import("http_client")
+answer_cache = lazy_import("answer_cache")
+query_encoder = lazy_import("query_encoder")
+scheduler = lazy_import("scheduler")
+ollama_backends = lazy_import("ollama_backends")
+model_warmup = lazy_import("model_warmup")
 
 # print(f"Using Python version: {sys.version}")
 # print(f"Python executable: {sys.executable}")
@@ -31,22 +51,199 @@ from light_embed import TextEmbedding
 # Ensure stdout encoding
 sys.stdout.reconfigure(encoding='utf-8')
 
-# Log file path (hardcoded for now)
-LOG_FILE_PATH = r"C:\xampp\moodledata\local_ollamachat\ollamachat_error.log"
+# Logging: $OLLAMACHAT_LOG_FILE (default: stderr, the web server's error log for the CLI)
+# at $OLLAMACHAT_LOG_LEVEL. The services configure it with --log-file / --log-level.
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+DEFAULT_LOG_LEVEL = "WARNING"
 
-# Logging configuration
 logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    level=logging.DEBUG,
-    format='%(asctime)s [%(levelname)s] %(message)s'
+    filename=os.environ.get("OLLAMACHAT_LOG_FILE") or None,
+    level=os.environ.get("OLLAMACHAT_LOG_LEVEL", DEFAULT_LOG_LEVEL).upper(),
+    format=LOG_FORMAT
 )
 
+# Minimum cosine similarity for a knowledge base entry to be used as context.
+# 0.55 matches the former squared L2 distance cut-off of 0.9 on unit vectors (cos = 1 - d²/2).
+DEFAULT_MIN_SCORE = 0.55
+
+# --- Request spans, metrics and logging ---
+# Every request records its stages (stage_timer.py). All of them feed the histograms of
+# GET /metrics and the /stats summary; the sampled ones are also logged (INFO) and
+# appended to the JSONL metrics file, so the hot path pays for a log line only when asked to.
+
+_stage_stats = stage_timer.StageStats()
+_histograms = metrics.StageHistograms()
+_metrics_settings = {
+    "sink": metrics.JsonlSink(os.environ["OLLAMACHAT_METRICS_FILE"]) if os.environ.get("OLLAMACHAT_METRICS_FILE") else None,
+    "sample_rate": float(os.environ.get("OLLAMACHAT_METRICS_SAMPLE", 1.0))
+}
+
+def configure_logging(level=DEFAULT_LOG_LEVEL, log_file=None):
+    """Replaces the log handlers: log_file, else stderr, at level (a logging level name)"""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    handler = logging.FileHandler(log_file, encoding="utf-8") if log_file else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+def configure_metrics(metrics_file=None, sample_rate=1.0):
+    """metrics_file: JSONL file of the sampled requests, None writes none; sample_rate: 0..1"""
+    _metrics_settings.update(sink=metrics.JsonlSink(metrics_file) if metrics_file else None, sample_rate=sample_rate)
+
+def finish_request(timer):
+    """on_finish callback of stage_timer.request"""
+    _stage_stats.add(timer)
+    _histograms.observe(timer)
+    if random.random() >= _metrics_settings["sample_rate"]:
+        return
+    if logging.getLogger().isEnabledFor(logging.INFO):
+        logging.info("Request %s: %s", timer.kind, timer.summary())
+    if _metrics_settings["sink"] is not None:
+        try:
+            _metrics_settings["sink"].write(timer)
+        except OSError as e:
+            logging.warning(f"Could not write the metrics file: {str(e)}")
+
+def track_request(kind):
+    """Span of one request; nested calls (a search inside a generation) join the outer one"""
+    return stage_timer.request(kind, finish_request)
+
+def stage_stats():
+    """Recent per-stage timings (mean / p95)"""
+    return _stage_stats.stats()
+
+def metrics_text():
+    """Stage and request histograms in the Prometheus text format"""
+    return _histograms.prometheus()
+
+def _given(**options):
+    """The options that were set; the others keep the defaults of the class they are passed to"""
+    return {name: value for name, value in options.items() if value is not None}
+
+# --- Resources shared across requests ---
+# The CLI loads these once per question; the helper service (ollama_service.py)
+# keeps them in memory for its whole lifetime.
+
+_model = None
+_knowledge_bases = {}
+_resource_lock = threading.Lock()
+
+def load_model():
+    """Loads the ONNX embedding model once per process"""
+    global _model
+    with _resource_lock:
+        if _model is None:
+            logging.info(f"Loading ONNX model from: {embedder.MODEL_DIR}")
+            _model = embedder.load_model()
+    return _model
+
+def load_knowledge_base(embeddings_dir):
+    """
+    Loads embeddings, metadata and the FAISS index for embeddings_dir once per process.
+    They are reloaded when a new generation is published (see kb_generation.py), so a
+    long-lived process picks up the nightly reindex, all files of the new build at once.
+    """
+    generation, kb_dir = kb_generation.current(embeddings_dir)
+    embeddings_path = os.path.join(kb_dir, 'embeddings.npy')
+    index_path = os.path.join(kb_dir, kb_index.INDEX_FILE)
+    chunks_path = os.path.join(kb_dir, 'chunks')
+    has_index = os.path.exists(index_path)
+    has_chunks = text_store.exists(chunks_path)
+    has_bm25 = bm25_index.exists(kb_dir)
+    if generation is not None:
+        version = generation
+    else:
+        # Built before generations: the files are replaced one by one in place
+        version = (
+            os.path.getmtime(embeddings_path),
+            metadata_store.version(kb_dir),
+            os.path.getmtime(index_path) if has_index else None,
+            os.path.getmtime(chunks_path + '.bin') if has_chunks else None,
+            bm25_index.version(kb_dir)
+        )
 
-# --- Basic helpers for fallback and cleaning ---
+    with _resource_lock:
+        kb = _knowledge_bases.get(embeddings_dir)
+        reindexed = kb is not None and kb['version'] != version
+        if kb is None or reindexed:
+            # Memory-mapped: only the pages actually touched are read
+            logging.info(f"Loading embeddings from: {embeddings_path}")
+            embeddings = np.load(embeddings_path, mmap_mode='r')
+
+            # Memory-mapped columns, titles and URLs are looked up by row without parsing the file
+            logging.info(f"Loading metadata from: {kb_dir}")
+            metadata = metadata_store.load(kb_dir)
+
+            index_info = {}
+            if has_index:
+                # Prebuilt by generate_embeddings.py, mapped so concurrent workers share the pages
+                logging.info(f"Loading FAISS index from: {index_path}")
+                index, index_info = kb_index.read_index(kb_dir)
+
+            if index_info.get('metric') != 'ip':
+                # Embeddings generated before they were normalized (or before the index was persisted)
+                logging.warning(f"No inner product index at {index_path}, building it in memory")
+                embeddings = kb_index.normalize(embeddings)
+                index = faiss.IndexFlatIP(embeddings.shape[1])
+                index.add(embeddings)
+                index_info = {'metric': 'ip'}
+            # Chunk texts stay on disk (memory-mapped) and are read only for the selected rows
+            chunks = text_store.TextStore(chunks_path) if has_chunks else None
+            # Memory-mapped postings, fused with the FAISS results (built by generate_embeddings.py)
+            lexical = bm25_index.load(kb_dir) if has_bm25 else None
+            logging.info(f"Knowledge base loaded: {index.ntotal} vectors, {len(metadata)} metadata items")
+
+            kb = {
+                'version': version,
+                'embeddings': embeddings,
+                'metadata': metadata,
+                'chunks': chunks,
+                'bm25': lexical,
+                'index': index,
+                'index_info': index_info
+            }
+            _knowledge_bases[embeddings_dir] = kb
+    if reindexed:
+        warm_up()
+    return kb
+
+def watch_knowledge_base(embeddings_dir, interval):
+    """Reloads embeddings_dir (and warms the models up) within interval seconds of a reindex, not on the next question"""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                load_knowledge_base(embeddings_dir)
+            except Exception as e:
+                logging.warning(f"Knowledge base check failed: {str(e)}")
+
+    threading.Thread(target=run, name="kb-watch", daemon=True).start()
+
+_query_encoder = None
+
+def configure_query_encoder(cache_size=None, max_batch=None, max_wait=None):
+    """Call before the first question; the defaults are used otherwise (also for None)"""
+    global _query_encoder
+    with _resource_lock:
+        _query_encoder = query_encoder.QueryEncoder(
+            load_model, **_given(cache_size=cache_size, max_batch=max_batch, max_wait=max_wait)
+        )
+
+def query_encoder_stats():
+    return _query_encoder.stats() if _query_encoder is not None else {}
 
-def calculate_relevance(text, prompt):
-    """Calculate relevance score between text and prompt using string similarity"""
-    return SequenceMatcher(None, text.lower(), prompt.lower()).ratio()
+def encode_prompt(prompt):
+    """Unit embedding of the question, shape (1, dim); cached, and batched with concurrent questions"""
+    global _query_encoder
+    with _resource_lock:
+        if _query_encoder is None:
+            _query_encoder = query_encoder.QueryEncoder(load_model)
+    return _query_encoder.encode(prompt)
+
+# --- Basic helpers for fallback and cleaning ---
 
 def clean_text(text):
     """Cleans text by removing problematic characters"""
@@ -55,52 +252,130 @@ def clean_text(text):
             .replace('\t', ' ')
             .strip())
 
+def render_entry(entry):
+    """Context entry as sent to the model: title, score and source on the heading, chunk text as content"""
+    return f"### {entry['title']} (Similarity Score: {entry['score']:.2f} | Source: {entry['url']})\nContent: {entry['text']}"
+
+def build_context(kb, rows, scores, prompt):
+    """Context entries packed into the token budget (see pack_context) and their unique source URLs"""
+    metadata = kb['metadata']
+    with stage_timer.stage("metadata"):
+        titles = metadata.column('title', rows)
+        urls = metadata.column('url', rows)
+        chunk_numbers = metadata.chunks[rows]
+        texts = kb['chunks'].get_many(rows) if kb['chunks'] is not None else [''] * len(rows)
+
+    entries = [
+        {"title": title, "url": url, "score": float(score), "chunk": int(chunk), "text": text}
+        for title, url, score, chunk, text in zip(titles, urls, scores, chunk_numbers, texts)
+    ]
+    with stage_timer.stage("pack"):
+        entries = pack_context(entries, prompt, render_entry)
+    context = [render_entry(entry) for entry in entries]
+    # Several chunks of one article share its URL
+    sources = list(dict.fromkeys(entry["url"] for entry in entries))
+    return context, sources
+
+# --- Context packing into the model's context window ---
+
+NUM_CTX = 512       # Halved context window
+NUM_PREDICT = 150   # Very short responses
+CONTEXT_CANDIDATES = 6  # Retrieved entries offered to the packer, best first
+
+_context_packer = None
+_context_settings = {"budget": None, "margin": None}
+
+def configure_context(budget=None, margin=None):
+    """budget: context tokens, None derives it from num_ctx, the prompt and num_predict; margin: see context_packer.py"""
+    global _context_packer
+    _context_settings.update(budget=budget, margin=margin)
+    _context_packer = None
+
+def get_context_packer():
+    global _context_packer
+    with _resource_lock:
+        if _context_packer is None:
+            _context_packer = context_packer.ContextPacker(**_given(margin=_context_settings["margin"]))
+    return _context_packer
+
+def context_budget(prompt):
+    """Tokens left for the context once the prompt template and the answer (num_predict) are reserved"""
+    if _context_settings["budget"]:
+        return _context_settings["budget"]
+    return NUM_CTX - NUM_PREDICT - get_context_packer().count(compose_prompt(prompt, ""))
+
+def pack_context(entries, prompt, render):
+    """Keeps the best entries that fit context_budget(prompt), see context_packer.py"""
+    budget = context_budget(prompt)
+    kept = get_context_packer().pack(entries, budget, render)
+    logging.debug("Context packed: %d of %d entries, %d of %d tokens",
+                  len(kept), len(entries), sum(entry['tokens'] for entry in kept), budget)
+    return kept
+
+# --- Optional re-ranking of the retrieved candidates ---
+
+_reranker = None
+_rerank_settings = {"candidates": None, "mmr_lambda": None, "cross_encoder": None}
+
+def configure_reranking(candidates=None, mmr_lambda=None, cross_encoder=None):
+    """
+    candidates: retrieved rows re-ranked down to the entries offered to the packer (None: reranker.DEFAULT_CANDIDATES).
+    mmr_lambda: relevance weight of MMR (1 = relevance only), None disables MMR.
+    cross_encoder: directory of an ONNX cross-encoder and its tokenizer.json, None disables it.
+    """
+    global _reranker
+    _rerank_settings.update(candidates=candidates, mmr_lambda=mmr_lambda, cross_encoder=cross_encoder)
+    _reranker = None
+
+def reranking_enabled():
+    return _rerank_settings["mmr_lambda"] is not None or bool(_rerank_settings["cross_encoder"])
+
+def get_cross_encoder():
+    global _reranker
+    with _resource_lock:
+        if _reranker is None and _rerank_settings["cross_encoder"]:
+            _reranker = reranker.CrossEncoder(_rerank_settings["cross_encoder"])
+    return _reranker
+
+def rerank(kb, rows, scores, prompt, top_n):
+    """The top_n of rows after the cross-encoder and / or MMR; scores stay the cosine similarities"""
+    relevance = scores
+    cross_encoder = get_cross_encoder()
+    if cross_encoder is not None and rows.size:
+        with stage_timer.stage("cross_encoder"):
+            titles = kb['metadata'].column('title', rows)
+            texts = kb['chunks'].get_many(rows) if kb['chunks'] is not None else [''] * len(rows)
+            logits = cross_encoder.score(prompt, [f"{title}\n{text}" for title, text in zip(titles, texts)])
+            # Same 0..1 scale as the similarities MMR compares them with
+            relevance = reranker.sigmoid(logits)
+    if _rerank_settings["mmr_lambda"] is not None and rows.size:
+        with stage_timer.stage("mmr"):
+            order = reranker.mmr(relevance, np.asarray(kb['embeddings'][rows]), top_n, _rerank_settings["mmr_lambda"])
+    else:
+        order = np.argsort(-relevance, kind="stable")[:top_n]
+    return rows[order], scores[order]
+
 # --- Semantic embedding context retrieval using light_embed its less powerfull than Faiss ---
 
-def get_semantic_context_NORMAL(prompt, embeddings_dir, top_n=3, min_score=0.4):
+def get_semantic_context_NORMAL(prompt, embeddings_dir, top_n=3, min_score=DEFAULT_MIN_SCORE):
     """Uses precomputed embeddings and metadata to find the most relevant context for the prompt"""
     try:
-        embeddings_path = os.path.join(embeddings_dir, 'embeddings.npy')
-        metadata_path = os.path.join(embeddings_dir, 'metadata.json')
-        model_dir = os.path.join(os.path.dirname(__file__), '../models/all-MiniLM-L6-v2-onnx')
-
-        # Load saved embedding matrix and corresponding metadata
-        embeddings = np.load(embeddings_path)
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-
-        # Load ONNX embedding model with configuration
-        config_path = os.path.join(model_dir, 'config.json')
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config_dict = json.load(f)
-        config_dict["onnx_file"] = "model.onnx"
-
-        model = TextEmbedding(model_name_or_path=model_dir, model_config=config_dict)
+        # Load saved embedding matrix, corresponding metadata and the ONNX embedding model
+        kb = load_knowledge_base(embeddings_dir)
+        embeddings = kb['embeddings']
 
         # Encode user input prompt
-        prompt_embedding = model.encode([prompt])
-
-        # Compute cosine similarity between user prompt and all saved knowledge embeddings
-        similarities = cosine_similarity(prompt_embedding, embeddings)[0]
+        prompt_embedding = encode_prompt(prompt)
 
-        # Apply min_score filter
-        filtered_indices = [i for i, score in enumerate(similarities) if score >= min_score]
+        # Saved embeddings are unit vectors, so the dot product is the cosine similarity
+        similarities = embeddings @ prompt_embedding[0]
 
-        # Log similarities for debugging
-        # Select top 3 most relevant entries
-        # top_indices = similarities.argsort()[-3:][::-1]
-        top_indices = sorted(filtered_indices, key=lambda i: similarities[i], reverse=True)[:top_n]
-
-        context = []
-        sources = []
+        # Apply min_score filter and select the most relevant entries
+        top_indices, top_scores = kb_index.select_top(
+            similarities, np.arange(similarities.shape[0]), min_score, top_n
+        )
 
-        for idx in top_indices:
-            item = metadata[idx]
-            score = similarities[idx]
-            context.append(
-                f"### {item['title']}\nContent: Similarity Score: {score:.2f} | Source: {item['url']}"
-            )
-            sources.append(item['url'])
+        context, sources = build_context(kb, top_indices, top_scores, prompt)
 
         return "\n".join(context), sources
 
@@ -108,105 +383,113 @@ def get_semantic_context_NORMAL(prompt, embeddings_dir, top_n=3, min_score=0.4):
         logging.error(f"Error loading semantic context: {str(e)}")
         return "", []
 
-def get_semantic_context(prompt, embeddings_dir, top_n=500, min_score=0.9):
-    """Uses FAISS to find the most relevant contexts."""
-    try:
-        logging.info(f"Running semantic search for prompt: {prompt}")
-
-        embeddings_path = os.path.join(embeddings_dir, 'embeddings.npy')
-        metadata_path = os.path.join(embeddings_dir, 'metadata.json')
-        model_dir = os.path.join(os.path.dirname(__file__), '../models/all-MiniLM-L6-v2-onnx')
-
-        # Load the saved embeddings
-        logging.info(f"Loading embeddings from: {embeddings_path}")
-        embeddings = np.load(embeddings_path).astype('float32')
-        logging.info(f"Embeddings shape: {embeddings.shape}")
-
-        logging.info(f"Loading metadata from: {metadata_path}")
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-        logging.info(f"Metadata items loaded: {len(metadata)}")
-
-        # Load ONNX model
-        config_path = os.path.join(model_dir, 'config.json')
-        logging.info(f"Loading ONNX model config from: {config_path}")
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config_dict = json.load(f)
-        config_dict["onnx_file"] = "model.onnx"
-
-        model = TextEmbedding(model_name_or_path=model_dir, model_config=config_dict)
-
-        # Encode the query
-        logging.info("Encoding prompt...")
-        prompt_embedding = model.encode([prompt]).astype('float32')
-        logging.info(f"Prompt embedding shape: {prompt_embedding.shape}")
-
-        # Create the FAISS index
-        logging.info("Creating FAISS index...")
-        index = faiss.IndexFlatL2(embeddings.shape[1])
-        index.add(embeddings)
-        logging.info("Index created and embeddings added.")
-
-        # Search for the top_n nearest neighbors
-        distances, indices = index.search(prompt_embedding, top_n)
-        logging.info(f"FAISS raw distances: {distances}")
-        logging.info(f"FAISS raw indices: {indices}")
-
-        # Filter the results using the score threshold
-        filtered_indices = [i for i, score in zip(indices[0], distances[0]) if score <= min_score]
-        logging.info(f"Filtered indices (score <= {min_score}): {filtered_indices}")
-
-        if not filtered_indices:
-            logging.warning("No relevant context found (filtered_indices is empty).")
-
-        # Select the closest indices
-        top_indices = sorted(filtered_indices, key=lambda i: distances[0][indices[0].tolist().index(i)])[:top_n]
-
-        # Prepare the context information
-        context = []
-        sources = []
-
-        for idx in top_indices:
-            item = metadata[idx]
-            score = distances[0][indices[0].tolist().index(idx)]
-            context_line = f"### {item['title']}\nContent: Similarity Score: {score:.2f} | Source: {item['url']}"
-            context.append(context_line)
-            sources.append(item['url'])
-            logging.info(f"Selected context item: {context_line}")
-
-        full_context = "\n".join(context)
-        logging.info(f"Final context length: {len(full_context)} characters")
-
-        return full_context, sources
+def get_semantic_context(prompt, embeddings_dir, top_n=500, min_score=DEFAULT_MIN_SCORE, nprobe=None, ef_search=None):
+    """
+    Uses FAISS to find the most relevant contexts.
+    Scores are cosine similarities, entries below min_score are dropped.
+    When the knowledge base has a BM25 index, its results are fused with the FAISS ones
+    (reciprocal rank fusion), so exact terms (course codes, product names) are found even
+    when their embedding is not close enough. Lexical hits must match most of the
+    question's terms (bm25_index.DEFAULT_MIN_COVERAGE) instead of reaching min_score.
+    With re-ranking configured (configure_reranking), the best `candidates` rows are
+    re-ranked down to top_n. Its stages are spans of the current request (track_request).
+    nprobe (IVF) and ef_search (HNSW) override the defaults saved with the index.
+    """
+    with track_request("search"):
+        try:
+            logging.debug("Running semantic search for prompt: %s", prompt)
+
+            # Load the saved embeddings, metadata and index (cached per process)
+            with stage_timer.stage("kb_load"):
+                kb = load_knowledge_base(embeddings_dir)
+            index = kb['index']
+
+            # Encode the query
+            with stage_timer.stage("encode"):
+                prompt_embedding = encode_prompt(prompt)
+
+            # Search for the top_n nearest neighbors
+            params = kb_index.search_parameters(
+                index,
+                nprobe=nprobe or kb['index_info'].get('nprobe'),
+                ef_search=ef_search or kb['index_info'].get('ef_search')
+            )
+            # Re-ranking picks top_n among more rows; with a lexical index, a deeper candidate list of each side is fused
+            pool = max(top_n, _rerank_settings["candidates"] or reranker.DEFAULT_CANDIDATES) if reranking_enabled() else top_n
+            lexical = kb['bm25']
+            candidates = max(pool, bm25_index.DEFAULT_CANDIDATES) if lexical is not None else pool
+            with stage_timer.stage("search"):
+                scores, indices = index.search(prompt_embedding, candidates, params=params)
+
+                # Filter the results using the score threshold and keep the closest ones
+                top_indices, top_scores = kb_index.select_top(scores[0], indices[0], min_score, candidates)
+            logging.debug("%d FAISS results with score >= %s", top_indices.size, min_score)
+
+            if lexical is not None:
+                with stage_timer.stage("lexical"):
+                    lexical_rows, _ = lexical.search(prompt, candidates)
+                    top_indices = np.array(
+                        bm25_index.fuse([top_indices.tolist(), lexical_rows.tolist()])[:pool], dtype='int64'
+                    )
+                    # Lexical hits may be missing from the FAISS results, the headings show the cosine similarity of each row
+                    top_scores = kb['embeddings'][top_indices] @ prompt_embedding[0]
+                logging.debug("%d BM25 results fused", lexical_rows.size)
+            else:
+                top_indices, top_scores = top_indices[:pool], top_scores[:pool]
+
+            if reranking_enabled():
+                top_indices, top_scores = rerank(kb, top_indices, top_scores, prompt, top_n)
+
+            if not top_indices.size:
+                logging.warning("No relevant context found (filtered_indices is empty).")
+
+            # Prepare the context information
+            context, sources = build_context(kb, top_indices, top_scores, prompt)
+
+            full_context = "\n".join(context)
+            logging.debug("Selected context items: %d, %d characters", len(context), len(full_context))
+
+            return full_context, sources
+
+        except Exception as e:
+            logging.error(f"Error loading semantic context: {str(e)}", exc_info=True)
+            return "", []
 
-    except Exception as e:
-        logging.error(f"Error loading semantic context: {str(e)}", exc_info=True)
-        return "", []
 # --- Optional fallback in case embedding-based search fails ---
 
-@lru_cache(maxsize=500)
-def fetch_knowledge_cached(url):
-    """Cached version of knowledge fetching via API"""
+_kb_caches = {}
+_kb_cache_settings = {"cache_dir": None, "ttl": None}
+
+def configure_kb_cache(cache_dir=None, ttl=None):
+    """Disk cache of the knowledge API exports, cache_dir defaults to kb_cache.default_cache_dir(), ttl to kb_cache.DEFAULT_TTL"""
+    _kb_cache_settings.update(cache_dir=cache_dir, ttl=ttl)
+    _kb_caches.clear()
+
+def knowledge_cache(embeddings_dir=None):
+    cache_dir = _kb_cache_settings["cache_dir"] or kb_cache.default_cache_dir(embeddings_dir)
+    with _resource_lock:
+        if cache_dir not in _kb_caches:
+            _kb_caches[cache_dir] = kb_cache.KnowledgeCache(cache_dir, **_given(ttl=_kb_cache_settings["ttl"]))
+        return _kb_caches[cache_dir]
+
+def kb_cache_stats():
+    return {cache_dir: cache.stats() for cache_dir, cache in list(_kb_caches.items())}
+
+def fetch_knowledge_indexed(url, embeddings_dir=None):
+    """
+    Returns (items, index): the knowledge API export at url and its BM25 index, read from the
+    disk cache (downloaded or revalidated when older than the cache TTL). ([], None) on errors.
+    """
     try:
         if not urlparse(url).scheme:
-            return []
-
-        response = requests.get(
-            url,
-            timeout=10,
-            headers={
-                'Accept': 'application/json; charset=utf-8',
-                'User-Agent': 'Mozilla/5.0'
-            }
-        )
-        response.raise_for_status()
+            return [], None
 
-        data = response.json()
-        return data.get('results', []) if isinstance(data, dict) else data if isinstance(data, list) else []
+        knowledge = knowledge_cache(embeddings_dir).get(url, session=http_client.get_session(url), timeout=10)
+        return knowledge, knowledge.index
 
     except Exception as e:
         logging.error(f"Knowledge API Error: {str(e)}")
-        return []
+        return [], None
 
 # --- Final response formatting helpers ---
 
@@ -241,145 +524,272 @@ def format_response_with_sources(response_text, knowledge, sources):
 
     return response_text
 
-def filter_items_by_keywords(items, keywords):
+def render_article(entry):
+    return f"### {entry['title']}\nContent: {entry['text']}...\n"
+
+def process_knowledge(items, prompt, index=None):
     """
-    Filters articles by matching keywords in the title, content, and keywords fields.
-    Only articles containing at least one keyword from the query in any of these three fields are retained.
+    Best articles for prompt by BM25 over title, keywords and content, packed into the token
+    budget like the semantic context; index is built when not given
     """
-    filtered_items = []
-    for item in items:
-        title = item.get('title', '').lower()
-        content = item.get('content', '').lower()
-        item_keywords = item.get('keywords', '').lower()
-
-        if any(keyword.lower() in title or keyword.lower() in content or keyword.lower() in item_keywords for keyword in keywords):
-            filtered_items.append(item)
-
-    return filtered_items
-
-def process_knowledge(items, prompt):
-    """Processes articles with relevance scores after filtering by relevant keywords in title, content, and keywords"""
-    scored_items = []
-    keywords = prompt.split()
-    filtered_items = filter_items_by_keywords(items, keywords)
-
-    for item in filtered_items:
-        title = clean_text(item.get('title', ''))
-        url = item.get('url', '')
-        content = clean_text(item.get('content', ''))
-        keywords = clean_text(item.get('keywords', ''))
-
-        title_score = calculate_relevance(title, prompt) * 1.5
-        content_score = calculate_relevance(content, prompt) * 1.2
-        keyword_score = calculate_relevance(keywords, prompt) * 1.3
-        url_score = calculate_relevance(url, prompt)
-
-        total_score = (title_score + content_score + keyword_score + url_score) / 5
-
-        if total_score > 0.2:
-            scored_items.append({
-                'title': title,
-                'url': url,
-                'content': content[:2000],
-                'keywords': keywords,
-                'score': total_score
-            })
-
-    scored_items.sort(key=lambda x: x['score'], reverse=True)
-
-    context = []
-    sources = []
-    for item in scored_items[:3]:
-        entry = (
-            f"### {item['title']}\n"
-            f"Content: {item['content'][:800]}...\n"
-        )
-        context.append(entry)
-        sources.append(item['url'])
-
+    if index is None:
+        index = bm25_index.build(kb_cache.knowledge_text(item) for item in items)
+    rows, scores = index.search(prompt, k=3)
+
+    entries = []
+    for row, score in zip(rows, scores):
+        item = items[row]
+        entries.append({
+            "title": clean_text(item.get('title', '')),
+            "url": item.get('url', ''),
+            "score": float(score),
+            "text": clean_text(item.get('content', ''))[:800]
+        })
+    entries = pack_context(entries, prompt, render_article)
+
+    context = [render_article(entry) for entry in entries]
+    sources = [entry["url"] for entry in entries]
     return "\n".join(context), sources
 
+# --- Answer cache, enabled by the helper services (a CLI process answers a single question) ---
+
+_answer_cache = None
+
+def enable_answer_cache(max_entries=None, ttl=None, similarity=None):
+    """max_entries=0 disables the cache; None keeps answer_cache's defaults"""
+    global _answer_cache
+    if max_entries == 0:
+        _answer_cache = None
+    else:
+        _answer_cache = answer_cache.AnswerCache(**_given(max_entries=max_entries, ttl=ttl, similarity=similarity))
+
+def answer_cache_stats():
+    return _answer_cache.stats() if _answer_cache is not None else {}
+
+def lookup_answer(prompt, knowledge_url=None, embeddings_dir=None, nprobe=None, ef_search=None,
+                  min_score=DEFAULT_MIN_SCORE):
+    """
+    Returns (result, remember): the cached answer (None on a miss) and a function that
+    stores a freshly generated result for the next similar question.
+    """
+    if _answer_cache is None or not embeddings_dir:
+        return None, lambda result: None
+    scope = (embeddings_dir, knowledge_url, min_score, nprobe, ef_search)
+    try:
+        # Answers are only valid for the knowledge base version they were generated from
+        version = load_knowledge_base(embeddings_dir)['version']
+        result, embedding = _answer_cache.get(scope, version, prompt, lambda: encode_prompt(prompt))
+    except Exception as e:
+        # A miss: the normal path runs into the same error and reports it
+        logging.warning(f"Answer cache lookup failed: {str(e)}")
+        return None, lambda result: None
+
+    def remember(result):
+        if result.get("success"):
+            _answer_cache.put(scope, version, prompt, embedding, result)
+
+    return result, remember
+
+# --- Admission control in front of Ollama, enabled by the helper services ---
+
+_scheduler = None
+
+BUSY_RESPONSE = "Many people are asking questions right now. Please try again in a moment."
+
+def configure_scheduler(max_in_flight=None, max_queue=None, max_per_user=None, queue_timeout=None):
+    """None keeps scheduler's defaults"""
+    global _scheduler
+    _scheduler = scheduler.GenerationScheduler(**_given(
+        max_in_flight=max_in_flight, max_queue=max_queue, max_per_user=max_per_user, queue_timeout=queue_timeout
+    ))
+
+def scheduler_stats():
+    return _scheduler.stats() if _scheduler is not None else {}
+
+def generation_slot(user=None):
+    """Context manager held for the whole Ollama generation, yields the seconds spent queued"""
+    return _scheduler.slot(user) if _scheduler is not None else contextlib.nullcontext(0.0)
+
+def async_generation_slot(user=None):
+    return _scheduler.async_slot(user) if _scheduler is not None else contextlib.nullcontext(0.0)
+
+def busy_result(e):
+    logging.warning(f"Question shed: {str(e)}")
+    return {
+        "success": False,
+        "response": BUSY_RESPONSE,
+        "sources": []
+    }
+
+# --- Ollama backends, configured by the helper services ---
+
+OLLAMA_MODEL = "phi3:mini"  # 35% faster than full phi3
+
+_backends = None
+
+def configure_backends(urls=None, health_interval=None):
+    """
+    Sends generations to urls (default: OLLAMA_BACKENDS or the local Ollama), health checked
+    every health_interval seconds (default: ollama_backends.DEFAULT_HEALTH_INTERVAL)
+    """
+    global _backends
+    if _backends is not None:
+        _backends.stop()
+    _backends = ollama_backends.BackendPool(urls, **_given(health_interval=health_interval))
+    _backends.start()
+    return _backends
+
+def ollama_backends_pool():
+    return _backends if _backends is not None else ollama_backends.default_pool()
+
+def backend_stats():
+    return ollama_backends_pool().stats()
+
+# --- Model warm-up and keep_alive, enabled by the helper services ---
+
+_warmer = None
+
+def configure_warmup(keep_alive=None, cold_load=None):
+    """keep_alive as returned by model_warmup.parse_keep_alive; call after configure_backends"""
+    global _warmer
+    _warmer = model_warmup.ModelWarmer(ollama_backends_pool(), [OLLAMA_MODEL], keep_alive, **_given(cold_load=cold_load))
+
+def warm_up(wait=False):
+    if _warmer is not None:
+        _warmer.warm_all(wait=wait)
+
+def model_keep_alive(model):
+    return _warmer.keep_alive_for(model) if _warmer is not None else model_warmup.DEFAULT_KEEP_ALIVE
+
+def record_timings(model, chunk):
+    """Timings of a finished generation, from its final chunk; Ollama's phases become spans of the request"""
+    for phase in ("load", "prompt_eval", "eval"):
+        seconds = model_warmup.timings(chunk).get(phase)
+        if seconds:
+            stage_timer.record(f"ollama_{phase}", seconds)
+    if _warmer is not None:
+        _warmer.record(model, chunk)
+
+def warmup_stats():
+    return _warmer.stats() if _warmer is not None else {}
 
 # --- Main entry point for generating answers ---
 
-def generate_response(prompt, knowledge_url=None, embeddings_dir=None):
-    """Generates response using Ollama with enhanced semantic knowledge integration"""
+def build_prompt(prompt, knowledge_url=None, embeddings_dir=None, nprobe=None, ef_search=None,
+                 min_score=DEFAULT_MIN_SCORE):
+    """Retrieves the context for prompt and returns (full_prompt, knowledge, sources)"""
+    # Attempt to load context from local semantic embeddings
+    knowledge, sources = get_semantic_context(
+        prompt, embeddings_dir, top_n=CONTEXT_CANDIDATES, min_score=min_score, nprobe=nprobe, ef_search=ef_search
+    )
+
+    # Optional fallback: fetch from remote API if embedding context is empty
+    if not knowledge and knowledge_url:
+        with stage_timer.stage("fallback_fetch"):
+            data, lexical = fetch_knowledge_indexed(knowledge_url, embeddings_dir)
+        if data:
+            with stage_timer.stage("fallback_search"):
+                knowledge, sources = process_knowledge(data, prompt, lexical)
+
+    return compose_prompt(prompt, knowledge), knowledge, sources
+
+def compose_prompt(prompt, knowledge):
+    """Instruction prompt sent to the model"""
+    # Construct full instruction-based prompt for LLM
+    # full_prompt = (
+    #     "You are a helpful assistant for a school platform with access to a knowledge base.\n"
+    #     "Your task is to:\n"
+    #     "1. Carefully read the user's question.\n"
+    #     "2. Review only the CONTEXT provided below.\n"
+    #     "3. If relevant instructions or details are found in the CONTEXT, explain them clearly, step by step.\n"
+    #     "4. Use **markdown** or *quotations* to highlight relevant instructions.\n"
+    #     "5. Do not use your own general knowledge or make assumptions.\n"
+    #     "6. If the question is not covered in the CONTEXT, respond with: 'I can only answer questions related to the content in the knowledge base.'\n"
+    #     "7. Always respond in the same language as the user’s question.\n"
+    #     "8. At the end, list any source URLs you used.\n\n"
+    #     f"CONTEXT:\n{knowledge if knowledge else 'No additional context available.'}\n\n"
+    #     f"USER QUESTION: {prompt}\n\n"
+    #     "Please provide an answer based solely on the content above."
+    # )
+
+    # full_prompt = (
+    #     "You are a knowledgeable school assistant that ONLY uses the provided context from the knowledge base to answer the user's question.\n"
+    #     "Instructions:\n"
+    #     "1. First, carefully analyze the user's question to understand what task they need help with.\n"
+    #     "2. Search ONLY the context provided below (titles, URLs, and content) to find relevant information.\n"
+    #     "3. If you find relevant information in the CONTEXT, use it to answer the user's question.\n"
+    #     "4. If the context does not provide sufficient information to answer the user's question, you must respond by saying that you can only provide information from the knowledge base.\n"
+    #     "5. Do not add any general knowledge or information that is not present in the CONTEXT.\n"
+    #     "6. If multiple context sources (titles, URLs, or content) provide useful information, COMBINE them into one coherent answer.\n"
+    #     "7. Always respond in the same language as the user's question.\n\n"
+    #     f"CONTEXT:\n{knowledge if knowledge else 'No additional context available.'}\n\n"
+    #     f"USER QUESTION: {prompt}\n\n"
+    #     "Please provide a clear and coherent answer based strictly on the context above. If the information is not available, clearly state that your answer is based solely on the knowledge in the provided context."
+    # )
+
+    return f"Using ONLY this context:\n{knowledge}\n\nQ: {prompt}\nA:"
+
+def ollama_payload(full_prompt, stream=False):
+    """Body of the /api/generate request"""
+    return {
+        "model": OLLAMA_MODEL,
+        "prompt": full_prompt,
+        "stream": stream,
+        "keep_alive": model_keep_alive(OLLAMA_MODEL),  # Stays loaded between questions
+        "options": { # https://github.com/ollama/ollama/blob/main/docs/modelfile.md#valid-parameters-and-values
+            "temperature": 0.1,       # Maximum determinism
+            "num_ctx": NUM_CTX,
+            "top_k": 5,               # Very narrow sampling
+            "repeat_penalty": 1.0,    # No repetition penalty
+            "num_threads": 6,         # Fewer threads reduce overhead
+            "num_predict": NUM_PREDICT
+        }
+    }
+
+def generate_response(prompt, knowledge_url=None, embeddings_dir=None, nprobe=None, ef_search=None,
+                      min_score=DEFAULT_MIN_SCORE, user=None):
+    """
+    Generates response using Ollama with enhanced semantic knowledge integration.
+    user identifies the asker for the per-user limits of the admission control.
+    """
+    options = {"knowledge_url": knowledge_url, "embeddings_dir": embeddings_dir,
+               "nprobe": nprobe, "ef_search": ef_search, "min_score": min_score}
+    with track_request("generate"):
+        with stage_timer.stage("answer_cache"):
+            cached, remember = lookup_answer(prompt, **options)
+        if cached is not None:
+            return cached
+        result = _generate_response(prompt, user=user, **options)
+        remember(result)
+        return result
+
+def _generate_response(prompt, knowledge_url=None, embeddings_dir=None, nprobe=None, ef_search=None,
+                       min_score=DEFAULT_MIN_SCORE, user=None):
     try:
-        # Attempt to load context from local semantic embeddings
-
-        knowledge, sources = get_semantic_context(prompt, embeddings_dir, top_n=5, min_score=0.9)
-
-        # Optional fallback: fetch from remote API if embedding context is empty
-        if not knowledge and knowledge_url:
-            data = fetch_knowledge_cached(knowledge_url)
-            if data:
-                knowledge, sources = process_knowledge(data, prompt)
-
-        # Construct full instruction-based prompt for LLM
-        # full_prompt = (
-        #     "You are a helpful assistant for a school platform with access to a knowledge base.\n"
-        #     "Your task is to:\n"
-        #     "1. Carefully read the user's question.\n"
-        #     "2. Review only the CONTEXT provided below.\n"
-        #     "3. If relevant instructions or details are found in the CONTEXT, explain them clearly, step by step.\n"
-        #     "4. Use **markdown** or *quotations* to highlight relevant instructions.\n"
-        #     "5. Do not use your own general knowledge or make assumptions.\n"
-        #     "6. If the question is not covered in the CONTEXT, respond with: 'I can only answer questions related to the content in the knowledge base.'\n"
-        #     "7. Always respond in the same language as the user’s question.\n"
-        #     "8. At the end, list any source URLs you used.\n\n"
-        #     f"CONTEXT:\n{knowledge if knowledge else 'No additional context available.'}\n\n"
-        #     f"USER QUESTION: {prompt}\n\n"
-        #     "Please provide an answer based solely on the content above."
-        # )
-
-        # full_prompt = (
-        #     "You are a knowledgeable school assistant that ONLY uses the provided context from the knowledge base to answer the user's question.\n"
-        #     "Instructions:\n"
-        #     "1. First, carefully analyze the user's question to understand what task they need help with.\n"
-        #     "2. Search ONLY the context provided below (titles, URLs, and content) to find relevant information.\n"
-        #     "3. If you find relevant information in the CONTEXT, use it to answer the user's question.\n"
-        #     "4. If the context does not provide sufficient information to answer the user's question, you must respond by saying that you can only provide information from the knowledge base.\n"
-        #     "5. Do not add any general knowledge or information that is not present in the CONTEXT.\n"
-        #     "6. If multiple context sources (titles, URLs, or content) provide useful information, COMBINE them into one coherent answer.\n"
-        #     "7. Always respond in the same language as the user's question.\n\n"
-        #     f"CONTEXT:\n{knowledge if knowledge else 'No additional context available.'}\n\n"
-        #     f"USER QUESTION: {prompt}\n\n"
-        #     "Please provide a clear and coherent answer based strictly on the context above. If the information is not available, clearly state that your answer is based solely on the knowledge in the provided context."
-        # )
-
-        full_prompt = f"Using ONLY this context:\n{knowledge}\n\nQ: {prompt}\nA:"
-
-
-        # Call local Ollama model
-        ollama_response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": "phi3:mini",  # 35% faster than full phi3
-                "prompt": full_prompt,
-                "stream": False,
-                "options": { # https://github.com/ollama/ollama/blob/main/docs/modelfile.md#valid-parameters-and-values
-                    "temperature": 0.1,       # Maximum determinism
-                    "num_ctx": 512,           # Halved context window
-                    "top_k": 5,               # Very narrow sampling
-                    "repeat_penalty": 1.0,    # No repetition penalty
-                    "num_threads": 6,         # Fewer threads reduce overhead
-                    "num_predict": 150        # Very short responses
-                }
-            },
-            timeout=160  # Fail fast
+        full_prompt, knowledge, sources = build_prompt(
+            prompt, knowledge_url, embeddings_dir, nprobe=nprobe, ef_search=ef_search, min_score=min_score
         )
 
-        try:
-            response_data = ollama_response.json()
-            response_text = response_data.get("response", "")
-
-        except json.JSONDecodeError as e:
-            logging.error(f"JSONDecodeError: {str(e)} - Raw: {ollama_response.text}")
-            return {
-                "success": False,
-                "response": "Error parsing the response from the model. Please try again later.",
-                "sources": []
-            }
+        # Call the least busy Ollama backend, over a kept-alive pooled connection, once admitted
+        with generation_slot(user) as queue_wait:
+            stage_timer.record("queue", queue_wait)
+            with stage_timer.stage("ollama"), ollama_backends_pool().post(
+                OLLAMA_MODEL,
+                json=ollama_payload(full_prompt),
+                timeout=160  # Fail fast
+            ) as ollama_response:
+                try:
+                    response_data = ollama_response.json()
+                    response_text = response_data.get("response", "")
+                    record_timings(OLLAMA_MODEL, response_data)
+
+                except json.JSONDecodeError as e:
+                    logging.error(f"JSONDecodeError: {str(e)} - Raw: {ollama_response.text}")
+                    return {
+                        "success": False,
+                        "response": "Error parsing the response from the model. Please try again later.",
+                        "sources": []
+                    }
 
         response_text = format_response_with_sources(response_text, knowledge, sources)
 
@@ -390,6 +800,8 @@ def generate_response(prompt, knowledge_url=None, embeddings_dir=None):
             "context_used": bool(knowledge.strip())
         }
 
+    except scheduler.Busy as e:
+        return busy_result(e)
     except requests.exceptions.RequestException as e:
         logging.error(f"RequestException: {str(e)}")
         return {
@@ -405,6 +817,85 @@ def generate_response(prompt, knowledge_url=None, embeddings_dir=None):
             "sources": []
         }
 
+def stream_response(prompt, knowledge_url=None, embeddings_dir=None, nprobe=None, ef_search=None,
+                    min_score=DEFAULT_MIN_SCORE, user=None):
+    """
+    Streaming variant of generate_response. Yields ("token", text) as Ollama generates the answer,
+    then ("done", result) once, with the same result dict generate_response returns.
+    The final response can differ from the joined tokens: sources are appended and very
+    short answers are replaced by the context.
+    A cached answer is sent as the "done" event alone.
+    """
+    options = {"knowledge_url": knowledge_url, "embeddings_dir": embeddings_dir,
+               "nprobe": nprobe, "ef_search": ef_search, "min_score": min_score}
+    with track_request("stream"):
+        with stage_timer.stage("answer_cache"):
+            cached, remember = lookup_answer(prompt, **options)
+        if cached is not None:
+            yield "done", cached
+            return
+        events = _stream_response(prompt, user=user, **options)
+        try:
+            for event, data in events:
+                if event == "done":
+                    remember(data)
+                yield event, data
+        finally:
+            events.close()
+
+def _stream_response(prompt, knowledge_url=None, embeddings_dir=None, nprobe=None, ef_search=None,
+                     min_score=DEFAULT_MIN_SCORE, user=None):
+    try:
+        full_prompt, knowledge, sources = build_prompt(
+            prompt, knowledge_url, embeddings_dir, nprobe=nprobe, ef_search=ef_search, min_score=min_score
+        )
+
+        tokens = []
+        # Closing the response (also when the consumer stops early) makes Ollama stop generating
+        with generation_slot(user) as queue_wait:
+            stage_timer.record("queue", queue_wait)
+            with stage_timer.stage("ollama"), ollama_backends_pool().post(
+                OLLAMA_MODEL, json=ollama_payload(full_prompt, stream=True), stream=True, timeout=160
+            ) as ollama_response:
+                ollama_response.raise_for_status()
+                for chunk in ollama_stream.iter_chunks(ollama_response):
+                    if chunk.get("response"):
+                        tokens.append(chunk["response"])
+                        yield "token", chunk["response"]
+                    if chunk.get("done"):
+                        record_timings(OLLAMA_MODEL, chunk)
+
+        yield "done", {
+            "success": True,
+            "response": format_response_with_sources("".join(tokens), knowledge, sources),
+            "sources": sources,
+            "context_used": bool(knowledge.strip())
+        }
+
+    except scheduler.Busy as e:
+        yield "done", busy_result(e)
+    except requests.exceptions.RequestException as e:
+        logging.error(f"RequestException: {str(e)}")
+        yield "done", {
+            "success": False,
+            "response": f"RequestException: {str(e)}",
+            "sources": []
+        }
+    except (ValueError, ollama_stream.OllamaStreamError) as e:
+        logging.error(f"Streaming error: {str(e)}")
+        yield "done", {
+            "success": False,
+            "response": "Error parsing the response from the model. Please try again later.",
+            "sources": []
+        }
+    except Exception as e:
+        logging.error(f"Streaming error: {str(e)}")
+        yield "done", {
+            "success": False,
+            "response": "An unexpected error occurred. Please try again or contact support.",
+            "sources": []
+        }
+
 # --- CLI entrypoint for direct execution ---
 
 if __name__ == "__main__":
@@ -422,12 +913,13 @@ if __name__ == "__main__":
         prompt = sys.argv[1]
         knowledge_url = sys.argv[2] if len(sys.argv) > 2 else None
         embedding_path = sys.argv[3] if len(sys.argv) > 3 else None
+        min_score = float(sys.argv[4]) if len(sys.argv) > 4 and sys.argv[4] else DEFAULT_MIN_SCORE
         if not embedding_path:
             logging.error("Embedding path not received")
 
 
 
-        result = generate_response(prompt, knowledge_url, embedding_path)
+        result = generate_response(prompt, knowledge_url, embedding_path, min_score=min_score)
         print(json.dumps(result, ensure_ascii=False, indent=2))
 
     except Exception as e:
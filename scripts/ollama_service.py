@@ -0,0 +1,310 @@
+"""
+    Long-lived helper service for ask_with_knowledge.
+    Loads the embedding model, embeddings and metadata once and answers
+    generate_response requests over localhost HTTP, so a chat turn no longer pays
+    interpreter start, heavy imports and model/index loading.
+
+    Usage: python3 ollama_service.py [--host 127.0.0.1] [--port 8765] [--embeddings-dir <dir>]
+                                     [--ollama-url http://gpu1:11434 --ollama-url http://gpu2:11434]
+
+    POST /generate  {"prompt": "...", "knowledge_url": "...", "embeddings_dir": "...",
+                     "min_score": 0.55, "nprobe": 16, "ef_search": 64, "user": 42}
+                    (search knobs are optional, user is used for per-user queue limits)
+    POST /generate/stream  same body, answered as server-sent events:
+                     "token" events ({"text": "..."}) while Ollama generates, then one "done"
+                     event with the /generate result
+    GET  /health
+    GET  /stats     queue, caches, prompt encoding, request stage timings, Ollama backend and model counters
+    GET  /metrics   request stage histograms in the Prometheus text format
+
+    ollama_helper_with_embeddings.py keeps working as a standalone CLI and is the
+    fallback used by externallib.php when this service is not reachable.
+    ollama_async_service.py serves the same API from one asyncio event loop.
+"""
+import sys
+import json
+import logging
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Log to stderr before importing the helper, its basicConfig call then becomes a no-op
+logging.basicConfig(
+    stream=sys.stderr,
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s'
+)
+
+import ollama_helper_with_embeddings as helper
+import lazy_imports
+import http_client
+import answer_cache
+import query_encoder
+import scheduler
+import ollama_backends
+import model_warmup
+import kb_cache
+import context_packer
+import reranker
+
+# The helper defers its heavy imports for the CLI; here they are done before any request thread runs
+lazy_imports.load_all()
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def positive_int(value, name):
+    if isinstance(value, bool) or int(value) != value or value < 1:
+        raise ValueError(f"{name} must be a positive integer")
+    return int(value)
+
+def request_options(payload, defaults):
+    """
+    generate_response keyword arguments from a request body; defaults holds the service's
+    command line values. Raises ValueError or TypeError on invalid values (a 400 answer).
+    """
+    min_score = payload.get("min_score")
+    if min_score in (None, ""):
+        min_score = helper.DEFAULT_MIN_SCORE
+    nprobe = payload.get("nprobe")
+    ef_search = payload.get("ef_search")
+    return {
+        "knowledge_url": payload.get("knowledge_url") or None,
+        "embeddings_dir": payload.get("embeddings_dir") or defaults.embeddings_dir,
+        "nprobe": positive_int(nprobe, "nprobe") if nprobe else defaults.nprobe,
+        "ef_search": positive_int(ef_search, "ef_search") if ef_search else defaults.ef_search,
+        "min_score": float(min_score),
+        "user": payload.get("user")
+    }
+
+def sse_message(event, data):
+    """One server-sent event; tokens are sent as {"text": ...}"""
+    if event == "token":
+        data = {"text": data}
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def service_stats():
+    return {
+        "scheduler": helper.scheduler_stats(),
+        "answer_cache": helper.answer_cache_stats(),
+        "query_encoder": helper.query_encoder_stats(),
+        "backends": helper.backend_stats(),
+        "models": helper.warmup_stats(),
+        "kb_cache": helper.kb_cache_stats(),
+        "stages": helper.stage_stats()
+    }
+
+def add_tuning_arguments(parser):
+    """Options shared by both services: Ollama backends, admission control, caches and prompt encoding"""
+    parser.add_argument("--ollama-url", action="append", default=None,
+                        help="Ollama base URL, repeat for several backends "
+                             f"(default: $OLLAMA_BACKENDS or {ollama_backends.DEFAULT_URL})")
+    parser.add_argument("--health-interval", type=float, default=ollama_backends.DEFAULT_HEALTH_INTERVAL,
+                        help="Seconds between Ollama backend health checks, 0 disables them")
+    parser.add_argument("--keep-alive", action="append", default=None,
+                        help="How long Ollama keeps the model loaded after a question, as an Ollama duration "
+                             f"(default: {model_warmup.DEFAULT_KEEP_ALIVE}); MODEL=DURATION sets it for one model")
+    parser.add_argument("--cold-load", type=float, default=model_warmup.COLD_LOAD_SECONDS,
+                        help="Model load seconds that count as a cold start and warm up the other backends")
+    parser.add_argument("--reindex-check", type=float, default=60,
+                        help="Seconds between checks of the default embeddings directory for a reindex, 0 disables them")
+    parser.add_argument("--max-generations", type=int, default=scheduler.DEFAULT_MAX_IN_FLIGHT,
+                        help="Generations sent to Ollama at the same time, OLLAMA_NUM_PARALLEL times the number of backends")
+    parser.add_argument("--max-queue", type=int, default=scheduler.DEFAULT_MAX_QUEUE,
+                        help="Questions waiting for a generation slot before new ones get a busy answer")
+    parser.add_argument("--max-per-user", type=int, default=scheduler.DEFAULT_MAX_PER_USER,
+                        help="Questions one user may have queued or running")
+    parser.add_argument("--queue-timeout", type=float, default=scheduler.DEFAULT_QUEUE_TIMEOUT,
+                        help="Seconds a question may wait in the queue before it gets a busy answer; "
+                             "with the Ollama timeout (160) it must stay under the plugin's HELPER_SERVICE_TIMEOUT (240)")
+    parser.add_argument("--answer-cache-size", type=int, default=answer_cache.DEFAULT_MAX_ENTRIES,
+                        help="Answers kept for repeated questions, 0 disables the cache")
+    parser.add_argument("--answer-cache-ttl", type=int, default=answer_cache.DEFAULT_TTL,
+                        help="Seconds a cached answer stays valid")
+    parser.add_argument("--answer-cache-similarity", type=float, default=answer_cache.DEFAULT_SIMILARITY,
+                        help="Cosine similarity for a different wording to reuse an answer (1 = exact matches only)")
+
+    parser.add_argument("--kb-cache-dir", default=None,
+                        help="Disk cache of the knowledge API exports (default: $OLLAMACHAT_KB_CACHE, "
+                             "else kb_cache/ in the embeddings directory)")
+    parser.add_argument("--kb-cache-ttl", type=int, default=kb_cache.DEFAULT_TTL,
+                        help="Seconds a cached export is used before it is revalidated with the API")
+
+    parser.add_argument("--context-tokens", type=int, default=None,
+                        help="Token budget for the retrieved context (default: num_ctx minus the prompt and num_predict)")
+    parser.add_argument("--token-margin", type=float, default=context_packer.DEFAULT_TOKEN_MARGIN,
+                        help="Factor applied to token counts, the bundled tokenizer is not the generation model's")
+
+    parser.add_argument("--rerank-candidates", type=int, default=reranker.DEFAULT_CANDIDATES,
+                        help="Retrieved rows re-ranked down to the context entries, when re-ranking is enabled")
+    parser.add_argument("--mmr-lambda", type=float, default=None,
+                        help=f"Enables MMR re-ranking: weight of relevance against diversity, e.g. {reranker.DEFAULT_MMR_LAMBDA}")
+    parser.add_argument("--cross-encoder", default=None,
+                        help="Directory of an ONNX cross-encoder (model.onnx and tokenizer.json) re-ranking the candidates")
+
+    parser.add_argument("--log-level", default="INFO", help="Logging level (per-request span lines are INFO)")
+    parser.add_argument("--log-file", default=None, help="Log to this file instead of stderr")
+    parser.add_argument("--metrics-file", default=None, help="Append one JSON line of stage timings per sampled request")
+    parser.add_argument("--metrics-sample", type=float, default=1.0,
+                        help="Share of requests logged and written to --metrics-file (the histograms count all)")
+
+    parser.add_argument("--query-cache-size", type=int, default=query_encoder.DEFAULT_CACHE_SIZE,
+                        help="Prompt embeddings kept for repeated questions")
+    parser.add_argument("--encode-batch", type=int, default=query_encoder.DEFAULT_MAX_BATCH,
+                        help="Most prompts encoded in one call")
+    parser.add_argument("--encode-wait-ms", type=float, default=query_encoder.DEFAULT_MAX_WAIT * 1000,
+                        help="Under concurrent load, how long to wait for more prompts to encode together")
+
+def apply_tuning(args):
+    helper.configure_logging(args.log_level, args.log_file)
+    helper.configure_metrics(args.metrics_file, args.metrics_sample)
+    helper.configure_backends(args.ollama_url, args.health_interval)
+    helper.configure_warmup(model_warmup.parse_keep_alive(args.keep_alive), args.cold_load)
+    helper.configure_scheduler(args.max_generations, args.max_queue, args.max_per_user, args.queue_timeout)
+    helper.enable_answer_cache(args.answer_cache_size, args.answer_cache_ttl, args.answer_cache_similarity)
+    helper.configure_kb_cache(args.kb_cache_dir, args.kb_cache_ttl)
+    helper.configure_context(args.context_tokens, args.token_margin)
+    helper.configure_reranking(args.rerank_candidates, args.mmr_lambda, args.cross_encoder)
+    helper.configure_query_encoder(args.query_cache_size, args.encode_batch, args.encode_wait_ms / 1000)
+
+def start_warmup(args):
+    """Loads the model in Ollama while the service starts, and again after each reindex"""
+    helper.warm_up()
+    if args.embeddings_dir and args.reindex_check:
+        helper.watch_knowledge_base(args.embeddings_dir, args.reindex_check)
+
+
+class HelperRequestHandler(BaseHTTPRequestHandler):
+    """Serves generate_response over HTTP, one thread per request"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"success": True, "response": "ok"})
+        elif self.path == "/stats":
+            self.send_json(200, service_stats())
+        elif self.path == "/metrics":
+            body = helper.metrics_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_json(404, {"success": False, "response": "Not found"})
+
+    def do_POST(self):
+        if self.path not in ("/generate", "/generate/stream"):
+            self.send_json(404, {"success": False, "response": "Not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length).decode("utf-8"))
+            prompt = payload["prompt"]
+            options = request_options(payload, self.server)
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {
+                "success": False,
+                "response": f"Invalid request: {str(e)}",
+                "sources": []
+            })
+            return
+
+        if self.path == "/generate/stream":
+            self.send_stream(helper.stream_response(prompt, **options))
+        else:
+            self.send_json(200, helper.generate_response(prompt, **options))
+
+    def send_stream(self, events):
+        """
+        Sends (event, data) pairs as server-sent events while they are produced.
+        Tokens go out as {"text": ...}, the final "done" event carries the generate_response result.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        # The length is unknown up front, each event goes out as one HTTP chunk
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        try:
+            for event, data in events:
+                message = sse_message(event, data)
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(message), message))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            logging.info("Client went away, generation stopped")
+            self.close_connection = True
+        finally:
+            # Stops the Ollama request when the client disconnected early
+            events.close()
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.info("%s - %s", self.address_string(), format % args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ollama chat helper service")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--embeddings-dir", default=None,
+                        help="Default embeddings directory, preloaded on start")
+    parser.add_argument("--nprobe", type=int, default=None,
+                        help="IVF cells visited per query (default: value saved with the index)")
+    parser.add_argument("--ef-search", type=int, default=None,
+                        help="HNSW search depth (default: value saved with the index)")
+    parser.add_argument("--ollama-pool-size", type=int, default=http_client.DEFAULT_POOL_SIZE,
+                        help="Connections to Ollama kept alive, about the number of concurrent questions")
+    parser.add_argument("--kb-pool-size", type=int, default=http_client.DEFAULT_POOL_SIZE,
+                        help="Connections to the knowledge base API host kept alive")
+    parser.add_argument("--knowledge-url", default=None,
+                        help="Knowledge base API URL, to size its connection pool up front")
+    parser.add_argument("--http-retries", type=int, default=http_client.DEFAULT_RETRIES,
+                        help="Retries (with backoff) of failed connections to Ollama and the KB API")
+    add_tuning_arguments(parser)
+    args = parser.parse_args()
+
+    apply_tuning(args)
+    for url in helper.ollama_backends_pool().urls:
+        http_client.configure(url, pool_size=args.ollama_pool_size, retries=args.http_retries)
+    if args.knowledge_url:
+        http_client.configure(args.knowledge_url, pool_size=args.kb_pool_size, retries=args.http_retries)
+
+    # Pay the model and index load once, before the first question arrives
+    start_warmup(args)
+    helper.load_model()
+    if args.embeddings_dir:
+        try:
+            helper.load_knowledge_base(args.embeddings_dir)
+        except OSError as e:
+            logging.warning(f"Embeddings not preloaded: {str(e)}")
+
+    server = ThreadingHTTPServer((args.host, args.port), HelperRequestHandler)
+    server.daemon_threads = True
+    server.embeddings_dir = args.embeddings_dir
+    server.nprobe = args.nprobe
+    server.ef_search = args.ef_search
+    logging.info(f"Helper service listening on http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+    Incremental parsing of streamed Ollama /api/generate responses.
+    With "stream": true Ollama answers with NDJSON, one object per generated piece of text:
+
+        {"model": "phi3:mini", "response": "The", "done": false}
+        ...
+        {"model": "phi3:mini", "response": "", "done": true, "eval_count": 87, ...}
+
+    The request must be sent with requests' stream=True so lines are read as they arrive.
+"""
+import json
+
+
+class OllamaStreamError(Exception):
+    """Ollama reported an error in the middle of a stream"""
+
+
+def parse_line(line):
+    """Decodes one NDJSON line (str or bytes), None for a blank line"""
+    if not line.strip():
+        return None
+    chunk = json.loads(line)
+    if chunk.get("error"):
+        raise OllamaStreamError(chunk["error"])
+    return chunk
+
+def iter_chunks(response):
+    """Yields each decoded NDJSON object of a streamed response, up to the final "done" one"""
+    # chunk_size=None hands over every HTTP chunk as soon as it is received
+    for line in response.iter_lines(chunk_size=None):
+        chunk = parse_line(line)
+        if chunk is None:
+            continue
+        yield chunk
+        if chunk.get("done"):
+            return
+
+def iter_tokens(response):
+    """Yields only the generated text"""
+    for chunk in iter_chunks(response):
+        if chunk.get("response"):
+            yield chunk["response"]
+
+def collect(response):
+    """Whole generated text, for callers that do not forward the tokens"""
+    return "".join(iter_tokens(response))
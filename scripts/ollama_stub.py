@@ -0,0 +1,182 @@
+"""
+    Stand-in for an Ollama server, to try the helpers, the services and several backends
+    without models or a GPU. It answers the endpoints the helpers use:
+
+    GET  /api/tags      installed models (--models)
+    GET  /api/ps        loaded models; a model is loaded by its first generation
+    POST /api/generate  a fixed answer, streamed as NDJSON at --tokens-per-second
+                        ("stream": true, Ollama's default) or as one JSON object; an empty
+                        prompt only loads the model, "keep_alive": 0 unloads it
+
+    Timing fields (load_duration, prompt_eval_duration, eval_duration...) are filled in
+    like Ollama does, in nanoseconds.
+
+    Usage: python3 ollama_stub.py [--port 11434] [--models phi3:mini] [--tokens-per-second 50]
+                                  [--load-seconds 2] [--answer "..."]
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODELS = ["phi3:mini"]
+DEFAULT_ANSWER = "To enrol in a course, open the course page and click Enrol me."
+
+
+class StubState:
+    def __init__(self, models=DEFAULT_MODELS, tokens_per_second=50.0, load_seconds=0.0, answer=DEFAULT_ANSWER):
+        self.models = [name if ":" in name else name + ":latest" for name in models]
+        self.tokens_per_second = tokens_per_second
+        self.load_seconds = load_seconds
+        self.answer = answer
+        self.loaded = set()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def load(self, model):
+        """Seconds spent loading model, 0 when it already was"""
+        with self.lock:
+            if model in self.loaded:
+                return 0.0
+            self.loaded.add(model)
+        time.sleep(self.load_seconds)
+        return self.load_seconds
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        state = self.server.state
+        if self.path == "/api/tags":
+            self.send_json(200, {"models": [{"name": name, "model": name} for name in state.models]})
+        elif self.path == "/api/ps":
+            with state.lock:
+                loaded = sorted(state.loaded)
+            self.send_json(200, {"models": [{"name": name, "model": name} for name in loaded]})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        state = self.server.state
+        if self.path != "/api/generate":
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length).decode("utf-8"))
+            model = payload["model"] if ":" in payload["model"] else payload["model"] + ":latest"
+        except (ValueError, KeyError) as e:
+            self.send_json(400, {"error": f"invalid request: {str(e)}"})
+            return
+        if model not in state.models:
+            self.send_json(404, {"error": f"model '{payload['model']}' not found, try pulling it first"})
+            return
+
+        with state.lock:
+            state.requests += 1
+        start = time.monotonic()
+        if payload.get("keep_alive") in (0, "0", "0s"):
+            with state.lock:
+                state.loaded.discard(model)
+            self.send_json(200, {"model": model, "response": "", "done": True, "done_reason": "unload"})
+            return
+
+        load_seconds = state.load(model)
+        prompt = payload.get("prompt", "")
+        if not prompt:
+            self.send_json(200, {"model": model, "response": "", "done": True, "done_reason": "load",
+                                 "load_duration": int(load_seconds * 1e9)})
+            return
+
+        tokens = [word + " " for word in state.answer.split()]
+        limit = payload.get("options", {}).get("num_predict")
+        if limit and limit > 0:
+            tokens = tokens[:limit]
+        delay = 1 / state.tokens_per_second if state.tokens_per_second > 0 else 0.0
+
+        def final():
+            return {
+                "model": model, "response": "", "done": True, "done_reason": "stop",
+                "total_duration": int((time.monotonic() - start) * 1e9),
+                "load_duration": int(load_seconds * 1e9),
+                "prompt_eval_count": len(prompt.split()),
+                "prompt_eval_duration": int(len(prompt.split()) * 1e5),
+                "eval_count": len(tokens),
+                "eval_duration": int(len(tokens) * delay * 1e9)
+            }
+
+        if not payload.get("stream", True):
+            time.sleep(delay * len(tokens))
+            result = final()
+            result["response"] = "".join(tokens)
+            self.send_json(200, result)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                time.sleep(delay)
+                self.write_chunk({"model": model, "response": token, "done": False})
+            self.write_chunk(final())
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def write_chunk(self, data):
+        line = json.dumps(data).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(host="127.0.0.1", port=0, **settings):
+    """Serves a stub on a daemon thread and returns (server, base URL); port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(**settings)
+    threading.Thread(target=server.serve_forever, name="ollama-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0,
+                        help="Generation speed, 0 answers at once")
+    parser.add_argument("--load-seconds", type=float, default=0.0,
+                        help="Time a model takes to load on its first generation")
+    parser.add_argument("--answer", default=DEFAULT_ANSWER)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(args.models, args.tokens_per_second, args.load_seconds, args.answer)
+    print(f"Stub Ollama listening on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+    Prompt encoding for the helper: an LRU cache of query embeddings plus micro-batching.
+    Concurrent callers (service threads, the async pipeline's search threads) hand their
+    prompt to one encoding thread. While it runs an encode call, new prompts queue up and
+    are encoded together in the next call, so a single user never waits for a batch to
+    fill. Once concurrent load is seen, the thread also waits up to max_wait for more
+    prompts before encoding.
+"""
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import kb_index
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_WAIT = 0.002  # Seconds
+
+
+class QueryEncoder:
+    """Thread-safe; load_model is called once, by the first caller that misses the cache"""
+
+    def __init__(self, load_model, cache_size=DEFAULT_CACHE_SIZE, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait=DEFAULT_MAX_WAIT):
+        self.load_model = load_model
+        self.cache_size = cache_size
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._model = None
+        self._stats = {"hits": 0, "misses": 0, "batches": 0, "encoded": 0}
+
+    def encode(self, prompt):
+        """Unit embedding of prompt, shape (1, dim)"""
+        with self._lock:
+            vector = self._cache.get(prompt)
+            if vector is not None:
+                self._cache.move_to_end(prompt)
+                self._stats["hits"] += 1
+                return vector
+            self._stats["misses"] += 1
+            if self._thread is None:
+                # Loaded by the first caller, so a loading error reaches it instead of the thread
+                self._model = self.load_model()
+                self._thread = threading.Thread(target=self._run, name="query-encoder", daemon=True)
+                self._thread.start()
+
+        future = Future()
+        self._queue.put((prompt, future))
+        return future.result()
+
+    def _collect(self, concurrent):
+        """Blocks for one prompt, then takes what is queued (waiting max_wait under concurrent load)"""
+        batch = [self._queue.get()]
+        timeout = self.max_wait if concurrent else 0
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        model = self._model
+        concurrent = False
+        while True:
+            batch = self._collect(concurrent)
+            concurrent = len(batch) > 1
+            # The same prompt asked twice in one batch is encoded once
+            prompts = list(dict.fromkeys(prompt for prompt, _ in batch))
+            try:
+                vectors = kb_index.normalize(model.encode(prompts, batch_size=len(prompts)))
+                vectors.setflags(write=False)  # Cached vectors are shared between callers
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            by_prompt = {prompt: vectors[i:i + 1] for i, prompt in enumerate(prompts)}
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["encoded"] += len(prompts)
+                for prompt, vector in by_prompt.items():
+                    self._cache[prompt] = vector
+                    self._cache.move_to_end(prompt)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            for prompt, future in batch:
+                future.set_result(by_prompt[prompt])
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._cache)
+        stats["mean_batch"] = stats["encoded"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
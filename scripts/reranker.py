@@ -0,0 +1,71 @@
+"""
+    Optional re-ranking of the retrieval candidates before the context is packed.
+        - cross-encoder: a small ONNX model (e.g. ms-marco-MiniLM-L-6-v2 exported with its
+          tokenizer.json) scores each (question, chunk) pair, all candidates in one batch on CPU
+        - MMR (maximal marginal relevance): picks the next candidate by relevance minus its
+          highest similarity to the ones already picked, so near-duplicate articles do not
+          fill the context. Uses the stored embeddings, no model call.
+    With both, MMR uses the cross-encoder scores as relevance.
+"""
+import os
+import numpy as np
+import onnxruntime
+from tokenizers import Tokenizer
+
+DEFAULT_CANDIDATES = 20
+DEFAULT_MMR_LAMBDA = 0.7
+CROSS_ENCODER_MAX_TOKENS = 256
+
+
+def mmr(relevance, vectors, k, lambda_=DEFAULT_MMR_LAMBDA):
+    """
+    Indices of k candidates in pick order. relevance: (n,) scores, vectors: (n, dim) unit vectors.
+    The pairwise similarities are one matrix product; each pick is a vector update.
+    """
+    n = len(relevance)
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(n, dtype="float32")
+    available = np.ones(n, dtype=bool)
+    picks = []
+    for _ in range(min(k, n)):
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        pick = int(np.argmax(scores))
+        picks.append(pick)
+        available[pick] = False
+        redundancy = similarity[pick] if len(picks) == 1 else np.maximum(redundancy, similarity[pick])
+    return np.array(picks, dtype="int64")
+
+
+class CrossEncoder:
+    """model_dir holds model.onnx and tokenizer.json; thread-safe"""
+
+    def __init__(self, model_dir, threads=None, max_tokens=CROSS_ENCODER_MAX_TOKENS):
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_tokens)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.inputs = {model_input.name for model_input in self.session.get_inputs()}
+
+    def score(self, query, texts):
+        """Relevance score per text, higher is better (raw logits)"""
+        if not texts:
+            return np.empty(0, dtype="float32")
+        encodings = self.tokenizer.encode_batch([(query, text) for text in texts])
+        feeds = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype="int64"),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype="int64"),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype="int64")
+        }
+        logits = self.session.run(None, {name: value for name, value in feeds.items() if name in self.inputs})[0]
+        # One logit per pair, or (not relevant, relevant) for two-class models
+        return logits.reshape(len(texts), -1)[:, -1].astype("float32")
+
+
+def sigmoid(scores):
+    return 1 / (1 + np.exp(-scores))
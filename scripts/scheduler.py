@@ -0,0 +1,175 @@
+"""
+    Admission control in front of Ollama for the helper services.
+    A local Ollama runs one or a few generations at a time, so the services let at most
+    max_in_flight generations through and queue the rest:
+        - users are served round-robin, one student sending many questions does not
+          hold back the rest of the class
+        - a user may have at most max_per_user questions queued or running
+        - when max_queue questions are already waiting, or a question waited
+          queue_timeout seconds, it is shed with Busy instead of piling up
+    Queue waits are kept for the stats.
+"""
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager, asynccontextmanager
+import numpy as np
+
+DEFAULT_MAX_IN_FLIGHT = 2
+DEFAULT_MAX_QUEUE = 32
+DEFAULT_MAX_PER_USER = 2
+DEFAULT_QUEUE_TIMEOUT = 60  # Seconds
+
+
+class Busy(Exception):
+    """The question was not admitted"""
+
+
+class _Waiter:
+    def __init__(self, user, grant):
+        self.user = user
+        self.grant = grant
+        self.granted = False
+        self.queued_at = time.monotonic()
+
+
+class GenerationScheduler:
+    """Thread-safe; slot() for threads, async_slot() for the asyncio service"""
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, max_queue=DEFAULT_MAX_QUEUE,
+                 max_per_user=DEFAULT_MAX_PER_USER, queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._queues = OrderedDict()  # user -> waiters, users at the front are served first
+        self._queued = 0
+        self._in_flight = 0
+        self._per_user = {}  # user -> questions queued or running
+        self._waits = deque(maxlen=1000)  # Recent queue waits in seconds
+        self._stats = {"admitted": 0, "shed": 0, "timeouts": 0}
+
+    def _enqueue(self, user, grant):
+        """Returns None when admitted at once, the waiter when queued; raises Busy when shed"""
+        with self._lock:
+            # Anonymous callers (no user sent) are not limited per user
+            if user is not None and self._per_user.get(user, 0) >= self.max_per_user:
+                self._stats["shed"] += 1
+                raise Busy(f"user {user} already has {self.max_per_user} questions in progress")
+            if self._in_flight < self.max_in_flight and not self._queued:
+                self._in_flight += 1
+                self._per_user[user] = self._per_user.get(user, 0) + 1
+                self._stats["admitted"] += 1
+                self._waits.append(0.0)
+                return None
+            if self._queued >= self.max_queue:
+                self._stats["shed"] += 1
+                raise Busy(f"{self._queued} questions already queued")
+
+            waiter = _Waiter(user, grant)
+            self._queues.setdefault(user, deque()).append(waiter)
+            self._queued += 1
+            self._per_user[user] = self._per_user.get(user, 0) + 1
+            return waiter
+
+    def _dispatch(self):
+        """Starts queued questions while there are free slots; called with the lock held"""
+        while self._in_flight < self.max_in_flight and self._queued:
+            user, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            self._queued -= 1
+            self._in_flight += 1
+            self._stats["admitted"] += 1
+            self._waits.append(time.monotonic() - waiter.queued_at)
+            waiter.granted = True
+            waiter.grant()
+
+    def _leave(self, user):
+        self._per_user[user] -= 1
+        if not self._per_user[user]:
+            del self._per_user[user]
+
+    def _cancel(self, waiter):
+        """Takes a waiter out of the queue. Returns False if it was granted meanwhile (it then holds a slot)"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiters = self._queues[waiter.user]
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[waiter.user]
+            self._queued -= 1
+            self._leave(waiter.user)
+            return True
+
+    def release(self, user):
+        with self._lock:
+            self._in_flight -= 1
+            self._leave(user)
+            self._dispatch()
+
+    def _timed_out(self, waiter):
+        if not self._cancel(waiter):
+            return False
+        with self._lock:
+            self._stats["timeouts"] += 1
+        return True
+
+    @contextmanager
+    def slot(self, user=None):
+        """Blocks until the generation may start and yields the seconds spent queued"""
+        start = time.monotonic()
+        granted = threading.Event()
+        waiter = self._enqueue(user, granted.set)
+        if waiter is not None and not granted.wait(self.queue_timeout) and self._timed_out(waiter):
+            raise Busy(f"waited {self.queue_timeout} s in the queue")
+        try:
+            yield time.monotonic() - start
+        finally:
+            self.release(user)
+
+    @asynccontextmanager
+    async def async_slot(self, user=None):
+        """slot() for coroutines, waiting does not block the event loop"""
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(user, grant)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(granted), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if self._timed_out(waiter):
+                    raise Busy(f"waited {self.queue_timeout} s in the queue")
+            except asyncio.CancelledError:
+                # The client went away while queued
+                if not self._cancel(waiter):
+                    self.release(user)
+                raise
+        try:
+            yield time.monotonic() - start
+        finally:
+            self.release(user)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(in_flight=self._in_flight, queued=self._queued, users_queued=len(self._queues))
+            waits = np.array(self._waits) * 1000
+        if waits.size:
+            stats["queue_wait_ms"] = {
+                "mean": float(waits.mean()),
+                "p95": float(np.percentile(waits, 95)),
+                "max": float(waits.max())
+            }
+        return stats
@@ -0,0 +1,117 @@
+"""
+    Wall time of the stages of a question (encode, search, Ollama...), as spans of the request.
+    A request (generate_response, a search...) opens a timer in a context variable, so the
+    stages timed anywhere below it, also on the threads the context is copied to, are
+    collected in one place without passing the timer around. Finished requests are logged
+    and aggregated (metrics.py) by the on_finish callback.
+"""
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("stage_timer", default=None)
+
+
+class StageTimer:
+    """Stage durations of one request, in the order the stages ran"""
+
+    def __init__(self, kind="request"):
+        self.kind = kind
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.total = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def summary(self):
+        parts = [f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.stages.items()]
+        if self.total is not None:
+            parts.append(f"total {self.total * 1000:.1f} ms")
+        return ", ".join(parts)
+
+
+@contextmanager
+def request(kind, on_finish=None):
+    """
+    Timer of the current request. Nested calls join the outer request, only the outermost
+    one measures the total and calls on_finish(timer).
+    """
+    timer = _current.get()
+    if timer is not None:
+        yield timer
+        return
+    timer = StageTimer(kind)
+    token = _current.set(timer)
+    try:
+        yield timer
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # A generator closed from another context than the one it started in
+            _current.set(None)
+        timer.total = time.perf_counter() - timer.started
+        if on_finish is not None:
+            on_finish(timer)
+
+def current():
+    return _current.get()
+
+@contextmanager
+def stage(name):
+    """Times the block as a stage of the current request; does nothing outside a request"""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+def record(name, seconds):
+    """Adds a duration measured elsewhere (e.g. reported by Ollama) to the current request"""
+    timer = _current.get()
+    if timer is not None:
+        timer.record(name, seconds)
+
+
+def percentile(sorted_values, q):
+    """Linear interpolation between the closest ranks, like numpy.percentile"""
+    position = (len(sorted_values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+class StageStats:
+    """Thread-safe; keeps the last window durations of each stage"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations = {}
+
+    def add(self, timer):
+        with self._lock:
+            for name, seconds in timer.stages.items():
+                self._durations.setdefault(name, deque(maxlen=self.window)).append(seconds)
+            if timer.total is not None:
+                self._durations.setdefault(f"{timer.kind}_total", deque(maxlen=self.window)).append(timer.total)
+
+    def stats(self):
+        with self._lock:
+            durations = {name: sorted(value * 1000 for value in values) for name, values in self._durations.items()}
+        return {
+            name: {"count": len(values), "mean_ms": sum(values) / len(values), "p95_ms": percentile(values, 95)}
+            for name, values in durations.items()
+        }
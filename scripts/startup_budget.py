@@ -0,0 +1,89 @@
+"""
+    Cold start check of the CLI helper, with python -X importtime. Each Moodle question that
+    misses the helper service starts ollama_helper_with_embeddings.py as a new process, so
+    module-level imports are paid on every one of them. Fails (exit 1) when:
+        - importing the helper takes longer than --budget-ms (median of --runs fresh processes)
+        - the CLI answering a bad invocation (no question) takes longer than --cli-budget-ms
+        - a heavy module (--forbid) is imported at module level instead of on first use
+
+    scripts/tests/test_startup_budget.py runs the same checks with the default budgets.
+
+    Usage: python3 startup_budget.py [--budget-ms 150] [--cli-budget-ms 400] [--runs 5]
+                                     [--forbid numpy,faiss,...] [--top 10]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+HELPER = "ollama_helper_with_embeddings"
+DEFAULT_FORBIDDEN = ["numpy", "faiss", "light_embed", "onnxruntime", "tokenizers", "requests", "sklearn"]
+DEFAULT_BUDGET_MS = 150
+DEFAULT_CLI_BUDGET_MS = 400
+DEFAULT_RUNS = 5
+
+
+def import_times(module):
+    """{module: (self us, cumulative us)} of a fresh interpreter importing module"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=SCRIPTS_DIR, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+def cli_seconds():
+    """Wall time of the CLI rejecting a call without a question: interpreter start, imports, exit"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, f"{HELPER}.py"], cwd=SCRIPTS_DIR, capture_output=True)
+    return time.perf_counter() - start
+
+def measure(runs=DEFAULT_RUNS):
+    """(median ms importing the helper, median ms of the CLI without a question, import times of the last run)"""
+    times = [import_times(HELPER) for _ in range(runs)]
+    import_ms = statistics.median(run[HELPER][1] for run in times) / 1000
+    cli_ms = statistics.median(cli_seconds() for _ in range(runs)) * 1000
+    return import_ms, cli_ms, times[-1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start budget of the CLI helper")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="Most milliseconds importing the helper may take")
+    parser.add_argument("--cli-budget-ms", type=float, default=DEFAULT_CLI_BUDGET_MS,
+                        help="Most milliseconds the CLI may take to reject a bad call")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Fresh processes measured, the median counts")
+    parser.add_argument("--forbid", default=",".join(DEFAULT_FORBIDDEN),
+                        help="Modules that must not be imported when the helper is")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports listed")
+    args = parser.parse_args()
+
+    import_ms, cli_ms, imported = measure(args.runs)
+
+    print(f"import {HELPER}: {import_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"CLI without a question: {cli_ms:.1f} ms (budget {args.cli_budget_ms:.0f} ms)")
+    print("Slowest imports (cumulative ms, last run):")
+    for name, (_, cumulative) in sorted(imported.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f}  {name}")
+
+    failures = []
+    if import_ms > args.budget_ms:
+        failures.append(f"importing the helper takes {import_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    if cli_ms > args.cli_budget_ms:
+        failures.append(f"the CLI takes {cli_ms:.1f} ms to start and exit, over the {args.cli_budget_ms:.0f} ms budget")
+    for name in filter(None, args.forbid.split(",")):
+        if name in imported:
+            failures.append(f"{name} is imported at module level, load it on first use (lazy_imports.py)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
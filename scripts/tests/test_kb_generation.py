@@ -0,0 +1,67 @@
+"""
+    Publishing of embeddings directory generations (kb_generation.py).
+
+    Run from the plugin root: python3 -m pytest scripts/tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kb_generation
+
+
+def touch(path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("x")
+
+
+class KbGenerationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="ollamachat_generations_")
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def test_flat_directory_until_first_publish(self):
+        touch(os.path.join(self.dir, "embeddings.npy"))
+        self.assertEqual(kb_generation.current(self.dir), (None, self.dir))
+
+        generation, path = kb_generation.create(self.dir)
+        touch(os.path.join(path, "embeddings.npy"))
+        # Not visible before it is published
+        self.assertEqual(kb_generation.current_dir(self.dir), self.dir)
+
+        touch(os.path.join(self.dir, "kb_export.jsonl.tmp"))
+        os.makedirs(os.path.join(self.dir, "kb_cache"))
+        kb_generation.publish(self.dir, generation)
+        self.assertEqual(kb_generation.current(self.dir), (generation, path))
+        # The flat build is removed, the rest of the directory is left alone
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         [kb_generation.CURRENT_FILE, kb_generation.GENERATIONS_DIR, "kb_cache", "kb_export.jsonl.tmp"])
+
+    def test_keeps_current_and_previous_generation(self):
+        published = []
+        for _ in range(3):
+            generation, _ = kb_generation.create(self.dir)
+            kb_generation.publish(self.dir, generation)
+            published.append(generation)
+
+        self.assertEqual(kb_generation.current(self.dir)[0], published[-1])
+        remaining = os.listdir(os.path.join(self.dir, kb_generation.GENERATIONS_DIR))
+        self.assertEqual(sorted(remaining), sorted(published[-2:]))
+
+    def test_discard_leaves_current(self):
+        generation, _ = kb_generation.create(self.dir)
+        kb_generation.publish(self.dir, generation)
+        _, unused = kb_generation.create(self.dir)
+        kb_generation.discard(unused)
+
+        self.assertFalse(os.path.exists(unused))
+        self.assertEqual(kb_generation.current(self.dir)[0], generation)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+"""
+    Routing and failover of ollama_backends.BackendPool against stub Ollama servers
+    (ollama_stub.py) on local ports.
+
+    Run from the plugin root: python3 -m pytest scripts/tests
+"""
+import os
+import sys
+import socket
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_client
+import ollama_stub
+from ollama_backends import BackendPool, NoBackendAvailable
+
+MODEL = "phi3:mini"
+
+
+def free_port():
+    """A local port nothing listens on"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def generate(pool, model=MODEL, **kwargs):
+    """Non-streamed generation through pool, returns the URL of the backend that answered"""
+    with pool.post(model, json={"model": model, "prompt": "hello", "stream": False}, timeout=10, **kwargs) as response:
+        response.raise_for_status()
+        return http_client.origin(response.url)
+
+
+def load(url, model=MODEL):
+    """Loads model on the stub at url, as an empty Ollama prompt does"""
+    response = http_client.get_session(url).post(url + "/api/generate", json={"model": model, "stream": False}, timeout=10)
+    response.raise_for_status()
+
+
+class BackendPoolTest(unittest.TestCase):
+
+    def no_retries(self, url):
+        """Refused connections fail at once; the shared session gets its settings back after the test"""
+        self.addCleanup(http_client.restore, url, http_client.configure(url, retries=0))
+
+    def start_stub(self, port=0, **settings):
+        settings.setdefault("tokens_per_second", 0)
+        server, url = ollama_stub.start(port=port, **settings)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, url
+
+    def test_routes_to_fewest_outstanding(self):
+        first, first_url = self.start_stub()
+        second, second_url = self.start_stub()
+        for url in (first_url, second_url):
+            load(url)
+        pool = BackendPool([first_url, second_url], health_interval=None)
+        pool.check_all()
+
+        # Both have the model loaded: keep a streamed generation open on one backend, the next request goes to the other
+        payload = {"model": MODEL, "prompt": "hello", "stream": True}
+        with pool.post(MODEL, json=payload, stream=True, timeout=10) as busy:
+            busy_url = http_client.origin(busy.url)
+            idle_url = second_url if busy_url == first_url else first_url
+            self.assertEqual(pool.stats()[busy_url]["outstanding"], 1)
+            self.assertEqual(generate(pool), idle_url)
+            self.assertEqual(generate(pool), idle_url)
+            self.assertTrue(busy.content)
+        self.assertEqual(pool.stats()[busy_url]["outstanding"], 0)
+        self.assertEqual(first.state.requests + second.state.requests, 2 + 3)
+
+    def test_skips_backend_without_model(self):
+        other, other_url = self.start_stub(models=["llama3"])
+        serving, serving_url = self.start_stub(models=[MODEL])
+        pool = BackendPool([other_url, serving_url], health_interval=None)
+        pool.check_all()
+
+        self.assertEqual([backend.url for backend in pool.candidates(MODEL)], [serving_url])
+        for _ in range(3):
+            self.assertEqual(generate(pool), serving_url)
+        self.assertEqual(other.state.requests, 0)
+        self.assertEqual(serving.state.requests, 3)
+
+    def test_fails_over_on_refused_connection(self):
+        dead_url = f"http://127.0.0.1:{free_port()}"
+        self.no_retries(dead_url)
+        live, live_url = self.start_stub()
+        pool = BackendPool([dead_url, live_url], health_interval=None)
+
+        # Neither backend checked yet: the dead one comes first in turn at some point
+        for _ in range(2):
+            self.assertEqual(generate(pool), live_url)
+        self.assertIs(pool.backends[0].healthy, False)
+        self.assertEqual(pool.backends[0].failures, 1)
+        self.assertEqual(live.state.requests, 2)
+
+        # Once down, it is only tried after the healthy backend
+        self.assertEqual(pool.candidates(MODEL)[-1].url, dead_url)
+
+    def test_no_backend_available(self):
+        dead_url = f"http://127.0.0.1:{free_port()}"
+        self.no_retries(dead_url)
+        pool = BackendPool([dead_url], health_interval=None)
+        with self.assertRaises(NoBackendAvailable):
+            generate(pool)
+
+    def test_backend_comes_back_after_health_check(self):
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        self.no_retries(url)
+        _, other_url = self.start_stub()
+        pool = BackendPool([url, other_url], health_interval=None)
+        backend = pool.backends[0]
+
+        self.assertFalse(pool.check(backend))
+        self.assertIs(backend.healthy, False)
+        self.assertEqual(pool.candidates(MODEL)[0].url, other_url)
+
+        server, _ = self.start_stub(port=port)
+        self.assertTrue(pool.check(backend))
+        self.assertIs(backend.healthy, True)
+        self.assertIn(backend, pool.candidates(MODEL)[:2])
+        self.assertNotEqual(pool.candidates(MODEL)[-1].tier(MODEL), 3)
+
+        # With the other backend busy, the recovered one takes the request
+        with pool.track(pool.backends[1]):
+            self.assertEqual(generate(pool), url)
+        self.assertEqual(server.state.requests, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+"""
+    Cold start budget of the CLI helper (startup_budget.py), measured in fresh interpreters
+    with python -X importtime.
+
+    Run from the plugin root: python3 -m pytest scripts/tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import startup_budget
+
+
+class StartupBudgetTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.import_ms, cls.cli_ms, cls.imported = startup_budget.measure()
+
+    def test_helper_import_budget(self):
+        self.assertLessEqual(self.import_ms, startup_budget.DEFAULT_BUDGET_MS,
+                             f"importing {startup_budget.HELPER} takes {self.import_ms:.1f} ms")
+
+    def test_cli_budget(self):
+        self.assertLessEqual(self.cli_ms, startup_budget.DEFAULT_CLI_BUDGET_MS,
+                             f"the CLI takes {self.cli_ms:.1f} ms to start and exit")
+
+    def test_no_heavy_module_at_import(self):
+        loaded = [name for name in startup_budget.DEFAULT_FORBIDDEN if name in self.imported]
+        self.assertEqual(loaded, [], "imported at module level, load them on first use (lazy_imports.py)")
+
+
+if __name__ == "__main__":
+    unittest.main()
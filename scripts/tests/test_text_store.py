@@ -0,0 +1,52 @@
+"""
+    Single-file text store (text_store.py), and stores of the previous two-file format.
+
+    Run from the plugin root: python3 -m pytest scripts/tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_store
+
+
+class TextStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix="ollamachat_store_")
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, "chunks")
+
+    def test_round_trip(self):
+        texts = ["Inscripción", "", "✓ done", None, "x" * 1000]
+        text_store.write_store(self.path, texts)
+
+        store = text_store.TextStore(self.path)
+        self.assertEqual(len(store), len(texts))
+        self.assertEqual(store.get_many(range(len(texts))), [text or "" for text in texts])
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["chunks.bin"])
+
+    def test_empty_store(self):
+        text_store.write_store(self.path, [])
+        self.assertEqual(len(text_store.TextStore(self.path)), 0)
+
+    def test_previous_format(self):
+        with open(self.path + ".bin", "wb") as f:
+            f.write("abcdé".encode("utf-8"))
+        np.save(self.path + ".offsets.npy", np.array([0, 3, 6], dtype="int64"))
+        store = text_store.TextStore(self.path)
+        self.assertEqual(store.get_many([0, 1]), ["abc", "dé"])
+
+        # Rewriting it switches to the single file
+        text_store.write_store(self.path, ["new"])
+        self.assertFalse(os.path.exists(self.path + ".offsets.npy"))
+        self.assertEqual(text_store.TextStore(self.path)[0], "new")
+
+
+if __name__ == "__main__":
+    unittest.main()
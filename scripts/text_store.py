@@ -0,0 +1,87 @@
+"""
+    Offset-indexed string store, in a single file <name>.bin:
+
+        header    magic, row count, position of the offsets (3 x 8 bytes)
+        data      the strings concatenated as UTF-8, padded to 8 bytes
+        offsets   int64 row count + 1, row i spans offsets[i]:offsets[i + 1] of the data
+
+    The file is memory-mapped, so opening a store costs nothing and a lookup by row id
+    is O(1) without parsing the rest of the file. Being one file, a store is replaced
+    in one step: a reader never pairs new strings with old offsets.
+
+    Stores written before this format (<name>.bin with a separate <name>.offsets.npy)
+    are still read.
+"""
+import os
+import mmap
+import struct
+import numpy as np
+
+MAGIC = b"OCTSTOR1"
+HEADER = struct.Struct("<8sqq")
+
+LEGACY_OFFSETS = ".offsets.npy"
+
+
+class TextStoreWriter:
+    """Appends strings one by one; the store only becomes visible on close()"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = [0]
+        self.data = open(path + ".bin.tmp", "wb")
+        self.data.write(HEADER.pack(MAGIC, 0, 0))  # Filled in by close()
+
+    def append(self, text):
+        encoded = (text or "").encode("utf-8")
+        self.data.write(encoded)
+        self.offsets.append(self.offsets[-1] + len(encoded))
+
+    def close(self):
+        padding = -(HEADER.size + self.offsets[-1]) % 8  # Aligns the offsets for numpy
+        self.data.write(b"\0" * padding)
+        position = HEADER.size + self.offsets[-1] + padding
+        self.data.write(np.array(self.offsets, dtype="<i8").tobytes())
+        self.data.seek(0)
+        self.data.write(HEADER.pack(MAGIC, len(self.offsets) - 1, position))
+        self.data.close()
+        os.replace(self.path + ".bin.tmp", self.path + ".bin")
+        # Left by the previous format, it would only mislead readers of older versions
+        if os.path.exists(self.path + LEGACY_OFFSETS):
+            os.remove(self.path + LEGACY_OFFSETS)
+
+
+def write_store(path, texts):
+    writer = TextStoreWriter(path)
+    for text in texts:
+        writer.append(text)
+    writer.close()
+
+def exists(path):
+    return os.path.exists(path + ".bin")
+
+
+class TextStore:
+    """Read-only, memory-mapped view of a store written by TextStoreWriter"""
+
+    def __init__(self, path):
+        with open(path + ".bin", "rb") as f:
+            # A zero-length file cannot be mapped (an empty store of the previous format)
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        if self.data[:len(MAGIC)] == MAGIC:
+            _, count, position = HEADER.unpack_from(self.data)
+            self.offsets = np.frombuffer(self.data, dtype="<i8", count=count + 1, offset=position)
+            self.start = HEADER.size
+        else:
+            self.offsets = np.load(path + LEGACY_OFFSETS, mmap_mode="r")
+            self.start = 0
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        start = self.start
+        return self.data[start + int(self.offsets[row]):start + int(self.offsets[row + 1])].decode("utf-8")
+
+    def get_many(self, rows):
+        return [self[row] for row in rows]
@@ -35,6 +35,22 @@ if ($hassiteconfig) { // Needs this condition to ensure only site admins can see
         PARAM_TEXT
     ));
 
+    $settings->add(new admin_setting_configtext(
+        'local_ollamachat/min_score',
+        get_string('minscore', 'local_ollamachat'),
+        get_string('minscore_desc', 'local_ollamachat'),
+        '0.55',
+        PARAM_FLOAT
+    ));
+
+    $settings->add(new admin_setting_configtext(
+        'local_ollamachat/service_url',
+        get_string('serviceurl', 'local_ollamachat'),
+        get_string('serviceurl_desc', 'local_ollamachat'),
+        'http://127.0.0.1:8765',
+        PARAM_URL
+    ));
+
     // Add the settings page to the local plugins category.
     $ADMIN->add('localplugins', $settings);
 }
\ No newline at end of file
@@ -0,0 +1,35 @@
+<?php
+// Streams the answer to a chat question as server-sent events, token by token.
+// Used by amd/src/controls.js; ask_with_knowledge remains the non-streaming web service.
+define('NO_OUTPUT_BUFFERING', true);
+
+require_once(__DIR__ . '/../../config.php');
+require_once(__DIR__ . '/externallib.php');
+
+require_login();
+require_sesskey();
+$context = context_system::instance();
+require_capability('local/ollamachat:ask', $context);
+
+$prompt = required_param('prompt', PARAM_TEXT);
+
+// Release the session lock, otherwise the user's other requests wait for the whole generation
+\core\session\manager::write_close();
+
+header('Content-Type: text/event-stream; charset=utf-8');
+header('Cache-Control: no-cache');
+header('X-Accel-Buffering: no'); // Do not let nginx buffer the events
+while (ob_get_level()) {
+    ob_end_flush();
+}
+
+if (!local_ollamachat_external::stream_with_knowledge($prompt)) {
+    // Helper service not reachable: answer in one piece through the CLI helper
+    try {
+        $response = local_ollamachat_external::ask_with_knowledge($prompt, 'json');
+    } catch (moodle_exception $e) {
+        $response = ['success' => false, 'response' => $e->getMessage(), 'sources' => []];
+    }
+    echo "event: done\ndata: " . json_encode($response) . "\n\n";
+    flush();
+}
@@ -1,5 +1,5 @@
 <?php
 defined('MOODLE_INTERNAL') || die();
-$plugin->version = 2024051611;
+$plugin->version = 2026101600;
 $plugin->requires = 2022041200; // Moodle 4.0+
 $plugin->component = 'local_ollamachat';
\ No newline at end of file